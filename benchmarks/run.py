@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, division
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+
+benchmarks_dirname = os.path.dirname(os.path.abspath(__file__))
+root_dirname = os.path.dirname(benchmarks_dirname)
+
+parser = argparse.ArgumentParser(
+    description="Measure the overhead of clcc itself with a stub OpenCL library in place of a real driver")
+parser.add_argument("--build-latency", dest="build_latency", default=1000, type=int,
+                    help="Simulated driver build time per program, in microseconds")
+parser.add_argument("--offline-devices", dest="offline_devices", default=4, type=int,
+                    help="Number of devices on the simulated AMD offline-devices platform")
+parser.add_argument("--binary-padding", dest="binary_padding", default=0, type=int,
+                    help="Extra bytes in every simulated program binary")
+parser.add_argument("--repetitions", dest="repetitions", default=10, type=int,
+                    help="Number of clcc invocations in per-invocation benchmarks")
+parser.add_argument("--batch-size", dest="batch_size", default=100, type=int,
+                    help="Number of kernels in batch benchmarks")
+parser.add_argument("-j", "--jobs", dest="jobs", default=4, type=int,
+                    help="Number of parallel workers in the parallel batch benchmark")
+parser.add_argument("--cc", dest="cc", default=os.environ.get("CC", "cc"),
+                    help="C compiler for the stub OpenCL library")
+parser.add_argument("--json", dest="json",
+                    help="Also write the results as JSON to this file")
+parser.add_argument("--import-budget", dest="import_budget", default=50.0, type=float,
+                    help="Maximum time to import clcc on top of the interpreter startup, in milliseconds")
+parser.add_argument("--first-compile-budget", dest="first_compile_budget", default=150.0, type=float,
+                    help="Maximum overhead of a clcc invocation which compiles one kernel, in milliseconds")
+
+
+def build_stub_library(cc, output_dirname):
+    # Named like the real library so that clcc finds it through LD_LIBRARY_PATH
+    library_path = os.path.join(output_dirname, "libOpenCL.so")
+    subprocess.check_call([cc, "-std=gnu99", "-O2", "-shared", "-fPIC", "-o", library_path,
+                           os.path.join(benchmarks_dirname, "stub", "stub_opencl.c"), "-lpthread"])
+    return library_path
+
+
+def generate_kernel(kernel_index, functions_count):
+    lines = ["#define SCALE_%d %d.0f" % (kernel_index, kernel_index + 1)]
+    for function_index in range(functions_count):
+        lines += [
+            "inline float helper_%d(float x, float y) {" % function_index,
+            "\treturn mad(x, SCALE_%d, y) * %d.5f;" % (kernel_index, function_index),
+            "}",
+            "",
+            "kernel void kernel_%d(global float* restrict output, global const float* restrict input) {" % function_index,
+            "\tconst size_t i = get_global_id(0);",
+            "\toutput[i] = helper_%d(input[i], input[i + 1]);" % function_index,
+            "}",
+            ""
+        ]
+    return "\n".join(lines)
+
+
+def generate_corpus(corpus_dirname, batch_size):
+    # The corpus is hello.cl plus synthetic kernels of increasing size
+    kernel_paths = [os.path.join(root_dirname, "hello.cl")]
+    sizes = [10, 100, 1000]
+    for kernel_index in range(batch_size - 1):
+        kernel_path = os.path.join(corpus_dirname, "kernel%03d.cl" % kernel_index)
+        with open(kernel_path, "w") as kernel_file:
+            kernel_file.write(generate_kernel(kernel_index, sizes[kernel_index % len(sizes)]))
+        kernel_paths.append(kernel_path)
+    return kernel_paths
+
+
+class Runner:
+    def __init__(self, library_dirname, work_dirname, options):
+        self.work_dirname = work_dirname
+        self.environment = dict(os.environ)
+        self.environment.update({
+            "LD_LIBRARY_PATH": os.pathsep.join(filter(None, [library_dirname, os.environ.get("LD_LIBRARY_PATH")])),
+            "PYTHONPATH": os.pathsep.join(filter(None, [root_dirname, os.environ.get("PYTHONPATH")])),
+            "XDG_CACHE_HOME": os.path.join(work_dirname, "cache"),
+            "STUB_CL_BUILD_LATENCY_US": str(options.build_latency),
+            "STUB_CL_OFFLINE_DEVICES": str(options.offline_devices),
+            "STUB_CL_BINARY_PADDING": str(options.binary_padding)
+        })
+        self.environment.pop("CLCC_CACHE_DIR", None)
+        # Startup is measured as installed packages run it: from bytecode
+        self.environment.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    def run(self, args):
+        # Returns wall time in seconds and peak resident set size in KB of a single clcc invocation
+        return self.run_python([os.path.join(root_dirname, "bin", "clcc"), "--no-server"] + args)
+
+    def run_python(self, args):
+        command = [sys.executable] + args
+        with open(os.devnull, "w") as devnull:
+            start_time = time.time()
+            process = subprocess.Popen(command, env=self.environment, cwd=self.work_dirname, stdout=devnull)
+            # Unlike subprocess.wait, os.wait4 reports resource usage of this particular child
+            pid, wait_status, rusage = os.wait4(process.pid, 0)
+            elapsed = time.time() - start_time
+        process.returncode = os.WEXITSTATUS(wait_status) if os.WIFEXITED(wait_status) else -os.WTERMSIG(wait_status)
+        if process.returncode != 0:
+            raise RuntimeError("%s failed with status %d" % (" ".join(command), process.returncode))
+        return elapsed, rusage.ru_maxrss
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 == 1 else (values[middle - 1] + values[middle]) / 2
+
+
+def main(args=sys.argv[1:]):
+    options = parser.parse_args(args)
+    work_dirname = tempfile.mkdtemp(prefix="clcc-bench-")
+    try:
+        library_dirname = os.path.join(work_dirname, "lib")
+        corpus_dirname = os.path.join(work_dirname, "corpus")
+        output_dirname = os.path.join(work_dirname, "output")
+        for dirname in [library_dirname, corpus_dirname, output_dirname]:
+            os.makedirs(dirname)
+        build_stub_library(options.cc, library_dirname)
+        kernel_paths = generate_corpus(corpus_dirname, options.batch_size)
+        runner = Runner(library_dirname, work_dirname, options)
+        build_latency = options.build_latency * 1.0e-6
+
+        results = {}
+        # The first run saves the device inventory and bytecode, as a regular installation would have them
+        runner.run(["--refresh-devices"])
+
+        python_times, python_rss = zip(*[runner.run_python(["-c", "pass"]) for _ in range(options.repetitions)])
+        import_times, import_rss = zip(*[runner.run_python(["-c", "import clcc.client"]) for _ in range(options.repetitions)])
+        results["import"] = {
+            "time": median(import_times),
+            "overhead": median(import_times) - median(python_times),
+            "max_rss_kb": max(import_rss)
+        }
+
+        list_times, list_rss = zip(*[runner.run(["-l"]) for _ in range(options.repetitions)])
+        results["list"] = {"time": median(list_times), "max_rss_kb": max(list_rss)}
+
+        single_args = ["-p", "amd", "-d", "1", "-o", os.path.join(output_dirname, "hello.bin"), kernel_paths[0]]
+        single_times, single_rss = zip(*[runner.run(single_args) for _ in range(options.repetitions)])
+        results["single"] = {
+            "time": median(single_times),
+            "overhead": median(single_times) - build_latency,
+            "max_rss_kb": max(single_rss)
+        }
+
+        for jobs in sorted(set([1, options.jobs])):
+            batch_args = ["-p", "amd", "-d", "1", "-j", str(jobs), "-o", output_dirname] + kernel_paths
+            batch_time, batch_rss = runner.run(batch_args)
+            results["batch-j%d" % jobs] = {
+                "time": batch_time,
+                "throughput": len(kernel_paths) / batch_time,
+                "overhead_per_file": (batch_time - len(kernel_paths) * build_latency / jobs) / len(kernel_paths),
+                "max_rss_kb": batch_rss
+            }
+
+        all_devices_args = ["-p", "amd", "-d", "all", "-o", output_dirname] + kernel_paths
+        all_devices_time, all_devices_rss = runner.run(all_devices_args)
+        results["batch-all-devices"] = {
+            "time": all_devices_time,
+            "throughput": len(kernel_paths) / all_devices_time,
+            "overhead_per_file": (all_devices_time - len(kernel_paths) * build_latency) / len(kernel_paths),
+            "max_rss_kb": all_devices_rss
+        }
+    finally:
+        shutil.rmtree(work_dirname, ignore_errors=True)
+
+    print("Simulated build latency: %.3f ms, %d offline devices, %d kernels" %
+          (options.build_latency * 1.0e-3, options.offline_devices, len(kernel_paths)))
+    print("%-24s %12s %14s %16s %12s" % ("Benchmark", "Time (ms)", "Overhead (ms)", "Throughput (1/s)", "RSS (MB)"))
+    for name in ["import", "list", "single"] + sorted(name for name in results if name.startswith("batch")):
+        result = results[name]
+        overhead = result.get("overhead", result.get("overhead_per_file"))
+        print("%-24s %12.3f %14s %16s %12.1f" % (name, result["time"] * 1000.0,
+            "-" if overhead is None else "%.3f" % (overhead * 1000.0),
+            "-" if "throughput" not in result else "%.1f" % result["throughput"],
+            result["max_rss_kb"] / 1024.0))
+
+    budgets = [
+        ("import", results["import"]["overhead"], options.import_budget),
+        ("first compile", results["single"]["overhead"], options.first_compile_budget)
+    ]
+    results["budgets"] = {}
+    budgets_exceeded = False
+    for name, overhead, budget in budgets:
+        within_budget = overhead * 1000.0 <= budget
+        budgets_exceeded = budgets_exceeded or not within_budget
+        results["budgets"][name] = {"overhead": overhead, "budget": budget * 1.0e-3, "ok": within_budget}
+        print("%-16s %9.3f ms of %9.3f ms budget: %s" % (name, overhead * 1000.0, budget, "OK" if within_budget else "EXCEEDED"))
+
+    if options.json is not None:
+        with open(options.json, "w") as json_file:
+            json.dump(results, json_file, indent=2, sort_keys=True)
+    if budgets_exceeded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
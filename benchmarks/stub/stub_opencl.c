@@ -0,0 +1,757 @@
+/*
+ * This file is part of clcc package and is licensed under the Simplified BSD license.
+ *    See LICENSE.rst for the full text of the license.
+ *
+ * Stand-in for libOpenCL.so which implements the entry points bound by clcc
+ * and returns canned platforms, devices and binaries. Behaviour is configured
+ * through environment variables:
+ *
+ *   STUB_CL_PLATFORM_LATENCY_US    - delay of clGetPlatformIDs
+ *   STUB_CL_DEVICE_INFO_LATENCY_US - delay of each clGetDeviceInfo call
+ *   STUB_CL_CONTEXT_LATENCY_US     - delay of clCreateContext[FromType]
+ *   STUB_CL_BUILD_LATENCY_US       - delay of clBuildProgram/clCompileProgram/clLinkProgram
+ *                                    for each device built
+ *   STUB_CL_OFFLINE_DEVICES        - number of AMD offline devices (default 4)
+ *   STUB_CL_BINARY_PADDING         - extra bytes appended to every binary
+ *   STUB_CL_ASYNC_BUILDS           - if set, builds with a notify callback run
+ *                                    in a background thread
+ *
+ *   STUB_CL_FLAKY_FILE             - marker file of "#pragma stub flaky" builds
+ *
+ * Sources containing "#error" fail to build, sources containing "#warning"
+ * produce a build log. Faults of vendor compilers are simulated by sources
+ * containing "#pragma stub crash" (abort), "#pragma stub hang" (never return),
+ * "#pragma stub leak" (touch 512 MB of memory and keep it), and
+ * "#pragma stub flaky" (abort unless STUB_CL_FLAKY_FILE exists, creating it).
+ *
+ * Kernel launches sleep for 1 ns per work-item (half of that in programs built
+ * with -cl-fast-relaxed-math) and record the time in their profiling info.
+ */
+
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <pthread.h>
+#include <time.h>
+
+typedef int32_t cl_int;
+typedef uint32_t cl_uint;
+typedef uint64_t cl_ulong;
+
+#define CL_SUCCESS         0
+#define CL_BUILD_PROGRAM_FAILURE -11
+#define CL_COMPILE_PROGRAM_FAILURE -15
+#define CL_LINK_PROGRAM_FAILURE -17
+#define CL_INVALID_VALUE -30
+#define CL_INVALID_BINARY -42
+#define CL_INVALID_KERNEL_NAME -46
+
+#define MAX_DEVICES 64
+
+struct device {
+	const char* name;
+	cl_ulong type;
+	const char* extensions;
+	cl_uint gfxip_major, gfxip_minor;
+};
+
+struct platform {
+	const char* name;
+	const char* version;
+	const char* extensions;
+	int devices_count;
+	int online_devices_count;
+	struct device* devices;
+};
+
+static struct device pocl_devices[] = {
+	{ "pthread-Intel(R) Core(TM) i7", 2, "cl_khr_fp64", 0, 0 },
+};
+
+static const struct device amd_device_templates[] = {
+	{ "Tahiti", 4, "cl_amd_device_attribute_query cl_khr_fp64", 6, 0 },
+	{ "Pitcairn", 4, "cl_amd_device_attribute_query cl_khr_fp64", 6, 0 },
+	{ "Hawaii", 4, "cl_amd_device_attribute_query cl_khr_fp64", 7, 0 },
+	{ "Fiji", 4, "cl_amd_device_attribute_query cl_khr_fp64", 8, 0 },
+};
+
+static struct device amd_devices[MAX_DEVICES];
+
+static struct platform platforms[] = {
+	{ "Portable Computing Language", "OpenCL 1.2 pocl", "cl_khr_icd", 1, 1, pocl_devices },
+	{ "AMD Accelerated Parallel Processing", "OpenCL 2.0 AMD-APP", "cl_khr_icd cl_amd_offline_devices", 4, 1, amd_devices },
+};
+
+#define PLATFORMS_COUNT ((cl_uint) (sizeof(platforms) / sizeof(platforms[0])))
+
+struct context {
+	struct platform* platform;
+	cl_uint devices_count;
+	struct device* devices[MAX_DEVICES];
+};
+
+struct program {
+	char* source;
+	size_t source_size;
+	cl_uint devices_count;
+	struct device* devices[MAX_DEVICES];
+	/* Devices not in the device list of a build have no binary and CL_BUILD_NONE status */
+	int built[MAX_DEVICES];
+	cl_int build_status;
+	int fast_math;
+	char log[256];
+};
+
+static pthread_once_t init_once = PTHREAD_ONCE_INIT;
+static size_t binary_padding = 0;
+
+static void init(void) {
+	const char* offline_devices = getenv("STUB_CL_OFFLINE_DEVICES");
+	int amd_devices_count = offline_devices != NULL ? atoi(offline_devices) : 4;
+	if (amd_devices_count < 1) {
+		amd_devices_count = 1;
+	} else if (amd_devices_count > MAX_DEVICES) {
+		amd_devices_count = MAX_DEVICES;
+	}
+	for (int i = 0; i < amd_devices_count; i++) {
+		amd_devices[i] = amd_device_templates[i % 4];
+	}
+	platforms[1].devices_count = amd_devices_count;
+
+	const char* padding = getenv("STUB_CL_BINARY_PADDING");
+	if (padding != NULL) {
+		binary_padding = (size_t) atol(padding);
+	}
+}
+
+static void delay(const char* variable) {
+	const char* value = getenv(variable);
+	if (value != NULL) {
+		usleep(atoi(value));
+	}
+}
+
+static cl_int return_info(const void* data, size_t size, size_t value_size, void* value, size_t* value_size_ret) {
+	if (value_size_ret != NULL) {
+		*value_size_ret = size;
+	}
+	if (value != NULL) {
+		if (value_size < size) {
+			return CL_INVALID_VALUE;
+		}
+		memcpy(value, data, size);
+	}
+	return CL_SUCCESS;
+}
+
+static cl_int return_string(const char* string, size_t value_size, void* value, size_t* value_size_ret) {
+	return return_info(string, strlen(string) + 1, value_size, value, value_size_ret);
+}
+
+static struct platform* find_device_platform(const struct device* device) {
+	for (cl_uint i = 0; i < PLATFORMS_COUNT; i++) {
+		if (device >= platforms[i].devices && device < platforms[i].devices + platforms[i].devices_count) {
+			return &platforms[i];
+		}
+	}
+	return NULL;
+}
+
+cl_int clGetPlatformIDs(cl_uint num_entries, void** platform_ids, cl_uint* num_platforms) {
+	pthread_once(&init_once, init);
+	delay("STUB_CL_PLATFORM_LATENCY_US");
+	if (num_platforms != NULL) {
+		*num_platforms = PLATFORMS_COUNT;
+	}
+	for (cl_uint i = 0; i < num_entries && i < PLATFORMS_COUNT; i++) {
+		platform_ids[i] = &platforms[i];
+	}
+	return CL_SUCCESS;
+}
+
+cl_int clGetPlatformInfo(void* platform_id, cl_uint param_name, size_t value_size, void* value, size_t* value_size_ret) {
+	const struct platform* platform = platform_id;
+	switch (param_name) {
+		case 0x0900: /* CL_PLATFORM_PROFILE */
+			return return_string("FULL_PROFILE", value_size, value, value_size_ret);
+		case 0x0901: /* CL_PLATFORM_VERSION */
+			return return_string(platform->version, value_size, value, value_size_ret);
+		case 0x0902: /* CL_PLATFORM_NAME */
+			return return_string(platform->name, value_size, value, value_size_ret);
+		case 0x0903: /* CL_PLATFORM_VENDOR */
+			return return_string("clcc stub", value_size, value, value_size_ret);
+		case 0x0904: /* CL_PLATFORM_EXTENSIONS */
+			return return_string(platform->extensions, value_size, value, value_size_ret);
+		default:
+			return CL_INVALID_VALUE;
+	}
+}
+
+cl_int clGetDeviceIDs(void* platform_id, cl_ulong device_type, cl_uint num_entries, void** device_ids, cl_uint* num_devices) {
+	struct platform* platform = platform_id;
+	if (num_devices != NULL) {
+		*num_devices = platform->online_devices_count;
+	}
+	for (cl_uint i = 0; i < num_entries && i < (cl_uint) platform->online_devices_count; i++) {
+		device_ids[i] = &platform->devices[i];
+	}
+	return CL_SUCCESS;
+}
+
+cl_int clGetDeviceInfo(void* device_id, cl_uint param_name, size_t value_size, void* value, size_t* value_size_ret) {
+	const struct device* device = device_id;
+	delay("STUB_CL_DEVICE_INFO_LATENCY_US");
+	switch (param_name) {
+		case 0x1000: /* CL_DEVICE_TYPE */
+			return return_info(&device->type, sizeof(device->type), value_size, value, value_size_ret);
+		case 0x102B: /* CL_DEVICE_NAME */
+			return return_string(device->name, value_size, value, value_size_ret);
+		case 0x102C: /* CL_DEVICE_VENDOR */
+			return return_string("clcc stub", value_size, value, value_size_ret);
+		case 0x102D: /* CL_DRIVER_VERSION */
+			return return_string("1.0 stub", value_size, value, value_size_ret);
+		case 0x102F: /* CL_DEVICE_VERSION */
+			return return_string("OpenCL 1.2 stub", value_size, value, value_size_ret);
+		case 0x1030: /* CL_DEVICE_EXTENSIONS */
+			return return_string(device->extensions, value_size, value, value_size_ret);
+		case 0x1031: /* CL_DEVICE_PLATFORM */
+		{
+			const void* platform = find_device_platform(device);
+			return return_info(&platform, sizeof(platform), value_size, value, value_size_ret);
+		}
+		case 0x404A: /* CL_DEVICE_GFXIP_MAJOR_AMD */
+			return return_info(&device->gfxip_major, sizeof(cl_uint), value_size, value, value_size_ret);
+		case 0x404B: /* CL_DEVICE_GFXIP_MINOR_AMD */
+			return return_info(&device->gfxip_minor, sizeof(cl_uint), value_size, value, value_size_ret);
+		default:
+			return CL_INVALID_VALUE;
+	}
+}
+
+cl_int clReleaseDevice(void* device_id) {
+	return CL_SUCCESS;
+}
+
+void* clCreateContext(const intptr_t* properties, cl_uint num_devices, void* const* device_ids, void* pfn_notify, void* user_data, cl_int* errcode_ret) {
+	delay("STUB_CL_CONTEXT_LATENCY_US");
+	if (num_devices == 0 || num_devices > MAX_DEVICES) {
+		if (errcode_ret != NULL) {
+			*errcode_ret = CL_INVALID_VALUE;
+		}
+		return NULL;
+	}
+	struct context* context = calloc(1, sizeof(struct context));
+	context->platform = find_device_platform(device_ids[0]);
+	context->devices_count = num_devices;
+	memcpy(context->devices, device_ids, num_devices * sizeof(void*));
+	if (errcode_ret != NULL) {
+		*errcode_ret = CL_SUCCESS;
+	}
+	return context;
+}
+
+void* clCreateContextFromType(const intptr_t* properties, cl_ulong device_type, void* pfn_notify, void* user_data, cl_int* errcode_ret) {
+	delay("STUB_CL_CONTEXT_LATENCY_US");
+	struct context* context = calloc(1, sizeof(struct context));
+	/* properties: CL_CONTEXT_PLATFORM, platform, CL_CONTEXT_OFFLINE_DEVICES_AMD, 1, 0 */
+	context->platform = (struct platform*) properties[1];
+	context->devices_count = context->platform->devices_count;
+	for (cl_uint i = 0; i < context->devices_count; i++) {
+		context->devices[i] = &context->platform->devices[i];
+	}
+	if (errcode_ret != NULL) {
+		*errcode_ret = CL_SUCCESS;
+	}
+	return context;
+}
+
+cl_int clGetContextInfo(void* context_id, cl_uint param_name, size_t value_size, void* value, size_t* value_size_ret) {
+	const struct context* context = context_id;
+	switch (param_name) {
+		case 0x1081: /* CL_CONTEXT_DEVICES */
+			return return_info(context->devices, context->devices_count * sizeof(void*), value_size, value, value_size_ret);
+		case 0x1083: /* CL_CONTEXT_NUM_DEVICES */
+			return return_info(&context->devices_count, sizeof(cl_uint), value_size, value, value_size_ret);
+		default:
+			return CL_INVALID_VALUE;
+	}
+}
+
+cl_int clReleaseContext(void* context_id) {
+	free(context_id);
+	return CL_SUCCESS;
+}
+
+void* clCreateProgramWithSource(void* context_id, cl_uint count, const char** strings, const size_t* lengths, cl_int* errcode_ret) {
+	const struct context* context = context_id;
+	struct program* program = calloc(1, sizeof(struct program));
+	size_t source_size = 0;
+	for (cl_uint i = 0; i < count; i++) {
+		source_size += lengths != NULL && lengths[i] != 0 ? lengths[i] : strlen(strings[i]);
+	}
+	program->source = malloc(source_size + 1);
+	for (cl_uint i = 0; i < count; i++) {
+		const size_t length = lengths != NULL && lengths[i] != 0 ? lengths[i] : strlen(strings[i]);
+		memcpy(program->source + program->source_size, strings[i], length);
+		program->source_size += length;
+	}
+	program->source[program->source_size] = '\0';
+	program->devices_count = context->devices_count;
+	memcpy(program->devices, context->devices, context->devices_count * sizeof(void*));
+	if (errcode_ret != NULL) {
+		*errcode_ret = CL_SUCCESS;
+	}
+	return program;
+}
+
+void* clCreateProgramWithIL(void* context_id, const void* il, size_t length, cl_int* errcode_ret) {
+	/* Modules are not compiled: the program source is a description of the module */
+	const uint8_t* il_bytes = il;
+	if (length < 20 || *(const uint32_t*) il != UINT32_C(0x07230203)) {
+		if (errcode_ret != NULL) {
+			*errcode_ret = CL_INVALID_VALUE;
+		}
+		return NULL;
+	}
+	uint32_t hash = UINT32_C(2166136261);
+	for (size_t i = 0; i < length; i++) {
+		hash = (hash ^ il_bytes[i]) * UINT32_C(16777619);
+	}
+	char description[64];
+	snprintf(description, sizeof(description), "// SPIR-V module, %zu bytes, FNV-1a %08X\n", length, hash);
+	const char* source = description;
+	return clCreateProgramWithSource(context_id, 1, &source, NULL, errcode_ret);
+}
+
+void* clCreateProgramWithBinary(void* context_id, cl_uint num_devices, void* const* device_ids, const size_t* lengths,
+	const unsigned char** binaries, cl_int* binary_status, cl_int* errcode_ret)
+{
+	/* Binaries produced by this library carry the program source after the device name */
+	const char* device_name = ((struct device*) device_ids[0])->name;
+	const size_t header_size = 8 + strlen(device_name);
+	if (num_devices == 0 || lengths[0] < header_size + binary_padding || memcmp(binaries[0], "STUBBIN:", 8) != 0 ||
+		memcmp(binaries[0] + 8, device_name, header_size - 8) != 0) {
+		if (errcode_ret != NULL) {
+			*errcode_ret = CL_INVALID_BINARY;
+		}
+		return NULL;
+	}
+	const char* source = (const char*) binaries[0] + header_size;
+	const size_t source_size = lengths[0] - header_size - binary_padding;
+	cl_int status;
+	struct program* program = clCreateProgramWithSource(context_id, 1, &source, &source_size, &status);
+	program->devices_count = num_devices;
+	memcpy(program->devices, device_ids, num_devices * sizeof(void*));
+	for (cl_uint i = 0; i < num_devices; i++) {
+		program->built[i] = 1;
+		if (binary_status != NULL) {
+			binary_status[i] = CL_SUCCESS;
+		}
+	}
+	if (errcode_ret != NULL) {
+		*errcode_ret = CL_SUCCESS;
+	}
+	return program;
+}
+
+struct build_task {
+	struct program* program;
+	void (*pfn_notify)(void*, void*);
+	void* user_data;
+};
+
+static void simulate_faults(const char* source) {
+	if (strstr(source, "#pragma stub crash") != NULL) {
+		abort();
+	} else if (strstr(source, "#pragma stub hang") != NULL) {
+		for (;;) {
+			pause();
+		}
+	} else if (strstr(source, "#pragma stub leak") != NULL) {
+		const size_t leak_size = 512 * 1024 * 1024;
+		memset(malloc(leak_size), 1, leak_size);
+	} else if (strstr(source, "#pragma stub flaky") != NULL) {
+		const char* marker = getenv("STUB_CL_FLAKY_FILE");
+		if (marker == NULL || open(marker, O_CREAT | O_EXCL | O_WRONLY, 0666) >= 0) {
+			abort();
+		}
+	}
+}
+
+static cl_int run_build(struct program* program, cl_int failure_status) {
+	for (cl_uint i = 0; i < program->devices_count; i++) {
+		if (program->built[i]) {
+			delay("STUB_CL_BUILD_LATENCY_US");
+		}
+	}
+	simulate_faults(program->source);
+	cl_int status = CL_SUCCESS;
+	if (strstr(program->source, "#error") != NULL) {
+		strcpy(program->log, "error: stub build failure");
+		status = failure_status;
+	} else if (strstr(program->source, "#warning") != NULL) {
+		strcpy(program->log, "warning: stub build warning");
+	}
+	program->build_status = status == CL_SUCCESS ? 0 /* CL_BUILD_SUCCESS */ : -2 /* CL_BUILD_ERROR */;
+	return status;
+}
+
+static void* run_build_task(void* argument) {
+	struct build_task* task = argument;
+	run_build(task->program, CL_BUILD_PROGRAM_FAILURE);
+	task->pfn_notify(task->program, task->user_data);
+	free(task);
+	return NULL;
+}
+
+static cl_int build(struct program* program, cl_uint num_devices, void* const* device_ids, cl_int failure_status,
+	void (*pfn_notify)(void*, void*), void* user_data)
+{
+	for (cl_uint i = 0; i < program->devices_count; i++) {
+		program->built[i] = num_devices == 0;
+		for (cl_uint j = 0; j < num_devices; j++) {
+			program->built[i] |= program->devices[i] == device_ids[j];
+		}
+	}
+	if (pfn_notify != NULL && getenv("STUB_CL_ASYNC_BUILDS") != NULL) {
+		struct build_task* task = malloc(sizeof(struct build_task));
+		task->program = program;
+		task->pfn_notify = pfn_notify;
+		task->user_data = user_data;
+		program->build_status = -3; /* CL_BUILD_IN_PROGRESS */
+		pthread_t thread;
+		pthread_attr_t attributes;
+		pthread_attr_init(&attributes);
+		pthread_attr_setdetachstate(&attributes, PTHREAD_CREATE_DETACHED);
+		pthread_create(&thread, &attributes, run_build_task, task);
+		pthread_attr_destroy(&attributes);
+		return CL_SUCCESS;
+	}
+	const cl_int status = run_build(program, failure_status);
+	if (pfn_notify != NULL) {
+		pfn_notify(program, user_data);
+	}
+	return status;
+}
+
+cl_int clBuildProgram(void* program, cl_uint num_devices, void* const* device_ids, const char* options,
+	void (*pfn_notify)(void*, void*), void* user_data)
+{
+	((struct program*) program)->fast_math = options != NULL && strstr(options, "-cl-fast-relaxed-math") != NULL;
+	return build(program, num_devices, device_ids, CL_BUILD_PROGRAM_FAILURE, pfn_notify, user_data);
+}
+
+cl_int clCompileProgram(void* program, cl_uint num_devices, void* const* device_ids, const char* options,
+	cl_uint num_input_headers, void* const* input_headers, const char** header_include_names,
+	void (*pfn_notify)(void*, void*), void* user_data)
+{
+	return build(program, num_devices, device_ids, CL_COMPILE_PROGRAM_FAILURE, pfn_notify, user_data);
+}
+
+void* clLinkProgram(void* context_id, cl_uint num_devices, void* const* device_ids, const char* options,
+	cl_uint num_input_programs, void* const* input_programs,
+	void (*pfn_notify)(void*, void*), void* user_data, cl_int* errcode_ret)
+{
+	/* The linked program is the concatenation of the sources of its inputs */
+	const char* sources[MAX_DEVICES];
+	size_t lengths[MAX_DEVICES];
+	if (num_input_programs == 0 || num_input_programs > MAX_DEVICES) {
+		if (errcode_ret != NULL) {
+			*errcode_ret = CL_INVALID_VALUE;
+		}
+		return NULL;
+	}
+	for (cl_uint i = 0; i < num_input_programs; i++) {
+		const struct program* input_program = input_programs[i];
+		sources[i] = input_program->source;
+		lengths[i] = input_program->source_size;
+	}
+	cl_int status;
+	struct program* program = clCreateProgramWithSource(context_id, num_input_programs, sources, lengths, &status);
+	/* Linked programs are associated with the devices they are linked for */
+	if (num_devices != 0) {
+		program->devices_count = num_devices;
+		memcpy(program->devices, device_ids, num_devices * sizeof(void*));
+	}
+	status = build(program, num_devices, device_ids, CL_LINK_PROGRAM_FAILURE, pfn_notify, user_data);
+	if (errcode_ret != NULL) {
+		*errcode_ret = status;
+	}
+	return program;
+}
+
+cl_int clGetProgramBuildInfo(void* program_id, void* device_id, cl_uint param_name, size_t value_size, void* value, size_t* value_size_ret) {
+	const struct program* program = program_id;
+	cl_int build_status = -1; /* CL_BUILD_NONE */
+	for (cl_uint i = 0; i < program->devices_count; i++) {
+		if (program->devices[i] == device_id && program->built[i]) {
+			build_status = program->build_status;
+		}
+	}
+	switch (param_name) {
+		case 0x1181: /* CL_PROGRAM_BUILD_STATUS */
+			return return_info(&build_status, sizeof(cl_int), value_size, value, value_size_ret);
+		case 0x1183: /* CL_PROGRAM_BUILD_LOG */
+			return return_string(program->log, value_size, value, value_size_ret);
+		default:
+			return CL_INVALID_VALUE;
+	}
+}
+
+/* Kernel names are the identifiers after "kernel void " in the source, separated by semicolons */
+static size_t get_kernel_names(const struct program* program, char* names, size_t names_size, size_t* kernels_count) {
+	size_t length = 0;
+	*kernels_count = 0;
+	names[0] = '\0';
+	for (const char* match = strstr(program->source, "kernel void "); match != NULL; match = strstr(match, "kernel void ")) {
+		match += strlen("kernel void ");
+		const size_t name_length = strspn(match, "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_");
+		if (name_length == 0 || length + name_length + 2 > names_size) {
+			continue;
+		}
+		if (*kernels_count != 0) {
+			names[length++] = ';';
+		}
+		memcpy(names + length, match, name_length);
+		length += name_length;
+		names[length] = '\0';
+		*kernels_count += 1;
+	}
+	return length;
+}
+
+static size_t get_binary_size(const struct program* program, cl_uint index) {
+	if (!program->built[index]) {
+		return 0;
+	}
+	return 8 + strlen(program->devices[index]->name) + program->source_size + binary_padding;
+}
+
+cl_int clGetProgramInfo(void* program_id, cl_uint param_name, size_t value_size, void* value, size_t* value_size_ret) {
+	const struct program* program = program_id;
+	switch (param_name) {
+		case 0x1162: /* CL_PROGRAM_NUM_DEVICES */
+			return return_info(&program->devices_count, sizeof(cl_uint), value_size, value, value_size_ret);
+		case 0x1167: /* CL_PROGRAM_NUM_KERNELS */
+		case 0x1168: /* CL_PROGRAM_KERNEL_NAMES */
+		{
+			char names[4096];
+			size_t kernels_count;
+			get_kernel_names(program, names, sizeof(names), &kernels_count);
+			if (param_name == 0x1167) {
+				return return_info(&kernels_count, sizeof(size_t), value_size, value, value_size_ret);
+			}
+			return return_string(names, value_size, value, value_size_ret);
+		}
+		case 0x1165: /* CL_PROGRAM_BINARY_SIZES */
+		{
+			size_t binary_sizes[MAX_DEVICES];
+			for (cl_uint i = 0; i < program->devices_count; i++) {
+				binary_sizes[i] = get_binary_size(program, i);
+			}
+			return return_info(binary_sizes, program->devices_count * sizeof(size_t), value_size, value, value_size_ret);
+		}
+		case 0x1166: /* CL_PROGRAM_BINARIES */
+		{
+			if (value_size_ret != NULL) {
+				*value_size_ret = program->devices_count * sizeof(void*);
+			}
+			if (value == NULL) {
+				return CL_SUCCESS;
+			}
+			if (value_size < program->devices_count * sizeof(void*)) {
+				return CL_INVALID_VALUE;
+			}
+			/* Binary layout: "STUBBIN:", device name, source, zero padding */
+			unsigned char** binaries = value;
+			for (cl_uint i = 0; i < program->devices_count; i++) {
+				unsigned char* binary = binaries[i];
+				if (binary == NULL || !program->built[i]) {
+					continue;
+				}
+				const size_t name_length = strlen(program->devices[i]->name);
+				memcpy(binary, "STUBBIN:", 8);
+				memcpy(binary + 8, program->devices[i]->name, name_length);
+				memcpy(binary + 8 + name_length, program->source, program->source_size);
+				memset(binary + 8 + name_length + program->source_size, 0, binary_padding);
+			}
+			return CL_SUCCESS;
+		}
+		default:
+			return CL_INVALID_VALUE;
+	}
+}
+
+struct kernel {
+	const struct program* program;
+	char name[128];
+};
+
+void* clCreateKernel(void* program_id, const char* kernel_name, cl_int* errcode_ret) {
+	const struct program* program = program_id;
+	char names[4096];
+	size_t kernels_count;
+	const size_t name_length = strlen(kernel_name);
+	get_kernel_names(program, names, sizeof(names), &kernels_count);
+	const char* match = strstr(names, kernel_name);
+	while (match != NULL && ((match != names && match[-1] != ';') || (match[name_length] != '\0' && match[name_length] != ';'))) {
+		match = strstr(match + 1, kernel_name);
+	}
+	if (match == NULL || name_length >= sizeof(((struct kernel*) NULL)->name)) {
+		if (errcode_ret != NULL) {
+			*errcode_ret = CL_INVALID_KERNEL_NAME;
+		}
+		return NULL;
+	}
+	struct kernel* kernel = calloc(1, sizeof(struct kernel));
+	kernel->program = program;
+	memcpy(kernel->name, kernel_name, name_length);
+	if (errcode_ret != NULL) {
+		*errcode_ret = CL_SUCCESS;
+	}
+	return kernel;
+}
+
+cl_int clGetKernelWorkGroupInfo(void* kernel_id, void* device_id, cl_uint param_name, size_t value_size, void* value, size_t* value_size_ret) {
+	const struct kernel* kernel = kernel_id;
+	switch (param_name) {
+		case 0x11B0: /* CL_KERNEL_WORK_GROUP_SIZE */
+		{
+			const size_t work_group_size = 256;
+			return return_info(&work_group_size, sizeof(size_t), value_size, value, value_size_ret);
+		}
+		case 0x11B1: /* CL_KERNEL_COMPILE_WORK_GROUP_SIZE */
+		{
+			const size_t compile_work_group_size[3] = { 0, 0, 0 };
+			return return_info(compile_work_group_size, sizeof(compile_work_group_size), value_size, value, value_size_ret);
+		}
+		case 0x11B2: /* CL_KERNEL_LOCAL_MEM_SIZE */
+		{
+			/* 1 KB per "local " in the program source */
+			cl_ulong local_mem_size = 0;
+			for (const char* match = strstr(kernel->program->source, "local "); match != NULL; match = strstr(match + 1, "local ")) {
+				local_mem_size += 1024;
+			}
+			return return_info(&local_mem_size, sizeof(cl_ulong), value_size, value, value_size_ret);
+		}
+		case 0x11B3: /* CL_KERNEL_PREFERRED_WORK_GROUP_SIZE_MULTIPLE */
+		{
+			const size_t work_group_size_multiple = 64;
+			return return_info(&work_group_size_multiple, sizeof(size_t), value_size, value, value_size_ret);
+		}
+		case 0x11B4: /* CL_KERNEL_PRIVATE_MEM_SIZE */
+		{
+			const cl_ulong private_mem_size = 4 * strlen(kernel->name);
+			return return_info(&private_mem_size, sizeof(cl_ulong), value_size, value, value_size_ret);
+		}
+		default:
+			return CL_INVALID_VALUE;
+	}
+}
+
+cl_int clReleaseKernel(void* kernel_id) {
+	free(kernel_id);
+	return CL_SUCCESS;
+}
+
+cl_int clSetKernelArg(void* kernel_id, cl_uint arg_index, size_t arg_size, const void* arg_value) {
+	return CL_SUCCESS;
+}
+
+void* clCreateCommandQueue(void* context_id, void* device_id, cl_ulong properties, cl_int* errcode_ret) {
+	if (errcode_ret != NULL) {
+		*errcode_ret = CL_SUCCESS;
+	}
+	return calloc(1, 1);
+}
+
+cl_int clReleaseCommandQueue(void* queue_id) {
+	free(queue_id);
+	return CL_SUCCESS;
+}
+
+void* clCreateBuffer(void* context_id, cl_ulong flags, size_t size, void* host_ptr, cl_int* errcode_ret) {
+	void* buffer = malloc(size != 0 ? size : 1);
+	if (buffer != NULL && host_ptr != NULL) {
+		memcpy(buffer, host_ptr, size);
+	}
+	if (errcode_ret != NULL) {
+		*errcode_ret = buffer != NULL ? CL_SUCCESS : -4 /* CL_MEM_OBJECT_ALLOCATION_FAILURE */;
+	}
+	return buffer;
+}
+
+cl_int clReleaseMemObject(void* buffer_id) {
+	free(buffer_id);
+	return CL_SUCCESS;
+}
+
+struct event {
+	cl_ulong start, end;
+};
+
+static cl_ulong get_timestamp(void) {
+	struct timespec time;
+	clock_gettime(CLOCK_MONOTONIC, &time);
+	return (cl_ulong) time.tv_sec * 1000000000 + (cl_ulong) time.tv_nsec;
+}
+
+cl_int clEnqueueNDRangeKernel(void* queue_id, void* kernel_id, cl_uint work_dim, const size_t* global_work_offset,
+	const size_t* global_work_size, const size_t* local_work_size,
+	cl_uint num_events_in_wait_list, void* const* event_wait_list, void** event_id)
+{
+	const struct kernel* kernel = kernel_id;
+	if (work_dim < 1 || work_dim > 3) {
+		return -53; /* CL_INVALID_WORK_DIMENSION */
+	}
+	cl_ulong work_items = 1;
+	for (cl_uint i = 0; i < work_dim; i++) {
+		if (local_work_size != NULL && (local_work_size[i] == 0 || global_work_size[i] % local_work_size[i] != 0)) {
+			return -54; /* CL_INVALID_WORK_GROUP_SIZE */
+		}
+		work_items *= global_work_size[i];
+	}
+	struct event* event = calloc(1, sizeof(struct event));
+	event->start = get_timestamp();
+	const cl_ulong duration = kernel->program->fast_math ? work_items / 2 : work_items;
+	struct timespec sleep_time = { (time_t) (duration / 1000000000), (long) (duration % 1000000000) };
+	nanosleep(&sleep_time, NULL);
+	event->end = get_timestamp();
+	if (event_id != NULL) {
+		*event_id = event;
+	} else {
+		free(event);
+	}
+	return CL_SUCCESS;
+}
+
+cl_int clWaitForEvents(cl_uint num_events, void* const* event_list) {
+	return CL_SUCCESS;
+}
+
+cl_int clGetEventProfilingInfo(void* event_id, cl_uint param_name, size_t value_size, void* value, size_t* value_size_ret) {
+	const struct event* event = event_id;
+	switch (param_name) {
+		case 0x1282: /* CL_PROFILING_COMMAND_START */
+			return return_info(&event->start, sizeof(cl_ulong), value_size, value, value_size_ret);
+		case 0x1283: /* CL_PROFILING_COMMAND_END */
+			return return_info(&event->end, sizeof(cl_ulong), value_size, value, value_size_ret);
+		default:
+			return CL_INVALID_VALUE;
+	}
+}
+
+cl_int clReleaseEvent(void* event_id) {
+	free(event_id);
+	return CL_SUCCESS;
+}
+
+cl_int clReleaseProgram(void* program_id) {
+	struct program* program = program_id;
+	free(program->source);
+	free(program);
+	return CL_SUCCESS;
+}
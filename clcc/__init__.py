@@ -2,8 +2,41 @@
 #    See LICENSE.rst for the full text of the license.
 
 from __future__ import absolute_import
-
-from .clcc import main
+import sys
 
 __version_info__ = (1, 0, 0)
 __version__ = '.'.join(map(str, __version_info__))
+
+# Public names and their submodules. The client of the compile server imports none of these: on Python 3.7+ they are
+# imported on first use, so that its startup does not load the OpenCL bindings and the modules of every feature.
+_exports = {
+    "main": "clcc",
+    "Session": "session",
+    "CompileResult": "session",
+    "Archive": "archive",
+    "ArchiveEntry": "archive",
+    "ProgramLoader": "loader",
+    "LoadedProgram": "loader",
+    "SpirvModule": "spirv",
+    "Error": "report",
+}
+
+if sys.version_info >= (3, 7):
+    import importlib
+
+    def __getattr__(name):
+        if name not in _exports:
+            raise AttributeError("module %s has no attribute %s" % (__name__, name))
+        value = getattr(importlib.import_module("." + _exports[name], __name__), name)
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_exports))
+else:
+    from .clcc import main
+    from .session import Session, CompileResult
+    from .archive import Archive, ArchiveEntry
+    from .loader import ProgramLoader, LoadedProgram
+    from .spirv import SpirvModule
+    from .report import Error
@@ -0,0 +1,240 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import mmap
+import binascii
+import struct
+import threading
+import collections
+
+from .cache import get_prebuilt_key
+from . import report
+
+
+# An archive is a fixed-size header, the binaries, a table of UTF-8 strings, and an index of fixed-size entries.
+# The index is sorted by the hashes of the entry name and the device name, so a runtime can map the file and
+# binary-search it for its device without parsing anything else. All integers are little-endian.
+ARCHIVE_MAGIC = b"CLCCFAT\0"
+ARCHIVE_FORMAT_VERSION = 2
+
+# Magic, format version, entry size, number of entries, offset of the index, offset of the string table
+_header = struct.Struct("<8sIIQQQ")
+# Name hash, device name hash, binary offset, binary size, SHA-256 of the source, prebuilt key (of the source, the headers
+# it includes and the flags), offset and size of the name, device name and flags in the string table,
+# architecture kind (ARCH_*), major and minor architecture version, and reserved fields
+_entry = struct.Struct("<QQQQ32s32sIIIIIIBBBBI")
+_key = struct.Struct("<QQ")
+
+# Binaries start at multiples of this alignment
+BINARY_ALIGNMENT = 64
+
+ARCH_NONE = 0
+ARCH_GFXIP = 1
+ARCH_SM = 2
+
+
+class ArchiveEntry(collections.namedtuple("ArchiveEntry",
+        ["name", "device_name", "arch", "flags", "source_hash", "prebuilt_key", "offset", "size"])):
+    # arch is ("gfxip", major, minor), ("sm", major, minor), or None; source_hash is the SHA-256 digest of the source,
+    # and prebuilt_key is the cache.get_prebuilt_key of the build, which also covers the included headers
+    pass
+
+
+def get_string_hash(text):
+    # First 64 bits of SHA-256; imported on first use to keep hashlib out of the startup time
+    import hashlib
+    return struct.unpack("<Q", hashlib.sha256(text.encode("utf8")).digest()[:8])[0]
+
+
+def get_source_hash(source_code):
+    import hashlib
+    return hashlib.sha256(source_code.encode("utf8")).digest()
+
+
+def get_device_arch(device_info):
+    # Architecture fields of a device in the inventory, in the archive encoding
+    if device_info is not None and device_info.get("gfxip") is not None:
+        return (ARCH_GFXIP,) + tuple(device_info["gfxip"])
+    elif device_info is not None and device_info.get("compute_capability") is not None:
+        return (ARCH_SM,) + tuple(device_info["compute_capability"])
+    return ARCH_NONE, 0, 0
+
+
+class ArchiveOutput:
+    # Packs the binaries of all inputs, devices and variants of a build into one archive.
+    # Binaries are appended to a temporary file as builds complete; finish() adds the index and renames it into place.
+    def __init__(self, path):
+        import tempfile
+        self.path = path
+        fd, self._temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+        self._file = os.fdopen(fd, "w+b")
+        self._file.write(b"\0" * BINARY_ALIGNMENT)
+        self._entries = []
+        # Entry name -> input file which added it
+        self._inputs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_entry_name(input_filename, variant=None):
+        name = os.path.splitext(os.path.basename(input_filename))[0]
+        if variant is not None:
+            name += ".v%d" % variant
+        return name
+
+    def _add_name(self, name, input_filename):
+        # Lookups find entries by name and device name only: two inputs with the same name would shadow each other
+        if name in self._inputs:
+            report.error("archive entry %s of %s is already added from %s (rename one of the inputs)" % (name, input_filename, self._inputs[name]))
+        self._inputs[name] = input_filename
+
+    def add(self, target, input_filename, clflags, source_code, header_paths, binaries, variant=None, header_cache=None):
+        name = self.get_entry_name(input_filename, variant)
+        source_hash = get_source_hash(source_code)
+        prebuilt_key = binascii.unhexlify(get_prebuilt_key(source_code, header_paths, clflags, header_cache))
+        device_names = target.device_names
+        device_infos = target.device_infos or [None] * len(device_names)
+        with self._lock:
+            self._add_name(name, input_filename)
+            added_device_names = set()
+            for device_name, device_info, binary in zip(device_names, device_infos, binaries):
+                # Devices with the same name share an entry
+                if device_name in added_device_names:
+                    continue
+                added_device_names.add(device_name)
+                offset = self._file.tell()
+                self._file.write(memoryview(binary))
+                padding = -self._file.tell() % BINARY_ALIGNMENT
+                self._file.write(b"\0" * padding)
+                self._entries.append((name, device_name, get_device_arch(device_info), clflags, source_hash, prebuilt_key, offset, len(binary)))
+
+    def add_duplicate(self, input_filename, variant, first_variant):
+        # Entries of a sweep variant which share the binaries of an identical earlier variant
+        name, first_name = self.get_entry_name(input_filename, variant), self.get_entry_name(input_filename, first_variant)
+        with self._lock:
+            self._add_name(name, input_filename)
+            self._entries += [(name,) + entry[1:] for entry in self._entries if entry[0] == first_name]
+
+    def finish(self):
+        with self._lock:
+            strings = bytearray()
+            string_offsets = {}
+
+            def add_string(text):
+                data = text.encode("utf8")
+                if data not in string_offsets:
+                    string_offsets[data] = len(strings)
+                    strings.extend(data)
+                return string_offsets[data], len(data)
+
+            index = []
+            for name, device_name, arch, clflags, source_hash, prebuilt_key, offset, size in self._entries:
+                key = get_string_hash(name), get_string_hash(device_name)
+                index.append((key, (offset, size, source_hash, prebuilt_key) + add_string(name) + add_string(device_name) + add_string(clflags) + arch))
+            index.sort(key=lambda index_entry: index_entry[0])
+
+            strings_offset = self._file.tell()
+            self._file.write(strings)
+            self._file.write(b"\0" * (-self._file.tell() % 8))
+            index_offset = self._file.tell()
+            for key, fields in index:
+                self._file.write(_entry.pack(*(key + fields + (0, 0))))
+            self._file.seek(0)
+            self._file.write(_header.pack(ARCHIVE_MAGIC, ARCHIVE_FORMAT_VERSION, _entry.size, len(index), index_offset, strings_offset))
+            self._file.close()
+            # Temporary files are private: give the archive the permissions of a regular output file
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(self._temp_path, 0o666 & ~umask)
+            os.rename(self._temp_path, self.path)
+        return len(index)
+
+    def discard(self):
+        with self._lock:
+            self._file.close()
+            os.unlink(self._temp_path)
+
+
+class Archive:
+    # Read-only view of an archive: only the header is parsed on open, and lookups binary-search the mapped index.
+    # Errors raise report.Error.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as archive_file:
+            try:
+                self._map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error):
+                report.error("invalid archive %s: file is empty" % path)
+        if len(self._map) < _header.size:
+            self.close()
+            report.error("invalid archive %s: file is truncated" % path)
+        magic, version, entry_size, self._count, self._index_offset, self._strings_offset = _header.unpack_from(self._map, 0)
+        if magic != ARCHIVE_MAGIC:
+            self.close()
+            report.error("invalid archive %s: not a clcc archive" % path)
+        elif version != ARCHIVE_FORMAT_VERSION or entry_size != _entry.size:
+            self.close()
+            report.error("unsupported archive %s: format version %d" % (path, version))
+        elif self._index_offset + self._count * _entry.size > len(self._map):
+            self.close()
+            report.error("invalid archive %s: file is truncated" % path)
+
+    def __len__(self):
+        return self._count
+
+    def _get_string(self, offset, size):
+        start = self._strings_offset + offset
+        return self._map[start:start + size].decode("utf8")
+
+    def get_entry(self, index):
+        name_hash, device_hash, offset, size, source_hash, prebuilt_key, name_offset, name_size, device_offset, device_size, \
+            flags_offset, flags_size, arch_kind, arch_major, arch_minor, _, _ = \
+            _entry.unpack_from(self._map, self._index_offset + index * _entry.size)
+        arch = {ARCH_GFXIP: "gfxip", ARCH_SM: "sm"}.get(arch_kind)
+        return ArchiveEntry(self._get_string(name_offset, name_size), self._get_string(device_offset, device_size),
+            None if arch is None else (arch, arch_major, arch_minor),
+            self._get_string(flags_offset, flags_size), source_hash, binascii.hexlify(prebuilt_key).decode("ascii"), offset, size)
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self.get_entry(index)
+
+    def _get_key(self, index):
+        return _key.unpack_from(self._map, self._index_offset + index * _entry.size)
+
+    def find(self, name, device_name):
+        # Entries of the named input (or sweep variant, "name.v<N>") built for the device; usually at most one
+        key = get_string_hash(name), get_string_hash(device_name)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self._count and self._get_key(low) == key:
+            entry = self.get_entry(low)
+            # Hashes may collide: compare the strings too
+            if entry.name == name and entry.device_name == device_name:
+                entries.append(entry)
+            low += 1
+        return entries
+
+    def read(self, entry):
+        # Zero-copy view of the binary in the mapped file: release it before the archive is closed
+        return memoryview(self._map)[entry.offset:entry.offset + entry.size]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
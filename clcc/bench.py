@@ -0,0 +1,181 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import re
+import struct
+import random
+import threading
+import collections
+from ctypes import c_int8, c_uint8, c_int16, c_uint16, c_int32, c_uint32, c_int64, c_uint64, c_float, c_double, c_void_p, sizeof
+
+from .opencl import QUEUE_PROFILING_ENABLE as CL_QUEUE_PROFILING_ENABLE, \
+    MEM_READ_WRITE as CL_MEM_READ_WRITE, \
+    MEM_COPY_HOST_PTR as CL_MEM_COPY_HOST_PTR, \
+    PROFILING_COMMAND_START as CL_PROFILING_COMMAND_START, \
+    PROFILING_COMMAND_END as CL_PROFILING_COMMAND_END
+from . import report
+
+
+# OpenCL C type name -> ctypes type and struct format of buffer elements and scalar arguments
+_ARG_TYPES = {
+    "char": (c_int8, "b"),
+    "uchar": (c_uint8, "B"),
+    "short": (c_int16, "h"),
+    "ushort": (c_uint16, "H"),
+    "int": (c_int32, "i"),
+    "uint": (c_uint32, "I"),
+    "long": (c_int64, "q"),
+    "ulong": (c_uint64, "Q"),
+    "float": (c_float, "f"),
+    "double": (c_double, "d")
+}
+
+_SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+# Buffers are filled by repeating a block of pseudo-random elements
+_BLOCK_ELEMENTS = 4096
+
+# kind is "buffer" (value is the number of elements), "local" (value is the size in bytes) or "scalar"
+BenchArg = collections.namedtuple("BenchArg", ["kind", "type_name", "value"])
+
+BenchResult = collections.namedtuple("BenchResult", ["name", "device_id", "device_name", "kernel", "times"])
+
+
+def parse_bench_args(spec):
+    # Comma-separated kernel arguments, in order:
+    #   TYPE[COUNT]  global buffer of COUNT (with an optional K, M or G suffix) elements of TYPE
+    #   local[BYTES] local memory of BYTES bytes
+    #   TYPE=VALUE   scalar
+    args = []
+    for arg_spec in filter(None, [arg_spec.strip() for arg_spec in (spec or "").split(",")]):
+        buffer_match = re.match(r"^(\w+)\[(\d+)([KMG]?)\]$", arg_spec)
+        scalar_match = re.match(r"^(\w+)=(.+)$", arg_spec)
+        if buffer_match is not None and buffer_match.group(1) == "local":
+            args.append(BenchArg("local", None, int(buffer_match.group(2)) * _SIZE_SUFFIXES[buffer_match.group(3)]))
+        elif buffer_match is not None and buffer_match.group(1) in _ARG_TYPES:
+            args.append(BenchArg("buffer", buffer_match.group(1), int(buffer_match.group(2)) * _SIZE_SUFFIXES[buffer_match.group(3)]))
+        elif scalar_match is not None and scalar_match.group(1) in _ARG_TYPES:
+            type_name, value = scalar_match.groups()
+            try:
+                args.append(BenchArg("scalar", type_name, float(value) if type_name in ["float", "double"] else int(value, 0)))
+            except ValueError:
+                report.error("invalid value %s of kernel argument %s" % (value, arg_spec))
+        else:
+            report.error("invalid kernel argument %s: TYPE[COUNT], local[BYTES] or TYPE=VALUE required (types: %s)" %
+                         (arg_spec, ", ".join(sorted(_ARG_TYPES))))
+    return args
+
+
+def parse_work_size(spec, option_name):
+    # Work sizes are 1 to 3 comma-separated dimensions
+    try:
+        work_size = [int(dimension) for dimension in spec.split(",")]
+    except ValueError:
+        work_size = []
+    if not 1 <= len(work_size) <= 3 or any(dimension <= 0 for dimension in work_size):
+        report.error("invalid %s value %s: 1 to 3 comma-separated positive sizes required" % (option_name, spec))
+    return work_size
+
+
+def _get_buffer_data(arg, seed):
+    # Floating-point elements are in [0, 1) and integers in [0, 256), so that data-dependent code runs normally
+    element_type, element_format = _ARG_TYPES[arg.type_name]
+    generator = random.Random(seed)
+    if arg.type_name in ["float", "double"]:
+        block = [generator.random() for _ in range(min(arg.value, _BLOCK_ELEMENTS))]
+    else:
+        block = [generator.randrange(128 if arg.type_name == "char" else 256) for _ in range(min(arg.value, _BLOCK_ELEMENTS))]
+    block_data = struct.pack("<%d%s" % (len(block), element_format), *block)
+    repeats, remainder = divmod(arg.value, len(block))
+    return bytearray(block_data * repeats + block_data[:remainder * sizeof(element_type)])
+
+
+def _get_median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 == 1 else (values[middle - 1] + values[middle]) / 2.0
+
+
+class Benchmark:
+    # Launches a kernel of every built program on synthetic arguments, on each device of the target, and reports the
+    # kernel times from event profiling. Launches are serialized, so concurrent builds do not skew each other's times.
+    def __init__(self, kernel_name, args, global_size, local_size=None, warmup=2, repeat=10):
+        self.kernel_name = kernel_name
+        self.args = args
+        self.global_size = global_size
+        self.local_size = local_size
+        self.warmup = warmup
+        self.repeat = repeat
+        self._results = []
+        self._lock = threading.Lock()
+
+    def get_inspector(self, target, name):
+        # Callback for Target.build which benchmarks the kernel of the built program
+        return lambda program: self.run(target, name, program)
+
+    def run(self, target, name, program):
+        cl = target.cl
+        kernel_names = cl.get_program_kernel_names(program)
+        if self.kernel_name not in kernel_names:
+            report.error("kernel %s is not in %s (kernels: %s)" % (self.kernel_name, name, ", ".join(filter(None, kernel_names)) or "none"))
+        device_names = target.device_names
+        with self._lock:
+            kernel = cl.create_kernel(program, self.kernel_name)
+            buffers = []
+            try:
+                for arg_index, arg in enumerate(self.args):
+                    if arg.kind == "buffer":
+                        buffer_data = _get_buffer_data(arg, arg_index)
+                        buffer = cl.create_buffer(target.context, CL_MEM_READ_WRITE | CL_MEM_COPY_HOST_PTR, len(buffer_data), buffer_data)
+                        buffers.append(buffer)
+                        cl.set_kernel_arg(kernel, arg_index, sizeof(c_void_p), buffer)
+                    elif arg.kind == "local":
+                        cl.set_kernel_arg(kernel, arg_index, arg.value, None)
+                    else:
+                        value = _ARG_TYPES[arg.type_name][0](arg.value)
+                        cl.set_kernel_arg(kernel, arg_index, sizeof(value), value)
+                for device_id, device_name, device in zip(target.device_ids, device_names, target.devices):
+                    # Offline devices of some platforms build programs but can not run them
+                    try:
+                        times = self._run_on_device(cl, target.context, device, kernel)
+                    except report.Error as e:
+                        report.warning("could not benchmark %s on device #%d (%s): %s" % (name, device_id, device_name, e))
+                        continue
+                    self._results.append(BenchResult(name, device_id, device_name, self.kernel_name, times))
+            finally:
+                cl.release_kernel(kernel)
+                for buffer in buffers:
+                    cl.release_mem_object(buffer)
+
+    def _run_on_device(self, cl, context, device, kernel):
+        # Returns the kernel times in nanoseconds of the timed launches
+        queue = cl.create_command_queue(context, device, CL_QUEUE_PROFILING_ENABLE)
+        times = []
+        try:
+            for launch_index in range(self.warmup + self.repeat):
+                event = cl.enqueue_nd_range_kernel(queue, kernel, self.global_size, self.local_size)
+                try:
+                    cl.wait_for_event(event)
+                    if launch_index >= self.warmup:
+                        times.append(cl.get_event_profiling_info(event, CL_PROFILING_COMMAND_END) -
+                                     cl.get_event_profiling_info(event, CL_PROFILING_COMMAND_START))
+                finally:
+                    cl.release_event(event)
+        finally:
+            cl.release_command_queue(queue)
+        return times
+
+    def reset(self):
+        # Starts a new report, e.g. for the next rebuild in watch mode
+        with self._lock:
+            self._results = []
+
+    def write(self):
+        print("%-24s %-20s %-20s %5s %12s %12s %12s %12s" %
+              ("File", "Device", "Kernel", "Runs", "Min (us)", "Median (us)", "Mean (us)", "Max (us)"))
+        for result in sorted(self._results, key=lambda result: (result.name, result.device_id)):
+            times = [time / 1000.0 for time in result.times]
+            print("%-24s %-20s %-20s %5d %12.3f %12.3f %12.3f %12.3f" % (result.name, "#%d %s" % (result.device_id, result.device_name),
+                result.kernel, len(times), min(times), _get_median(times), sum(times) / len(times), max(times)))
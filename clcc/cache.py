@@ -0,0 +1,222 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import json
+import threading
+
+from .includes import read_text
+
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+# Bump when the key derivation or the entry layout changes to invalidate old entries
+CACHE_FORMAT_VERSION = 2
+
+
+def default_cache_directory():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "clcc")
+
+
+def write_file_atomic(path, *chunks):
+    # Imported on first use to keep tempfile out of the startup time
+    import tempfile
+    dirname = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=dirname, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            for chunk in chunks:
+                temp_file.write(chunk)
+        os.rename(temp_path, path)
+    except:
+        os.unlink(temp_path)
+        raise
+
+
+def get_build_key(target, command, source_code, header_paths, clflags, header_cache=None):
+    # Hash of everything that determines the output of a build: equal keys mean interchangeable binaries
+    # Imported on first use to keep hashlib out of the startup time
+    import hashlib
+    read_header = read_text if header_cache is None else header_cache.read_text
+    key_hash = hashlib.sha256()
+
+    def update(text):
+        data = text.encode("utf8")
+        key_hash.update(str(len(data)).encode("ascii") + b":" + data)
+
+    update(str(CACHE_FORMAT_VERSION))
+    update(command)
+    update(source_code)
+    for header_path in header_paths:
+        update(header_path)
+        update(read_header(header_path))
+    update(clflags)
+    for identity_field in target.get_identity():
+        update(identity_field)
+    return key_hash.hexdigest()
+
+
+def get_prebuilt_key(source_code, header_paths, clflags, header_cache=None):
+    # Hash of the source, the contents of the headers it includes and the build flags, which tells whether a prebuilt
+    # binary is stale. Unlike build keys, it leaves out the compiler identity and the paths of headers, so that it is
+    # the same where an application loads the binary.
+    import hashlib
+    read_header = read_text if header_cache is None else header_cache.read_text
+    key_hash = hashlib.sha256()
+
+    def update(text):
+        data = text.encode("utf8")
+        key_hash.update(str(len(data)).encode("ascii") + b":" + data)
+
+    update(source_code)
+    for header_path in header_paths:
+        update(read_header(header_path))
+    update(clflags)
+    return key_hash.hexdigest()
+
+
+def get_stamp_path(binary_path):
+    return binary_path + ".stamp"
+
+
+def write_stamps(output_filenames, prebuilt_key):
+    # Stamps next to loose outputs record the prebuilt key of the build which wrote them
+    for output_filename in output_filenames:
+        with open(get_stamp_path(output_filename), "w") as stamp_file:
+            stamp_file.write(prebuilt_key + "\n")
+
+
+def read_stamp(binary_path):
+    # Returns the prebuilt key of a loose output, or None if it has no stamp
+    try:
+        with open(get_stamp_path(binary_path), "r") as stamp_file:
+            return stamp_file.read().strip() or None
+    except EnvironmentError:
+        return None
+
+
+class CompileCache:
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.stored_bytes = 0
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def get_key(self, target, command, source_code, header_paths, clflags, header_cache=None):
+        return get_build_key(target, command, source_code, header_paths, clflags, header_cache)
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def lookup(self, key):
+        entry_path = self._get_entry_path(key)
+        try:
+            with open(entry_path, "rb") as entry_file:
+                header = json.loads(entry_file.readline().decode("utf8"))
+                binaries = None
+                if header["binary_sizes"] is not None:
+                    binaries = []
+                    for binary_size in header["binary_sizes"]:
+                        binary = entry_file.read(binary_size)
+                        if len(binary) != binary_size:
+                            raise ValueError("truncated cache entry")
+                        binaries.append(binary)
+            # Entries are evicted in the order of modification time, so touching the entry makes it most recently used
+            os.utime(entry_path, None)
+        except (EnvironmentError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return header["status"], header["log"], binaries
+
+    def store(self, key, status, build_log, binaries):
+        header = {
+            "status": status,
+            "log": build_log,
+            "binary_sizes": None if binaries is None else [len(binary) for binary in binaries]
+        }
+        header_data = json.dumps(header).encode("utf8") + b"\n"
+        chunks = [header_data] + list(binaries or [])
+
+        entry_path = self._get_entry_path(key)
+        entry_dirname = os.path.dirname(entry_path)
+        if not os.path.isdir(entry_dirname):
+            try:
+                os.makedirs(entry_dirname)
+            except OSError:
+                # Created concurrently by another thread or process
+                pass
+        write_file_atomic(entry_path, *chunks)
+        with self._lock:
+            self.stored_bytes += sum(len(chunk) for chunk in chunks)
+
+    def _list_entries(self):
+        entries = []
+        for dirname in os.listdir(self.directory):
+            dirpath = os.path.join(self.directory, dirname)
+            if len(dirname) != 2 or not os.path.isdir(dirpath):
+                continue
+            for filename in os.listdir(dirpath):
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def trim(self):
+        entries = self._list_entries()
+        total_size = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total_size -= size
+
+    def _get_stats_path(self):
+        return os.path.join(self.directory, "stats.json")
+
+    def load_stats(self):
+        try:
+            with open(self._get_stats_path(), "r") as stats_file:
+                return json.load(stats_file)
+        except (EnvironmentError, ValueError):
+            return {"hits": 0, "misses": 0, "stored_bytes": 0}
+
+    def save_stats(self):
+        with self._lock:
+            stats = self.load_stats()
+            stats["hits"] = stats.get("hits", 0) + self.hits
+            stats["misses"] = stats.get("misses", 0) + self.misses
+            stats["stored_bytes"] = stats.get("stored_bytes", 0) + self.stored_bytes
+            self.hits, self.misses, self.stored_bytes = 0, 0, 0
+            write_file_atomic(self._get_stats_path(), json.dumps(stats).encode("utf8"))
+
+    def print_stats(self):
+        stats = self.load_stats()
+        entries = self._list_entries()
+        lookups = stats["hits"] + stats["misses"]
+        print("Cache directory: %s" % self.directory)
+        print("Cache entries: %d" % len(entries))
+        print("Cache size: %d bytes (limit %d bytes)" % (sum(size for mtime, size, path in entries), self.max_size))
+        print("Cache hits: %d" % stats["hits"])
+        print("Cache misses: %d" % stats["misses"])
+        if lookups != 0:
+            print("Cache hit rate: %.1f%%" % (100.0 * stats["hits"] / lookups))
+        print("Bytes stored: %d" % stats["stored_bytes"])
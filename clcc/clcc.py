@@ -5,68 +5,38 @@
 from __future__ import print_function, absolute_import
 import os
 import sys
-import argparse
+import json
 import re
-import ctypes
+import time
+import mmap
+import signal
+import contextlib
+import collections
+import threading
 
 
-from .opencl import OpenCL
-from .opencl import PLATFORM_NAME as CL_PLATFORM_NAME, \
-    PLATFORM_PROFILE as CL_PLATFORM_PROFILE, \
-    PLATFORM_VERSION as CL_PLATFORM_VERSION, \
-    DEVICE_NAME as CL_DEVICE_NAME, \
-    DEVICE_EXTENSIONS as CL_DEVICE_EXTENSIONS, \
-    DEVICE_TYPE as CL_DEVICE_TYPE, \
-    DEVICE_TYPE_CPU as CL_DEVICE_TYPE_CPU, \
+from .opencl import OpenCL, default_library_path
+from .opencl import DEVICE_TYPE_CPU as CL_DEVICE_TYPE_CPU, \
     DEVICE_TYPE_GPU as CL_DEVICE_TYPE_GPU, \
     DEVICE_TYPE_ACCELERATOR as CL_DEVICE_TYPE_ACCELERATOR, \
-    DEVICE_TYPE_CUSTOM as CL_DEVICE_TYPE_CUSTOM, \
-    DEVICE_GFXIP_MAJOR_AMD as CL_DEVICE_GFXIP_MAJOR_AMD, \
-    DEVICE_GFXIP_MINOR_AMD as CL_DEVICE_GFXIP_MINOR_AMD, \
-    DEVICE_COMPUTE_CAPABILITY_MAJOR_NV as CL_DEVICE_COMPUTE_CAPABILITY_MAJOR_NV, \
-    DEVICE_COMPUTE_CAPABILITY_MINOR_NV as CL_DEVICE_COMPUTE_CAPABILITY_MINOR_NV, \
-    CONTEXT_PLATFORM as CL_CONTEXT_PLATFORM
+    DEVICE_TYPE_CUSTOM as CL_DEVICE_TYPE_CUSTOM
+from .target import Target
+from .inventory import load_inventory, query_inventory
+from .cache import CompileCache, get_build_key, get_prebuilt_key, write_stamps, write_file_atomic
+from .includes import scan_includes, scan_include_names, read_text, HeaderCache
+from .archive import ArchiveOutput
+from .resources import ResourceReport
+from .bench import Benchmark, parse_bench_args, parse_work_size
+from .isa import extract_kernels, split_gcn_instructions, format_listing, estimate_occupancy
+from .spirv import is_spirv
+from .frontend import parser, get_dependency_output, finish_profiling, get_output_filenames, read_source, \
+    write_binaries, create_thread_pool, print_batch_summary
+from .sweep import parse_sweep_option, load_sweep_file, expand_grid, deduplicate_variants
 from . import report
+from . import timing
 
 
-parser = argparse.ArgumentParser(description="OpenCL compiler")
-parser.add_argument("-std", dest="standard", choices=["1.0", "1.1", "1.2", "2.0", "2.1"],
-                    help="Target OpenCL standard version")
-command_options = parser.add_mutually_exclusive_group()
-list_option = command_options.add_argument(
-    "-l", dest="command", action="store_const", const="list",
-    help="List OpenCL platforms and devices")
-compile_option = command_options.add_argument(
-    "-c", dest="command", action="store_const", const="compile",
-    help="Compile source code to binary object (OpenCL 1.2+)")
-check_option = command_options.add_argument(
-    "-fsyntax-only", dest="command", action="store_const", const="check",
-    help="Build program and discard produced object")
-assembler_option = command_options.add_argument(
-    "-S", dest="command", action="store_const", const="assemble",
-    help="Build program and produce assembly listing (AMD platform only)")
-debug_option = parser.add_argument(
-    "-g", dest="debug", action="store_true",
-    help="Generate debug info (where applicable)")
-platform_option = parser.add_argument(
-    "-p", "--platform", dest="platform",
-    help="Target OpenCL platform")
-device_option = parser.add_argument(
-    "-d", "--device", dest="device", default=1, type=int,
-    help="Target OpenCL device")
-include_option = parser.add_argument(
-    "-I", dest="include", action="append",
-    help="Include directory paths")
-parser.add_argument(
-    "-o", dest="output",
-    help="Output file name (object file)")
-parser.add_argument(
-    "input", nargs="?",
-    help="Input file name (source file)")
-parser.set_defaults(command="build")
-
-
-def list_devices(cl, min_standard):
+def list_devices(inventory, min_standard):
     platform_name_map = {
         "AMD Accelerated Parallel Processing": "AMD",
         "NVIDIA CUDA": "nVidia",
@@ -103,18 +73,17 @@ def list_devices(cl, min_standard):
         7: "Volta"
     }
 
-    platforms = cl.get_platform_ids()
-    if len(platforms) == 0:
+    if len(inventory) == 0:
         print("No OpenCL platforms found")
     else:
-        for i, platform in enumerate(platforms):
-            platform_name = cl.get_platform_info(platform, CL_PLATFORM_NAME)
+        for i, platform_info in enumerate(inventory):
+            platform_name = platform_info["name"]
             unified_platform_name = platform_name_map.get(platform_name, "Unknown (%s)" % platform_name)
 
-            platform_profile = cl.get_platform_info(platform, CL_PLATFORM_PROFILE)
+            platform_profile = platform_info["profile"]
             unified_platform_profile = platform_profile_map.get(platform_profile, "unknown profile (%s)" % platform_profile)
 
-            platform_version = cl.get_platform_info(platform, CL_PLATFORM_VERSION)
+            platform_version = platform_info["version"]
             platform_version_match = re.match(r"OpenCL (\d+\.\d+)", platform_version)
             if platform_version_match is not None:
                 unified_platform_version = platform_version_match.group(0) + ", " + unified_platform_profile
@@ -129,44 +98,35 @@ def list_devices(cl, min_standard):
 
             print("Platform #%d: %s [%s]" % (i + 1, unified_platform_name, unified_platform_version))
 
-            devices = cl.get_platform_devices(platform)
-
-            for j, device in enumerate(devices):
-                device_type = cl.get_device_info(device, CL_DEVICE_TYPE, ctypes.c_uint64)
+            for j, device_info in enumerate(platform_info["devices"]):
+                device_type = device_info["type"]
                 unified_device_type = device_type_map.get(device_type, "unknown type (0x%X)" % device_type)
 
-                device_name = cl.get_device_string_info(device, CL_DEVICE_NAME)
-                unified_device_name = device_name
-
-                device_extensions = cl.get_device_string_info(device, CL_DEVICE_EXTENSIONS).split(" ")
-                if device_type == CL_DEVICE_TYPE_GPU:
-                    if "cl_amd_device_attribute_query" in device_extensions:
-                        device_gfxip_major = cl.get_device_info(device, CL_DEVICE_GFXIP_MAJOR_AMD, ctypes.c_uint32)
-                        device_gfxip_minor = cl.get_device_info(device, CL_DEVICE_GFXIP_MINOR_AMD, ctypes.c_uint32)
-                        if device_gfxip_major in gfxip_arch_map:
-                            unified_device_name += " [GFXIP %d.%d; %s]" % (device_gfxip_major, device_gfxip_minor, gfxip_arch_map[device_gfxip_major])
-                        else:
-                            unified_device_name += " [GFXIP %d.%d]" % (device_gfxip_major, device_gfxip_minor)
-                    elif "cl_nv_device_attribute_query" in device_extensions:
-                        device_compute_capability_major = cl.get_device_info(device, CL_DEVICE_COMPUTE_CAPABILITY_MAJOR_NV, ctypes.c_uint32)
-                        device_compute_capability_minor = cl.get_device_info(device, CL_DEVICE_COMPUTE_CAPABILITY_MINOR_NV, ctypes.c_uint32)
-                        if device_compute_capability_major in sm_arch_map:
-                            unified_device_name += " [SM %d.%d; %s]" % (device_compute_capability_major, device_compute_capability_minor, sm_arch_map[device_compute_capability_major])
-                        else:
-                            unified_device_name += " [SM %d.%d]" % (device_compute_capability_major, device_compute_capability_minor)
+                unified_device_name = device_info["name"]
+                if device_info["gfxip"] is not None:
+                    device_gfxip_major, device_gfxip_minor = device_info["gfxip"]
+                    if device_gfxip_major in gfxip_arch_map:
+                        unified_device_name += " [GFXIP %d.%d; %s]" % (device_gfxip_major, device_gfxip_minor, gfxip_arch_map[device_gfxip_major])
+                    else:
+                        unified_device_name += " [GFXIP %d.%d]" % (device_gfxip_major, device_gfxip_minor)
+                elif device_info["compute_capability"] is not None:
+                    device_compute_capability_major, device_compute_capability_minor = device_info["compute_capability"]
+                    if device_compute_capability_major in sm_arch_map:
+                        unified_device_name += " [SM %d.%d; %s]" % (device_compute_capability_major, device_compute_capability_minor, sm_arch_map[device_compute_capability_major])
+                    else:
+                        unified_device_name += " [SM %d.%d]" % (device_compute_capability_major, device_compute_capability_minor)
 
                 print("\tDevice #%d [%s]: %s" % (j + 1, unified_device_type, unified_device_name))
 
-                cl.release_device(device)
-
 
-def select_platform(cl, target_platform):
-    platforms = cl.get_platform_ids()
+def select_platform(inventory, target_platform):
+    # Returns the 0-based index of the target platform in the inventory
+    platforms = inventory
     if len(platforms) == 0:
         report.error("no OpenCL platforms found")
     elif target_platform is None:
         if len(platforms) == 1:
-            return platforms[0]
+            return 0
         else:
             report.error("no target OpenCL platform specified")
     else:
@@ -177,7 +137,7 @@ def select_platform(cl, target_platform):
             elif target_platform_id > len(platforms):
                 report.error("invalid platform value %s: only %d OpenCL platforms are available (clcc -l to list platforms)" % (target_platform, len(platforms)))
             else:
-                return platforms[target_platform_id - 1]
+                return target_platform_id - 1
         except ValueError:
             platform_name_map = {
                 "amd": "AMD Accelerated Parallel Processing",
@@ -201,84 +161,1028 @@ def select_platform(cl, target_platform):
             }
             if target_platform in platform_name_map:
                 target_platform_name = platform_name_map[target_platform]
-                for platform in platforms:
-                    platform_name = cl.get_platform_info(platform, CL_PLATFORM_NAME)
-                    if platform_name == target_platform_name:
-                        return platform
+                for platform_index, platform_info in enumerate(platforms):
+                    if platform_info["name"] == target_platform_name:
+                        return platform_index
                 else:
                     report.error("platform \"%s\" (%s) is not available" % (target_platform, target_platform_name))
             else:
                 report.error("invalid platform name %s: use one of (amd, intel, beignet, nvidia, apple, pocl, qualcom, arm)" % target_platform)
 
 
-def compile_code(cl, command, input_filename, output_filename, include_paths, debug_build, target_platform, device_id, standard):
-    open_kwargs = {}
-    if sys.version_info >= (3,):
-        open_kwargs["encoding"] = "utf8"
-    with open(input_filename, "r", **open_kwargs) as input_file:
-        source_code = input_file.read()
+def parse_device_ids(target_devices, devices_count):
+    target_devices = str(target_devices)
+    if target_devices == "all":
+        if devices_count == 0:
+            report.error("platform has no OpenCL devices")
+        return list(range(1, devices_count + 1))
+
+    device_ids = []
+    for target_device in target_devices.split(","):
+        try:
+            device_id = int(target_device)
+        except ValueError:
+            report.error("invalid device value %s: device number, comma-separated list of device numbers, or \"all\" required" % target_devices)
+        if device_id <= 0:
+            report.error("invalid device value %s: positive number required (clcc -l to list devices)" % target_device)
+        elif device_id > devices_count:
+            report.error("invalid device value %s: only %d OpenCL devices are available (clcc -l to list devices)" % (target_device, devices_count))
+        if device_id not in device_ids:
+            device_ids.append(device_id)
+    return device_ids
+
+
+def select_target(cl, target_platform, target_devices, inventory=None):
+    if inventory is None:
+        inventory = query_inventory(cl)
+    platform_index = select_platform(inventory, target_platform)
+    platform_info = inventory[platform_index]
+    device_ids = parse_device_ids(target_devices, len(platform_info["devices"]))
+
+    with timing.phase("enumerate platforms"):
+        platforms = cl.get_platform_ids()
+    if len(platforms) != len(inventory):
+        report.error("OpenCL platforms changed since the device list was saved (use --refresh-devices)")
+    platform = platforms[platform_index]
+    with timing.phase("enumerate devices"):
+        devices = cl.get_platform_devices(platform)
+    if len(devices) != len(platform_info["devices"]):
+        report.error("OpenCL devices changed since the device list was saved (use --refresh-devices)")
 
-    platform = select_platform(cl, target_platform)
-    devices = cl.get_platform_devices(platform)
-    device = devices[device_id - 1]
-    for d in devices:
-        if d is not device:
-            cl.release_device(d)
+    target_devices = [devices[device_id - 1] for device_id in device_ids]
+    for device in devices:
+        if all(device is not target_device for target_device in target_devices):
+            cl.release_device(device)
 
+    identity = [platform_info["name"], platform_info["version"]]
+    device_infos = [platform_info["devices"][device_id - 1] for device_id in device_ids]
+    for device_info in device_infos:
+        identity += [device_info["name"], device_info["version"], device_info["driver_version"]]
+    return Target(cl, platform, target_devices, device_ids, identity, device_infos)
+
+
+def get_build_flags(target, include_paths, debug_build, standard, keep_il=False):
     clflags = []
-    if cl.get_platform_info(platform, CL_PLATFORM_NAME) == "AMD Accelerated Parallel Processing":
+    if target.platform_name == "AMD Accelerated Parallel Processing":
         if not debug_build:
-            clflags += ["-fno-bin-source", "-fno-bin-llvmir", "-fno-bin-amdil"]
+            clflags += ["-fno-bin-source", "-fno-bin-llvmir"]
+            if not keep_il:
+                clflags += ["-fno-bin-amdil"]
 
     if standard is not None:
         clflags += ["-cl-std=CL" + standard]
-    for include_path in include_paths:
+    for include_path in include_paths or []:
         clflags += ["-I" + include_path]
+    return " ".join(clflags)
+
+
+def is_spirv_file(input_filename):
+    try:
+        with open(input_filename, "rb") as input_file:
+            return is_spirv(input_file.read(4))
+    except EnvironmentError:
+        return False
+
+
+def get_embedded_headers(input_filename, source_code, include_paths, header_cache=None):
+    read_header = read_text if header_cache is None else header_cache.read_text
+    with timing.phase("scan includes"):
+        header_names = scan_include_names(input_filename, source_code, include_paths, header_cache)
+    return [(header_name, read_header(header_path)) for header_name, header_path in header_names]
+
+
+def lookup_cache(target, command, input_filename, source_code, include_paths, clflags, cache, header_paths=None, header_cache=None):
+    # Returns the cache key and the cached (status, build log, binaries) result, or None if the build is not cached
+    if cache is None:
+        return None, None
+    if header_paths is None:
+        with timing.phase("scan includes"):
+            header_paths = scan_includes(input_filename, source_code, include_paths, header_cache)
+    with timing.phase("cache lookup"):
+        cache_key = cache.get_key(target, command, source_code, header_paths, clflags, header_cache)
+        return cache_key, cache.lookup(cache_key)
 
-    context_properties = (ctypes.c_void_p * 4)()
-    context_properties[0] = ctypes.cast(CL_CONTEXT_PLATFORM, ctypes.c_void_p)
-    context_properties[1] = platform
-    context = cl.create_context(context_properties, device)
-    program = cl.create_program_with_source(context, source_code)
-    if command == "build":
-        status = cl.build_program(program, device, " ".join(clflags))
+
+def build_source(target, command, input_filename, source_code, include_paths, clflags, cache=None, header_paths=None, header_cache=None, output_buffer=None, inspect=None):
+    cache_key, cached_result = lookup_cache(target, command, input_filename, source_code, include_paths, clflags, cache, header_paths, header_cache)
+    if cached_result is not None:
+        status, build_log, binaries = cached_result
+        if inspect is not None and status == 0 and binaries is not None:
+            target.inspect_binaries(binaries, clflags, inspect)
     else:
-        status = cl.compile_program(program, device, " ".join(clflags))
-    build_log = cl.get_program_build_log(program, device)
+        headers = None
+        if command != "build":
+            # clCompileProgram does not search the file system for headers on all platforms: pass them in
+            headers = get_embedded_headers(input_filename, source_code, include_paths, header_cache)
+        status, build_log, binaries = target.build(command, source_code, clflags, headers, output_buffer, inspect)
+        if cache is not None and status == 0 and output_buffer is None:
+            with timing.phase("cache store"):
+                cache.store(cache_key, status, build_log, binaries)
+    return status, build_log, binaries
+
+
+@contextlib.contextmanager
+def map_output_file(output_filename, binary_size):
+    # The driver writes the binary straight into the page cache of the output file
+    with open(output_filename, "w+b") as output_file:
+        if binary_size == 0:
+            # Empty files can not be mapped
+            yield None
+        else:
+            output_file.truncate(binary_size)
+            output_buffer = mmap.mmap(output_file.fileno(), binary_size)
+            try:
+                yield output_buffer
+            finally:
+                output_buffer.close()
+
+
+def get_inspector(target, name, resources=None, bench=None):
+    # Callback for Target.build which adds the built program to the resource report and benchmarks it, or None
+    inspectors = [collector.get_inspector(target, name) for collector in [resources, bench] if collector is not None]
+    if not inspectors:
+        return None
+
+    def inspect(program):
+        for inspector in inspectors:
+            inspector(program)
+    return inspect
+
+
+def build_file(target, command, input_filename, output_filenames, include_paths, clflags, cache=None, dependencies=None, header_cache=None, archive=None, resources=None, bench=None):
+    with timing.phase("compile file", file=input_filename):
+        with timing.phase("read source"):
+            source_code = read_source(input_filename)
+        header_paths = None
+        if command != "check":
+            # Headers go into dependencies, and into the prebuilt keys of archive entries and stamps of outputs
+            with timing.phase("scan includes"):
+                header_paths = scan_includes(input_filename, source_code, include_paths, header_cache)
+        output_buffer = None
+        if output_filenames is not None and cache is None:
+            # Without a cache to store them in, binaries are streamed into the output files one at a time
+            output_buffer = lambda device_index, binary_size: map_output_file(output_filenames[device_index], binary_size)
+        inspect = get_inspector(target, input_filename, resources, bench)
+        status, build_log, binaries = build_source(target, command, input_filename, source_code, include_paths, clflags, cache, header_paths, header_cache, output_buffer, inspect)
+        if binaries is not None:
+            if archive is not None:
+                with timing.phase("write archive"):
+                    archive.add(target, input_filename, clflags, source_code, header_paths, binaries, header_cache=header_cache)
+            elif output_buffer is None:
+                with timing.phase("write output"):
+                    write_binaries(output_filenames, binaries)
+            if command == "build" and output_filenames is not None:
+                with timing.phase("write stamps"):
+                    write_stamps(output_filenames, get_prebuilt_key(source_code, header_paths, clflags, header_cache))
+            if dependencies is not None:
+                with timing.phase("write dependencies"):
+                    dependencies.write(input_filename, output_filenames or [archive.path], header_paths)
+    return status, build_log
+
+
+def compile_code(cl, command, input_filename, output_filename, include_paths, debug_build, target_platform, target_devices, standard, target=None, cache=None, inventory=None, dependencies=None, archive=None, resources=None, bench=None):
+    release_target = target is None
+    if target is None:
+        target = select_target(cl, target_platform, target_devices, inventory)
+
+    output_filenames = None
+    if command == "check":
+        if output_filename is not None:
+            report.warning("option -o is ignored due to -fsyntax-only")
+        if dependencies is not None:
+            report.warning("option -MD is ignored due to -fsyntax-only")
+    elif archive is None:
+        output_filenames = get_output_filenames(output_filename, input_filename, command, False, target.device_ids)
+
+    clflags = get_build_flags(target, include_paths, debug_build, standard)
+    if resources is not None:
+        clflags = resources.get_build_flags(target, clflags)
+    status, build_log = build_file(target, command, input_filename, output_filenames, include_paths, clflags, cache, dependencies, archive=archive, resources=resources, bench=bench)
     if build_log:
         print(build_log)
     elif status != 0:
         print("Program build failed")
 
+    if release_target:
+        target.release()
+    return status
+
+
+def build_batch_async(target, command, input_filenames, output_pattern, include_paths, clflags, jobs, cache=None, dependencies=None, header_cache=None, archive=None, resources=None, bench=None):
+    # One thread submits builds and the driver runs up to jobs of them at once, calling back when each completes.
+    # Yields the results of builds in the order of inputs, as the thread pool of compile_batch does.
+    def submit(input_filename):
+        start_time = time.time()
+        output_filenames = None
+        if command != "check" and archive is None:
+            output_filenames = get_output_filenames(output_pattern, input_filename, command, True, target.device_ids)
+        source_code, header_paths, cache_key, result, future, inspect = None, None, None, None, None, None
+        try:
+            source_code = read_source(input_filename)
+            if command != "check":
+                with timing.phase("scan includes"):
+                    header_paths = scan_includes(input_filename, source_code, include_paths, header_cache)
+            cache_key, result = lookup_cache(target, command, input_filename, source_code, include_paths, clflags, cache, header_paths, header_cache)
+            inspect = get_inspector(target, input_filename, resources, bench)
+            if result is None:
+                headers = None
+                if command != "build":
+                    headers = get_embedded_headers(input_filename, source_code, include_paths, header_cache)
+                future = target.build_async(command, source_code, clflags, headers)
+            else:
+                cache_key = None
+                if inspect is not None and result[0] == 0 and result[2] is not None:
+                    target.inspect_binaries(result[2], clflags, inspect)
+        except (EnvironmentError, report.Error) as e:
+            result = -1, str(e), None
+        return input_filename, output_filenames, source_code, header_paths, cache_key, result, future, inspect, start_time
+
+    def complete(input_filename, output_filenames, source_code, header_paths, cache_key, result, future, inspect, start_time):
+        try:
+            if future is not None:
+                result = future.result()
+                # Inspection runs in this thread rather than in the driver callback which completed the build
+                if inspect is not None and result[0] == 0 and result[2] is not None:
+                    target.inspect_binaries(result[2], clflags, inspect)
+            status, build_log, binaries = result
+            if binaries is not None:
+                if cache_key is not None:
+                    with timing.phase("cache store"):
+                        cache.store(cache_key, status, build_log, binaries)
+                if archive is not None:
+                    with timing.phase("write archive"):
+                        archive.add(target, input_filename, clflags, source_code, header_paths, binaries, header_cache=header_cache)
+                else:
+                    with timing.phase("write output"):
+                        write_binaries(output_filenames, binaries)
+                if command == "build" and output_filenames is not None:
+                    with timing.phase("write stamps"):
+                        write_stamps(output_filenames, get_prebuilt_key(source_code, header_paths, clflags, header_cache))
+                if dependencies is not None:
+                    with timing.phase("write dependencies"):
+                        dependencies.write(input_filename, output_filenames or [archive.path], header_paths)
+        except (EnvironmentError, report.Error) as e:
+            status, build_log = -1, str(e)
+        return input_filename, output_filenames, status, build_log, time.time() - start_time
+
+    pending = collections.deque()
+    for input_filename in input_filenames:
+        if len(pending) >= max(jobs, 1):
+            yield complete(*pending.popleft())
+        pending.append(submit(input_filename))
+    while pending:
+        yield complete(*pending.popleft())
+
+
+def compile_batch(cl, command, input_filenames, output_pattern, include_paths, debug_build, target_platform, target_devices, standard, jobs, target=None, cache=None, inventory=None, dependencies=None, async_builds=False, archive=None, resources=None, bench=None):
+    release_target = target is None
+    if target is None:
+        target = select_target(cl, target_platform, target_devices, inventory)
+    clflags = get_build_flags(target, include_paths, debug_build, standard)
+    if resources is not None:
+        clflags = resources.get_build_flags(target, clflags)
     if command == "check":
-        if output_filename is not None:
+        if output_pattern is not None:
             report.warning("option -o is ignored due to -fsyntax-only")
+        if dependencies is not None:
+            report.warning("option -MD is ignored due to -fsyntax-only")
+        dependencies = None
+    # Headers shared by many sources are read and parsed once per batch
+    header_cache = HeaderCache()
+
+    def build_job(input_filename):
+        output_filenames = None
+        if command != "check" and archive is None:
+            output_filenames = get_output_filenames(output_pattern, input_filename, command, True, target.device_ids)
+        start_time = time.time()
+        try:
+            status, build_log = build_file(target, command, input_filename, output_filenames, include_paths, clflags, cache, dependencies, header_cache, archive, resources, bench)
+        except (EnvironmentError, report.Error) as e:
+            # Errors of a single file must not stop the batch: count it as a failed build instead
+            status, build_log = -1, str(e)
+        return input_filename, output_filenames, status, build_log, time.time() - start_time
+
+    pool = create_thread_pool(1 if async_builds else jobs)
+    try:
+        results = []
+        if async_builds:
+            batch_results = build_batch_async(target, command, input_filenames, output_pattern, include_paths, clflags, jobs, cache, dependencies, header_cache, archive, resources, bench)
+        else:
+            batch_results = pool.imap(build_job, input_filenames)
+        for input_filename, output_filenames, status, build_log, elapsed in batch_results:
+            if build_log:
+                print("%s:\n%s" % (input_filename, build_log))
+            results.append((input_filename, output_filenames, status, elapsed))
+    finally:
+        pool.close()
+        pool.join()
+        if release_target:
+            target.release()
+
+    return print_batch_summary(results)
+
+
+def compile_sweep(cl, command, input_filename, output_pattern, variants, include_paths, debug_build, target_platform, target_devices, standard, jobs, target=None, cache=None, inventory=None, index_filename=None, archive=None, resources=None, bench=None):
+    # All variants are built on a pool of threads against the context of one target.
+    # Variants with the same flags are built once; the later ones refer to the first.
+    release_target = target is None
+    if target is None:
+        target = select_target(cl, target_platform, target_devices, inventory)
+    base_clflags = get_build_flags(target, include_paths, debug_build, standard)
+    if resources is not None:
+        base_clflags = resources.get_build_flags(target, base_clflags)
+    variant_flags, first_variants = deduplicate_variants(variants)
+    if command == "check" and output_pattern is not None:
+        report.warning("option -o is ignored due to -fsyntax-only")
+    header_cache = HeaderCache()
+    with timing.phase("read source"):
+        source_code = read_source(input_filename)
+    header_paths = None
+    if command != "check":
+        with timing.phase("scan includes"):
+            header_paths = scan_includes(input_filename, source_code, include_paths, header_cache)
+
+    def build_job(variant_index):
+        output_filenames = None
+        if command != "check" and archive is None:
+            output_filenames = get_output_filenames(output_pattern, input_filename, command, False, target.device_ids, variant_index)
+        clflags = " ".join(filter(None, [base_clflags, variant_flags[variant_index]]))
+        start_time = time.time()
+        try:
+            with timing.phase("compile variant", file=input_filename, variant=variant_index):
+                output_buffer = None
+                if output_filenames is not None and cache is None:
+                    output_buffer = lambda device_index, binary_size: map_output_file(output_filenames[device_index], binary_size)
+                inspect = get_inspector(target, "%s (v%d)" % (input_filename, variant_index), resources, bench)
+                status, build_log, binaries = build_source(target, command, input_filename, source_code, include_paths, clflags, cache, header_paths, header_cache, output_buffer, inspect)
+                if binaries is not None and archive is not None:
+                    with timing.phase("write archive"):
+                        archive.add(target, input_filename, clflags, source_code, header_paths, binaries, variant_index, header_cache)
+                elif binaries is not None and output_buffer is None:
+                    with timing.phase("write output"):
+                        write_binaries(output_filenames, binaries)
+                if binaries is not None and command == "build" and output_filenames is not None:
+                    with timing.phase("write stamps"):
+                        write_stamps(output_filenames, get_prebuilt_key(source_code, header_paths, clflags, header_cache))
+        except (EnvironmentError, report.Error) as e:
+            status, build_log = -1, str(e)
+        return variant_index, output_filenames, status, build_log, time.time() - start_time
+
+    unique_variants = [variant_index for variant_index, first_variant in enumerate(first_variants) if variant_index == first_variant]
+    results = {}
+    pool = create_thread_pool(jobs)
+    try:
+        for variant_index, output_filenames, status, build_log, elapsed in pool.imap(build_job, unique_variants):
+            if build_log:
+                print("%s [%s]:\n%s" % (input_filename, variant_flags[variant_index], build_log))
+            results[variant_index] = output_filenames, status, elapsed
+    finally:
+        pool.close()
+        pool.join()
+        if release_target:
+            target.release()
+
+    if archive is not None:
+        for variant_index, first_variant in enumerate(first_variants):
+            if variant_index != first_variant and results[first_variant][1] == 0:
+                archive.add_duplicate(input_filename, variant_index, first_variant)
+
+    index = []
+    failures = 0
+    print("%-8s %-6s %9s  %s" % ("Variant", "Status", "Time (s)", "Flags"))
+    for variant_index, first_variant in enumerate(first_variants):
+        output_filenames, status, elapsed = results[first_variant]
+        entry = collections.OrderedDict([
+            ("variant", variant_index),
+            ("defines", collections.OrderedDict(variants[variant_index])),
+            ("flags", variant_flags[variant_index]),
+            ("outputs", output_filenames)
+        ])
+        if variant_index != first_variant:
+            entry["status"] = "duplicate"
+            entry["duplicate_of"] = first_variant
+            print("%-8s %-6s %9s  %s (same as v%d)" % ("v%d" % variant_index, "DUP", "-", variant_flags[variant_index], first_variant))
+        else:
+            entry["status"] = "ok" if status == 0 else "failed"
+            entry["time"] = elapsed
+            failures += int(status != 0)
+            print("%-8s %-6s %9.3f  %s" % ("v%d" % variant_index, "OK" if status == 0 else "FAIL", elapsed, variant_flags[variant_index]))
+        index.append(entry)
+    print("%d variants compiled, %d failed, %d duplicates skipped" %
+          (len(unique_variants) - failures, failures, len(variants) - len(unique_variants)))
+
+    if index_filename is not None:
+        index_data = collections.OrderedDict([("input", input_filename), ("flags", base_clflags), ("variants", index)])
+        write_file_atomic(index_filename, json.dumps(index_data, indent=2).encode("utf8"))
+    return 0 if failures == 0 else 1
+
+
+def get_sweep_variants(options):
+    # Returns None if sweep mode is not enabled
+    if not options.sweep and options.sweep_file is None:
+        return None
+    variants = []
+    if options.sweep_file is not None:
+        try:
+            variants += load_sweep_file(options.sweep_file)
+        except EnvironmentError as e:
+            report.error("could not read sweep file %s: %s" % (options.sweep_file, e))
+    if options.sweep:
+        option_variants = expand_grid([parse_sweep_option(sweep_option) for sweep_option in options.sweep])
+        # --sweep options extend every variant of the sweep file with their values
+        variants = [file_variant + option_variant for file_variant in variants or [[]] for option_variant in option_variants]
+    if not variants:
+        report.error("sweep has no variants")
+    return variants
+
+
+def assemble_files(cl, input_filenames, output_pattern, include_paths, debug_build, target_platform, target_devices, standard, jobs, cache=None, inventory=None):
+    # Builds programs and writes an assembly listing of the kernels in the binary of each device, with static statistics
+    target = select_target(cl, target_platform, target_devices, inventory)
+    if target.platform_name != "AMD Accelerated Parallel Processing":
+        target.release()
+        report.error("assembly listings (-S) are supported only on the AMD platform")
+    clflags = get_build_flags(target, include_paths, debug_build, standard, keep_il=True)
+    batch = len(input_filenames) > 1
+    header_cache = HeaderCache()
+    gfxips = [device_info["gfxip"] for device_info in target.device_infos]
+    device_names = [device_info["name"] for device_info in target.device_infos]
+
+    def assemble_job(input_filename):
+        output_filenames = get_output_filenames(output_pattern, input_filename, "assemble", batch, target.device_ids)
+        start_time = time.time()
+        kernel_stats = []
+        try:
+            with timing.phase("compile file", file=input_filename):
+                source_code = read_source(input_filename)
+                status, build_log, binaries = build_source(target, "build", input_filename, source_code, include_paths, clflags, cache, header_cache=header_cache)
+                if binaries is not None:
+                    for device_id, device_name, gfxip, output_filename, binary in zip(target.device_ids, device_names, gfxips, output_filenames, binaries):
+                        gfxip_major = None if gfxip is None else gfxip[0]
+                        with timing.phase("extract kernels"):
+                            try:
+                                kernels = extract_kernels(binary)
+                            except ValueError as e:
+                                report.error("could not parse the binary for device #%d (%s): %s" % (device_id, device_name, e))
+                        device_description = "#%d %s" % (device_id, device_name)
+                        if gfxip is not None:
+                            device_description += " [GFXIP %d.%d]" % tuple(gfxip)
+                        with timing.phase("write output"):
+                            write_file_atomic(output_filename, format_listing(kernels, device_description, gfxip_major).encode("utf8"))
+                        for kernel in kernels:
+                            instructions = None
+                            if kernel.isa is not None and gfxip_major is not None and gfxip_major >= 6:
+                                instructions = len(split_gcn_instructions(kernel.isa, gfxip_major))
+                            occupancy = estimate_occupancy(gfxip_major, kernel.vgprs, kernel.sgprs, kernel.lds_size, kernel.work_group_size)
+                            kernel_stats.append((input_filename, device_description, kernel.name, kernel.vgprs, kernel.sgprs, kernel.lds_size, instructions, occupancy))
+        except (EnvironmentError, report.Error) as e:
+            status, build_log = -1, str(e)
+        return input_filename, output_filenames, status, build_log, kernel_stats, time.time() - start_time
+
+    pool = create_thread_pool(jobs)
+    try:
+        results = []
+        build_logs = []
+        all_kernel_stats = []
+        for input_filename, output_filenames, status, build_log, kernel_stats, elapsed in pool.imap(assemble_job, input_filenames):
+            if build_log:
+                print("%s:\n%s" % (input_filename, build_log) if batch else build_log)
+            results.append((input_filename, output_filenames, status, elapsed))
+            build_logs.append(build_log)
+            all_kernel_stats += kernel_stats
+    finally:
+        pool.close()
+        pool.join()
+        target.release()
+
+    def format_stat(value):
+        return "-" if value is None else str(value)
+
+    if all_kernel_stats:
+        print("%-24s %-28s %-24s %6s %6s %10s %13s %10s" % ("File", "Device", "Kernel", "VGPRs", "SGPRs", "LDS (B)", "Instructions", "Occupancy"))
+        for input_filename, device_description, kernel_name, vgprs, sgprs, lds_size, instructions, occupancy in all_kernel_stats:
+            print("%-24s %-28s %-24s %6s %6s %10s %13s %10s" % (input_filename, device_description, kernel_name, format_stat(vgprs),
+                format_stat(sgprs), format_stat(lds_size), format_stat(instructions), "-" if occupancy is None else "%d/10" % occupancy))
+    if batch:
+        return print_batch_summary(results)
+    elif results[0][2] != 0 and not build_logs[0]:
+        print("Program build failed")
+    return 0 if results[0][2] == 0 else 1
+
+
+def read_objects(input_filename, device_ids):
+    # A multi-device object is a set of .d<N> files next to each other; a single file is used for all devices
+    input_root, input_extension = os.path.splitext(input_filename)
+    if len(device_ids) > 1 and not os.path.isfile(input_filename):
+        object_filenames = [input_root + ".d%d" % device_id + input_extension for device_id in device_ids]
     else:
-        binary = cl.get_program_binary(program)
-        with open(output_filename, "wb") as output_file:
-            output_file.write(binary)
+        object_filenames = [input_filename] * len(device_ids)
+    binaries = []
+    for object_filename in object_filenames:
+        with open(object_filename, "rb") as object_file:
+            binaries.append(object_file.read())
+    return binaries
 
-    cl.release_context(context)
-    cl.release_device(device)
 
+def compile_object(target, input_filename, object_filenames, include_paths, clflags, cache=None, header_cache=None):
+    # Recompiles the source only if its stamp file does not match the source, the headers and the flags
+    # Returns the status, the build log, the binaries of the object and whether it was up to date
+    with timing.phase("compile file", file=input_filename):
+        with timing.phase("read source"):
+            source_code = read_source(input_filename)
+        with timing.phase("scan includes"):
+            header_paths = scan_includes(input_filename, source_code, include_paths, header_cache)
+            build_key = get_build_key(target, "compile", source_code, header_paths, clflags, header_cache)
+        stamp_filename = object_filenames[0] + ".stamp"
+        try:
+            with open(stamp_filename, "r") as stamp_file:
+                if stamp_file.read().strip() == build_key:
+                    with timing.phase("read objects"):
+                        binaries = []
+                        for object_filename in object_filenames:
+                            with open(object_filename, "rb") as object_file:
+                                binaries.append(object_file.read())
+                    return 0, "", binaries, True
+        except EnvironmentError:
+            pass
 
-def main(args=sys.argv[1:]):
-    options = parser.parse_args(args)
-    opencl_path = "OpenCL"
-    if sys.platform == "darwin":
-        opencl_path = "/Library/Frameworks/OpenCL.framework/OpenCL"
-    elif sys.platform.startswith("linux"):
-        opencl_path = "libOpenCL.so"
-    elif sys.platform == "win32":
-        opencl_path = "OpenCL.dll"
-
-    cl = OpenCL(opencl_path)
-    if options.command is "build" or options.command == "compile" or options.command == "check":
-        compile_code(cl, options.command or "build", options.input, options.output, options.include, options.debug, options.platform, options.device,
-            standard=options.standard)
+        status, build_log, binaries = build_source(target, "compile", input_filename, source_code, include_paths, clflags, cache, header_paths, header_cache)
+        if binaries is not None:
+            with timing.phase("write output"):
+                write_binaries(object_filenames, binaries)
+                write_file_atomic(stamp_filename, build_key.encode("ascii"))
+    return status, build_log, binaries, False
+
+
+def link_files(cl, input_filenames, output_filename, object_dirname, create_library, include_paths, debug_build, target_platform, target_devices, standard, jobs, cache=None, inventory=None):
+    target = select_target(cl, target_platform, target_devices, inventory)
+    clflags = get_build_flags(target, include_paths, debug_build, standard)
+    header_cache = HeaderCache()
+    link_flags = "-create-library" if create_library else ""
+    if output_filename is None:
+        output_filename = "a.lib" if create_library else "a.bin"
+    output_filenames = get_output_filenames(output_filename, output_filename, "link", False, target.device_ids)
+
+    def compile_job(input_filename):
+        object_filenames = get_output_filenames(object_dirname, input_filename, "compile", True, target.device_ids)
+        start_time = time.time()
+        try:
+            status, build_log, binaries, up_to_date = compile_object(target, input_filename, object_filenames, include_paths, clflags, cache, header_cache)
+        except (EnvironmentError, report.Error) as e:
+            status, build_log, binaries, up_to_date = -1, str(e), None, False
+        return input_filename, object_filenames, status, build_log, binaries, up_to_date, time.time() - start_time
+
+    # Sources are compiled in parallel, objects and libraries are linked as is; the order of inputs is preserved
+    source_filenames = [input_filename for input_filename in input_filenames if input_filename.endswith(".cl") or is_spirv_file(input_filename)]
+    objects = {}
+    results = []
+    pool = create_thread_pool(jobs)
+    try:
+        for input_filename, object_filenames, status, build_log, binaries, up_to_date, elapsed in pool.imap(compile_job, source_filenames):
+            if build_log:
+                print("%s:\n%s" % (input_filename, build_log))
+            if up_to_date:
+                print("UP-TO-DATE  %s" % input_filename)
+            else:
+                results.append((input_filename, object_filenames, status, elapsed))
+            objects[input_filename] = binaries
+
+        failures = [result for result in results if result[2] != 0]
+        if results:
+            print_batch_summary(results)
+        if failures:
+            return 1
+
+        for input_filename in input_filenames:
+            if input_filename not in objects:
+                try:
+                    objects[input_filename] = read_objects(input_filename, target.device_ids)
+                except EnvironmentError as e:
+                    report.error("could not read object %s: %s" % (input_filename, e))
+
+        start_time = time.time()
+        with timing.phase("link", output=output_filename):
+            status, build_log, binaries = target.link([objects[input_filename] for input_filename in input_filenames], link_flags)
+            if binaries is not None:
+                with timing.phase("write output"):
+                    write_binaries(output_filenames, binaries)
+    finally:
+        pool.close()
+        pool.join()
+        target.release()
+
+    if build_log:
+        print(build_log)
+    if status == 0:
+        print("LINK  %s (%.3f s)" % (", ".join(output_filenames), time.time() - start_time))
+    else:
+        print("Program link failed")
+    return status
+
+
+def watch_files(cl, command, input_filenames, output_pattern, include_paths, debug_build, target_platform, target_devices, standard, jobs, target=None, cache=None, inventory=None, dependencies=None, resources=None, bench=None):
+    # Builds the inputs, then rebuilds those whose source or included headers change until interrupted.
+    # The library, the target and its context stay alive between rebuilds, and so do the headers cache and the thread pool.
+    from .watch import FileWatcher
+    release_target = target is None
+    if target is None:
+        target = select_target(cl, target_platform, target_devices, inventory)
+    clflags = get_build_flags(target, include_paths, debug_build, standard)
+    if resources is not None:
+        clflags = resources.get_build_flags(target, clflags)
+    if command == "check":
+        if output_pattern is not None:
+            report.warning("option -o is ignored due to -fsyntax-only")
+        if dependencies is not None:
+            report.warning("option -MD is ignored due to -fsyntax-only")
+        dependencies = None
+    header_cache = HeaderCache()
+    batch = len(input_filenames) > 1
+    # Input file -> headers it included in its last build
+    input_headers = dict((input_filename, []) for input_filename in input_filenames)
+
+    def build_job(input_filename):
+        output_filenames = None
+        if command != "check":
+            output_filenames = get_output_filenames(output_pattern, input_filename, command, batch, target.device_ids)
+        start_time = time.time()
+        try:
+            status, build_log = build_file(target, command, input_filename, output_filenames, include_paths, clflags, cache, dependencies, header_cache,
+                resources=resources, bench=bench)
+        except (EnvironmentError, report.Error) as e:
+            status, build_log = -1, str(e)
+        elapsed = time.time() - start_time
+        try:
+            header_paths = scan_includes(input_filename, read_source(input_filename), include_paths, header_cache)
+        except EnvironmentError:
+            # Keep watching the headers of the last build until the input is back
+            header_paths = None
+        return input_filename, output_filenames, status, build_log, elapsed, header_paths
+
+    watcher = FileWatcher()
+    pool = create_thread_pool(jobs)
+    try:
+        watcher.set_paths(input_filenames)
+        pending_filenames = list(input_filenames)
+        while True:
+            # Reports cover the builds of the last round
+            for collector in [resources, bench]:
+                if collector is not None:
+                    collector.reset()
+            results = []
+            for input_filename, output_filenames, status, build_log, elapsed, header_paths in pool.imap_unordered(build_job, pending_filenames):
+                # Logs are printed as soon as each build completes rather than in the order of inputs
+                if build_log:
+                    print("%s:\n%s" % (input_filename, build_log))
+                    sys.stdout.flush()
+                if header_paths is not None:
+                    input_headers[input_filename] = header_paths
+                results.append((input_filename, output_filenames, status, elapsed))
+            print_batch_summary(results)
+            if resources is not None:
+                resources.write()
+            if bench is not None:
+                bench.write()
+            if cache is not None:
+                cache.save_stats()
+            watched_paths = set(input_filenames).union(*input_headers.values())
+            watcher.set_paths(watched_paths)
+            print("Watching %d files for changes (%s), press Ctrl+C to stop" % (len(watched_paths), watcher.method))
+            sys.stdout.flush()
+
+            changed_paths = watcher.wait()
+            pending_filenames = [input_filename for input_filename in input_filenames
+                if changed_paths.intersection(map(os.path.abspath, [input_filename] + input_headers[input_filename]))]
+    except KeyboardInterrupt:
+        print()
+    finally:
+        watcher.close()
+        pool.close()
+        pool.join()
+        if release_target:
+            target.release()
+    return 0
+
+
+def serve(cl, socket_path, cache=None, inventory=None, listen_address=None):
+    # Serves local clients on a Unix socket, or remote clients on a TCP address if listen_address is specified
+    targets = {}
+    targets_lock = threading.Lock()
+    request_counter = [0]
+    if inventory is None:
+        inventory = query_inventory(cl)
+
+    def build_request(request):
+        target_key = (request["platform"], request["device"])
+        with targets_lock:
+            target = targets.get(target_key)
+            if target is None:
+                target = targets[target_key] = select_target(cl, request["platform"], request["device"], inventory)
+        # Stamps of the outputs which the client writes have the key of an in-process build of the client, with its include
+        # paths as specified rather than absolute or in a bundle
+        client_clflags = get_build_flags(target, request.get("client_include", request["include"]), request["debug"], request["standard"])
+        prebuilt_key = None
+        if "files" in request:
+            from .remote import extract_bundle
+            import tempfile
+            import shutil
+            bundle_dirname = tempfile.mkdtemp(prefix="clcc-bundle-")
+            try:
+                input_filename, include_paths = extract_bundle(bundle_dirname, request["input"], request["source"], request["include"],
+                    request["files"], request.get("cwd"))
+                clflags = get_build_flags(target, include_paths, request["debug"], request["standard"])
+                status, build_log, binaries = build_source(target, request["command"], input_filename, request["source"], include_paths, clflags, cache)
+                if request["command"] == "build" and binaries is not None:
+                    header_paths = scan_includes(input_filename, request["source"], include_paths)
+                    prebuilt_key = get_prebuilt_key(request["source"], header_paths, client_clflags)
+            finally:
+                shutil.rmtree(bundle_dirname, ignore_errors=True)
+        else:
+            clflags = get_build_flags(target, request["include"], request["debug"], request["standard"])
+            status, build_log, binaries = build_source(target, request["command"], request["input"], request["source"], request["include"], clflags, cache)
+            if request["command"] == "build" and binaries is not None:
+                header_paths = scan_includes(request["input"], request["source"], request["include"])
+                prebuilt_key = get_prebuilt_key(request["source"], header_paths, client_clflags)
+        if cache is not None:
+            with targets_lock:
+                request_counter[0] += 1
+                trim_cache = request_counter[0] % 100 == 0
+            cache.save_stats()
+            if trim_cache:
+                cache.trim()
+        return status, build_log, binaries, target.device_ids, prebuilt_key
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt()
+
+    def describe():
+        # Builders advertise their platforms and devices, so remote clients can pick one with the requested target
+        return inventory
+
+    from .server import CompileServer, BuilderServer
+    if listen_address is None:
+        server = CompileServer(socket_path, build_request, describe)
+        print("clcc compile server listening on %s" % socket_path)
+    else:
+        server = BuilderServer(listen_address, build_request, describe)
+        print("clcc builder listening on %s:%d" % server.server_address[:2])
+    signal.signal(signal.SIGTERM, shutdown)
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for target in targets.values():
+            target.release()
+        if cache is not None:
+            cache.trim()
+
+
+def build_inputs(options, input_filenames, batch):
+    # Builds in-process the inputs which the compile server did not build for the client.
+    # Returns the (input, output filenames, status, build log, elapsed time) result of each of them.
+    dependencies = get_dependency_output(options)
+    if options.command == "check":
+        dependencies = None
+    cache = None
+    if options.cache_dir is not None:
+        cache = CompileCache(options.cache_dir, options.cache_size * 1024 * 1024)
+    with timing.phase("load library"):
+        cl = OpenCL(default_library_path())
+    with timing.phase("load device inventory"):
+        inventory = load_inventory(cl, refresh=options.refresh_devices)
+    target = select_target(cl, options.platform, options.device, inventory)
+    clflags = get_build_flags(target, options.include, options.debug, options.standard)
+    header_cache = HeaderCache()
+
+    def build_job(input_filename):
+        output_filenames = None
+        if options.command != "check":
+            output_filenames = get_output_filenames(options.output, input_filename, options.command, batch, target.device_ids)
+        start_time = time.time()
+        try:
+            status, build_log = build_file(target, options.command, input_filename, output_filenames, options.include, clflags, cache,
+                dependencies, header_cache)
+        except (EnvironmentError, report.Error) as e:
+            status, build_log = -1, str(e)
+        return input_filename, output_filenames, status, build_log, time.time() - start_time
+
+    pool = create_thread_pool(options.jobs)
+    try:
+        results = pool.map(build_job, input_filenames)
+    finally:
+        pool.close()
+        pool.join()
+        target.release()
+    if cache is not None:
+        cache.save_stats()
+        cache.trim()
+    return results
+
+
+def create_isolated_target(cl, options, inventory):
+    # Target of all builds of the run, with the builds in worker processes
+    from .workers import WorkerPool, IsolatedTarget
+    target = select_target(cl, options.platform, options.device, inventory)
+    memory_limit = None if options.worker_memory is None else options.worker_memory * 1024 * 1024
+    # Workers select the same devices by number, whatever the -d option was
+    pool = WorkerPool(options.jobs, options.platform, ",".join(map(str, target.device_ids)), options.build_timeout, memory_limit,
+        options.worker_builds, max(options.build_retries, 0))
+    return IsolatedTarget(target, pool)
+
+
+def get_benchmark(options):
+    # Returns None if the benchmark mode is not enabled
+    if options.bench is None:
+        return None
+    elif options.command != "build":
+        report.warning("option --bench requires a program build and is ignored due to %s" %
+                       ("-c" if options.command == "compile" else "-fsyntax-only"))
+        return None
+    if options.bench_warmup < 0 or options.bench_repeat <= 0:
+        report.error("invalid benchmark runs: --bench-warmup must be non-negative and --bench-repeat positive")
+    local_size = None
+    if options.bench_local is not None:
+        local_size = parse_work_size(options.bench_local, "--bench-local")
+    global_size = parse_work_size(options.bench_global, "--bench-global")
+    if local_size is not None and len(local_size) != len(global_size):
+        report.error("options --bench-global and --bench-local specify different numbers of dimensions")
+    return Benchmark(options.bench, parse_bench_args(options.bench_args), global_size, local_size, options.bench_warmup, options.bench_repeat)
+
+
+def compile_inputs(cl, options, sweep_variants, cache, inventory, dependencies, archive, resources, bench):
+    target = None
+    async_builds = options.async_builds
+    if options.isolate:
+        if async_builds:
+            report.warning("option --async-builds is ignored due to --isolate")
+            async_builds = False
+        target = create_isolated_target(cl, options, inventory)
+    elif options.build_timeout is not None or options.worker_memory is not None or options.worker_builds is not None:
+        report.warning("options --build-timeout, --worker-memory and --worker-builds are ignored without --isolate")
+    try:
+        if options.watch:
+            if async_builds:
+                report.warning("option --async-builds is ignored due to --watch")
+            return watch_files(cl, options.command, options.inputs, options.output, options.include, options.debug, options.platform, options.device,
+                standard=options.standard, jobs=options.jobs, target=target, cache=cache, inventory=inventory, dependencies=dependencies,
+                resources=resources, bench=bench)
+        elif sweep_variants is not None:
+            if len(options.inputs) != 1:
+                report.error("sweep requires a single input file")
+            if dependencies is not None:
+                report.warning("option -MD is ignored due to --sweep")
+            return compile_sweep(cl, options.command, options.inputs[0], options.output, sweep_variants, options.include, options.debug, options.platform, options.device,
+                standard=options.standard, jobs=options.jobs, target=target, cache=cache, inventory=inventory, index_filename=options.sweep_index,
+                archive=archive, resources=resources, bench=bench)
+        elif len(options.inputs) == 1:
+            return compile_code(cl, options.command, options.inputs[0], options.output, options.include, options.debug, options.platform, options.device,
+                standard=options.standard, target=target, cache=cache, inventory=inventory, dependencies=dependencies, archive=archive, resources=resources, bench=bench)
+        else:
+            return compile_batch(cl, options.command, options.inputs, options.output, options.include, options.debug, options.platform, options.device,
+                standard=options.standard, jobs=options.jobs, target=target, cache=cache, inventory=inventory, dependencies=dependencies,
+                async_builds=async_builds, archive=archive, resources=resources, bench=bench)
+    finally:
+        if target is not None:
+            target.release()
+
+
+def run(options):
+    if options.time_report or options.trace is not None:
+        timing.enable()
+
+    dependencies = get_dependency_output(options)
+    cache = None
+    if options.cache_dir is not None:
+        cache = CompileCache(options.cache_dir, options.cache_size * 1024 * 1024)
+    elif options.cache_stats:
+        report.error("no cache directory specified (use --cache-dir or CLCC_CACHE_DIR)")
+    if options.cache_stats and not options.inputs and options.command == "build":
+        cache.print_stats()
+        return
+
+    with timing.phase("load library"):
+        cl = OpenCL(default_library_path())
+    with timing.phase("load device inventory"):
+        inventory = load_inventory(cl, refresh=options.refresh_devices)
+    if options.refresh_devices and not options.inputs and options.command == "build":
+        return
+    elif options.server:
+        from .server import default_socket_path, parse_builder_address
+        listen_address = None
+        if options.listen is not None:
+            try:
+                listen_address = parse_builder_address(options.listen)
+            except ValueError as e:
+                report.error(str(e))
+        try:
+            serve(cl, options.socket or default_socket_path(), cache, inventory, listen_address)
+        except EnvironmentError as e:
+            report.error(str(e))
+    elif options.project is not None:
+        if options.inputs:
+            report.error("input files can not be combined with --project: list them in the manifest")
+        from .project import build_project
+        status = build_project(cl, options.project, options.jobs, options.debug, cache, inventory, options.rebuild)
+        if cache is not None:
+            cache.save_stats()
+            cache.trim()
+            if options.cache_stats:
+                cache.print_stats()
+        finish_profiling(options)
+        if status != 0:
+            sys.exit(1)
+    elif options.command == "build" or options.command == "compile" or options.command == "check":
+        sweep_variants = get_sweep_variants(options)
+        if not options.inputs:
+            report.error("no input files")
+        if options.watch and (sweep_variants is not None or options.archive is not None):
+            report.error("option --watch can not be combined with --sweep or --archive")
+        archive = None
+        if options.archive is not None:
+            if options.command == "check":
+                report.warning("option --archive is ignored due to -fsyntax-only")
+            else:
+                if options.output is not None:
+                    report.warning("option -o is ignored due to --archive")
+                archive = ArchiveOutput(options.archive)
+        resources = None
+        if options.resource_report or options.resource_json is not None:
+            if options.command != "build":
+                report.warning("option --resource-report requires a program build and is ignored due to %s" %
+                               ("-c" if options.command == "compile" else "-fsyntax-only"))
+            else:
+                resources = ResourceReport(options.resource_json)
+        bench = get_benchmark(options)
+        try:
+            status = compile_inputs(cl, options, sweep_variants, cache, inventory, dependencies, archive, resources, bench)
+        except:
+            if archive is not None:
+                archive.discard()
+            raise
+        if archive is not None:
+            if status == 0:
+                print("ARCHIVE  %s (%d binaries)" % (options.archive, archive.finish()))
+            else:
+                archive.discard()
+        # Watch mode writes the reports after every round of builds
+        if resources is not None and not options.watch:
+            resources.write()
+        if bench is not None and not options.watch:
+            bench.write()
+        if cache is not None:
+            cache.save_stats()
+            cache.trim()
+            if options.cache_stats:
+                cache.print_stats()
+        finish_profiling(options)
+        if status != 0:
+            sys.exit(1)
+    elif options.command == "link":
+        if not options.inputs:
+            report.error("no input files")
+        if dependencies is not None:
+            report.warning("option -MD is ignored due to --link")
+        if options.object_dir is not None and not os.path.isdir(options.object_dir):
+            os.makedirs(options.object_dir)
+        object_dirname = None if options.object_dir is None else os.path.join(options.object_dir, "")
+        status = link_files(cl, options.inputs, options.output, object_dirname, options.library, options.include, options.debug, options.platform, options.device,
+            standard=options.standard, jobs=options.jobs, cache=cache, inventory=inventory)
+        if cache is not None:
+            cache.save_stats()
+            cache.trim()
+            if options.cache_stats:
+                cache.print_stats()
+        finish_profiling(options)
+        if status != 0:
+            sys.exit(1)
+    elif options.command == "assemble":
+        if not options.inputs:
+            report.error("no input files")
+        status = assemble_files(cl, options.inputs, options.output, options.include, options.debug, options.platform, options.device,
+            standard=options.standard, jobs=options.jobs, cache=cache, inventory=inventory)
+        if cache is not None:
+            cache.save_stats()
+            cache.trim()
+            if options.cache_stats:
+                cache.print_stats()
+        finish_profiling(options)
+        if status != 0:
+            sys.exit(1)
     elif options.command == "list":
         min_standard = None if options.standard is None else tuple(map(int, options.standard.split(".")))
-        list_devices(cl, min_standard)
+        list_devices(inventory, min_standard)
+        finish_profiling(options)
+
+
+def main(args=sys.argv[1:]):
+    options = parser.parse_args(args)
+    try:
+        run(options)
+    except report.Error as e:
+        report.exit_with_error(e)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import sys
+import time
+import socket
+
+from .frontend import parser, read_source, get_output_filenames, write_binaries, print_batch_summary, get_dependency_output, \
+    finish_profiling, create_thread_pool
+from .cache import write_stamps
+from .includes import scan_includes, HeaderCache
+from .server import connect, request_build, default_socket_path
+from .spirv import SpirvModule
+from . import report
+from . import timing
+
+
+def compile_with_server(options):
+    # Returns the exit status, or None if the compile server is not available and the caller must compile in-process
+    socket_path = options.socket or default_socket_path()
+    probe_socket = connect(socket_path)
+    if probe_socket is None:
+        return None
+    probe_socket.close()
+
+    def send_request(request, input_filename, source_code):
+        sock = connect(socket_path)
+        if sock is None:
+            return None
+        try:
+            return request_build(sock, request, source_code)
+        except (EOFError, socket.error):
+            return None
+        finally:
+            sock.close()
+
+    return compile_with_builder(options, send_request)
+
+
+def compile_remote(options, builder_addresses):
+    # Sends each source with the headers it includes to a builder which has the target platform and device
+    from .remote import BuilderPool, create_bundle
+    builders = BuilderPool(builder_addresses, options.platform, options.device)
+    header_cache = HeaderCache()
+
+    def send_request(request, input_filename, source_code):
+        with timing.phase("bundle source", file=input_filename):
+            bundle_request, payload = create_bundle(input_filename, source_code, options.include, header_cache)
+        request = dict(request)
+        request.update(bundle_request)
+        return builders.build(request, payload)
+
+    return compile_with_builder(options, send_request, fallback=False)
+
+
+def compile_with_builder(options, send_request, fallback=True):
+    # send_request(request, input_filename, source_code) returns (status, build log, binaries, device ids, prebuilt key) of a build,
+    # or None if the build must be done in-process. Without fallback, unreadable inputs fail instead.
+    # Inputs which were not built remotely are built in-process, with the OpenCL library loaded only then.
+    batch = len(options.inputs) > 1
+    dependencies = get_dependency_output(options)
+    header_cache = HeaderCache()
+    if options.command == "check":
+        if options.output is not None:
+            report.warning("option -o is ignored due to -fsyntax-only")
+        if dependencies is not None:
+            report.warning("option -MD is ignored due to -fsyntax-only")
+    else:
+        # Report invalid output patterns before any requests are sent
+        get_output_filenames(options.output, options.inputs[0], options.command, batch, [1])
+
+    request = {
+        "command": options.command,
+        "platform": options.platform,
+        "device": options.device,
+        "include": [os.path.abspath(include_path) for include_path in options.include or []],
+        # Include paths as specified, for the flags in the prebuilt keys of the outputs
+        "client_include": options.include or [],
+        "debug": options.debug,
+        "standard": options.standard
+    }
+
+    def build_job(input_filename):
+        start_time = time.time()
+        try:
+            file_request = dict(request)
+            file_request["input"] = os.path.abspath(input_filename)
+            with timing.phase("read source", file=input_filename):
+                source_code = read_source(input_filename)
+            file_request["il"] = isinstance(source_code, SpirvModule)
+            with timing.phase("server request", file=input_filename):
+                result = send_request(file_request, input_filename, source_code)
+        except EnvironmentError as e:
+            if fallback:
+                # Unreadable inputs are reported by the in-process compilation
+                return None
+            return input_filename, None, -1, str(e), time.time() - start_time
+        if result is None:
+            return None
+
+        status, build_log, binaries, device_ids, prebuilt_key = result
+        output_filenames = None
+        if options.command != "check":
+            output_filenames = get_output_filenames(options.output, input_filename, options.command, batch, device_ids)
+        if binaries is not None:
+            with timing.phase("write output", file=input_filename):
+                write_binaries(output_filenames, binaries)
+                if prebuilt_key is not None:
+                    write_stamps(output_filenames, prebuilt_key)
+            if dependencies is not None:
+                with timing.phase("write dependencies", file=input_filename):
+                    header_paths = scan_includes(input_filename, source_code, options.include, header_cache)
+                    dependencies.write(input_filename, output_filenames, header_paths)
+        return input_filename, output_filenames, status, build_log, time.time() - start_time
+
+    if batch:
+        pool = create_thread_pool(options.jobs)
+        try:
+            results = pool.map(build_job, options.inputs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [build_job(options.inputs[0])]
+    local_inputs = [input_filename for input_filename, result in zip(options.inputs, results) if result is None]
+    if local_inputs:
+        from .clcc import build_inputs
+        local_results = iter(build_inputs(options, local_inputs, batch))
+        results = [next(local_results) if result is None else result for result in results]
+    finish_profiling(options)
+
+    if not batch:
+        input_filename, output_filenames, status, build_log, elapsed = results[0]
+        if build_log:
+            print(build_log)
+        elif status != 0:
+            print("Program build failed")
+        return 0 if status == 0 else 1
+    else:
+        for input_filename, output_filenames, status, build_log, elapsed in results:
+            if build_log:
+                print("%s:\n%s" % (input_filename, build_log))
+        return print_batch_summary([(input_filename, output_filenames, status, elapsed)
+            for input_filename, output_filenames, status, build_log, elapsed in results])
+
+
+def main(args=sys.argv[1:]):
+    options = parser.parse_args(args)
+    if options.time_report or options.trace is not None:
+        timing.enable()
+    builder_addresses = options.remote or [address for address in os.environ.get("CLCC_BUILDERS", "").split(",") if address]
+    if options.command in ["build", "compile", "check"] and options.inputs and \
+            not (options.server or options.no_server or options.cache_stats or options.sweep or options.sweep_file or options.archive or
+                options.resource_report or options.resource_json or options.isolate or options.bench or options.watch or options.project):
+        try:
+            if builder_addresses:
+                status = compile_remote(options, builder_addresses)
+            else:
+                status = compile_with_server(options)
+        except report.Error as e:
+            report.exit_with_error(e)
+        if status is not None:
+            if status != 0:
+                sys.exit(status)
+            return
+    elif options.remote:
+        report.warning("option --remote is ignored due to options which require an in-process build")
+    from .clcc import main as compile_main
+    compile_main(args)
@@ -0,0 +1,61 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import re
+
+from .cache import write_file_atomic
+
+
+def escape_make_path(path):
+    return path.replace("$", "$$").replace("#", "\\#").replace(" ", "\\ ")
+
+
+def format_path_pattern(pattern, input_filename):
+    input_dirname, input_basename = os.path.split(input_filename)
+    input_name = os.path.splitext(input_basename)[0]
+    return pattern.format(name=input_name, dir=input_dirname or ".")
+
+
+class DependencyOutput:
+    # Writes Make-compatible dependency files, like gcc -MD [-MF file] [-MT target] [-MP]
+    def __init__(self, depfile_pattern=None, target_pattern=None, phony_targets=False):
+        self.depfile_pattern = depfile_pattern
+        self.target_pattern = target_pattern
+        self.phony_targets = phony_targets
+
+    def get_depfile_path(self, input_filename, output_filenames):
+        # The outputs of a multi-device build share one depfile, named after them without the .d<N> device suffix,
+        # or after the input if their pattern has a {device} field
+        if self.depfile_pattern is not None:
+            return format_path_pattern(self.depfile_pattern, input_filename)
+        output_root = os.path.splitext(output_filenames[0])[0]
+        if len(output_filenames) > 1:
+            device_suffix = re.search(r"\.d\d+$", output_root)
+            if device_suffix is not None:
+                output_root = output_root[:device_suffix.start()]
+            else:
+                input_name = os.path.splitext(os.path.basename(input_filename))[0]
+                output_root = os.path.join(os.path.dirname(output_root), input_name)
+        return output_root + ".d"
+
+    def format(self, input_filename, output_filenames, header_paths):
+        if self.target_pattern is not None:
+            targets = [format_path_pattern(self.target_pattern, input_filename)]
+        else:
+            targets = output_filenames
+
+        lines = [" ".join(map(escape_make_path, targets)) + ": " + escape_make_path(input_filename)]
+        lines += [" " + escape_make_path(header_path) for header_path in header_paths]
+        depfile_text = " \\\n".join(lines) + "\n"
+        if self.phony_targets:
+            for header_path in header_paths:
+                depfile_text += "\n%s:\n" % escape_make_path(header_path)
+        return depfile_text
+
+    def write(self, input_filename, output_filenames, header_paths):
+        depfile_path = self.get_depfile_path(input_filename, output_filenames)
+        depfile_text = self.format(input_filename, output_filenames, header_paths)
+        write_file_atomic(depfile_path, depfile_text.encode("utf8"))
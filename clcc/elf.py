@@ -0,0 +1,138 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import struct
+import collections
+
+
+SHT_SYMTAB = 2
+SHT_NOTE = 7
+PT_NOTE = 4
+
+ET_EXEC = 2
+ET_DYN = 3
+
+ElfSection = collections.namedtuple("ElfSection", ["name", "type", "address", "offset", "size"])
+ElfSymbol = collections.namedtuple("ElfSymbol", ["name", "value", "size", "type", "section_index"])
+ElfNote = collections.namedtuple("ElfNote", ["name", "type", "description"])
+
+
+def is_elf(data):
+    return bytes(data[:4]) == b"\x7fELF"
+
+
+class ElfFile:
+    # Minimal reader of 32- and 64-bit ELF files of either byte order: sections, symbols and notes.
+    # Malformed files raise ValueError.
+    def __init__(self, data):
+        self.data = data
+        if len(data) < 16 or not is_elf(data):
+            raise ValueError("not an ELF file")
+        elf_class, elf_encoding = bytearray(data[4:6])
+        if elf_class not in [1, 2] or elf_encoding not in [1, 2]:
+            raise ValueError("unsupported ELF class or byte order")
+        self.is_64bit = elf_class == 2
+        self._byte_order = "<" if elf_encoding == 1 else ">"
+        if self.is_64bit:
+            header_format, self._section_format, self._segment_format = "HHIQQQIHHHHHH", "IIQQQQIIQQ", "IIQQQQQQ"
+        else:
+            header_format, self._section_format, self._segment_format = "HHIIIIIHHHHHH", "IIIIIIIIII", "IIIIIIII"
+        header = self._unpack(header_format, 16)
+        self.type, self.machine = header[0], header[1]
+        program_header_offset, section_header_offset = header[4], header[5]
+        program_header_size, program_headers_count = header[8], header[9]
+        section_header_size, sections_count, section_names_index = header[10], header[11], header[12]
+
+        self.sections = []
+        # The string table of a symbol table is the section in its sh_link field
+        self._section_links = []
+        raw_sections = [self._unpack(self._section_format, section_header_offset + index * section_header_size)
+                        for index in range(sections_count)]
+        names_offset = raw_sections[section_names_index][4] if section_names_index < len(raw_sections) else None
+        for raw_section in raw_sections:
+            name = "" if names_offset is None else self._get_string(names_offset + raw_section[0])
+            self.sections.append(ElfSection(name, raw_section[1], raw_section[3], raw_section[4], raw_section[5]))
+            self._section_links.append(raw_section[6])
+
+        self.segments = []
+        for index in range(program_headers_count):
+            raw_segment = self._unpack(self._segment_format, program_header_offset + index * program_header_size)
+            if self.is_64bit:
+                segment_type, segment_offset, segment_size = raw_segment[0], raw_segment[2], raw_segment[5]
+            else:
+                segment_type, segment_offset, segment_size = raw_segment[0], raw_segment[1], raw_segment[4]
+            self.segments.append((segment_type, segment_offset, segment_size))
+
+    def _unpack(self, fields_format, offset):
+        fields = struct.Struct(self._byte_order + fields_format)
+        if offset < 0 or offset + fields.size > len(self.data):
+            raise ValueError("truncated ELF file")
+        return fields.unpack_from(self.data, offset)
+
+    def _get_string(self, offset):
+        end = bytes(self.data[offset:offset + 4096]).find(b"\0")
+        if end < 0:
+            raise ValueError("unterminated ELF string")
+        return bytes(self.data[offset:offset + end]).decode("utf8", "replace")
+
+    def get_section(self, name):
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    def get_section_data(self, section):
+        if section.offset + section.size > len(self.data):
+            raise ValueError("truncated ELF section %s" % section.name)
+        return self.data[section.offset:section.offset + section.size]
+
+    def get_symbols(self):
+        symbols = []
+        symbol_format = "IBBHQQ" if self.is_64bit else "IIIBBH"
+        symbol_size = struct.calcsize(self._byte_order + symbol_format)
+        for section_index, section in enumerate(self.sections):
+            if section.type != SHT_SYMTAB:
+                continue
+            link = self._section_links[section_index]
+            if not 0 <= link < len(self.sections):
+                raise ValueError("invalid ELF symbol table link")
+            names_offset = self.sections[link].offset
+            for index in range(section.size // symbol_size):
+                fields = self._unpack(symbol_format, section.offset + index * symbol_size)
+                if self.is_64bit:
+                    name, info, other, symbol_section_index, value, size = fields
+                else:
+                    name, value, size, info, other, symbol_section_index = fields
+                symbols.append(ElfSymbol(self._get_string(names_offset + name), value, size, info & 0xF, symbol_section_index))
+        return symbols
+
+    def get_symbol_data(self, symbol):
+        # Symbol values are addresses in executables and shared objects, and offsets into the section otherwise
+        if not 0 < symbol.section_index < len(self.sections):
+            raise ValueError("symbol %s is not defined in a section" % symbol.name)
+        section = self.sections[symbol.section_index]
+        section_data = self.get_section_data(section)
+        offset = symbol.value - section.address if self.type in [ET_EXEC, ET_DYN] else symbol.value
+        if offset < 0 or offset + symbol.size > len(section_data):
+            raise ValueError("symbol %s is outside of its section" % symbol.name)
+        return section_data[offset:offset + symbol.size]
+
+    def get_notes(self):
+        # Notes of SHT_NOTE sections, or of PT_NOTE segments if the file has no note sections
+        regions = [(section.offset, section.size) for section in self.sections if section.type == SHT_NOTE]
+        if not regions:
+            regions = [(offset, size) for segment_type, offset, size in self.segments if segment_type == PT_NOTE]
+        notes = []
+        for region_offset, region_size in regions:
+            offset, end = region_offset, region_offset + region_size
+            while offset + 12 <= end:
+                name_size, description_size, note_type = self._unpack("III", offset)
+                offset += 12
+                name = bytes(self.data[offset:offset + name_size]).rstrip(b"\0").decode("utf8", "replace")
+                offset += (name_size + 3) & ~3
+                description = self.data[offset:offset + description_size]
+                offset += (description_size + 3) & ~3
+                notes.append(ElfNote(name, note_type, description))
+        return notes
@@ -0,0 +1,269 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import sys
+import argparse
+
+from .cache import DEFAULT_MAX_SIZE as CACHE_DEFAULT_MAX_SIZE
+from .depfile import DependencyOutput
+from .spirv import SpirvModule, is_spirv
+from . import report
+from . import timing
+
+
+# Command-line options and the handling of input and output files which the client of the compile server shares with
+# the in-process compiler. The client imports only this module, so it must not depend on the OpenCL bindings or on the
+# modules of optional features.
+
+parser = argparse.ArgumentParser(description="OpenCL compiler")
+parser.add_argument("-std", dest="standard", choices=["1.0", "1.1", "1.2", "2.0", "2.1"],
+                    help="Target OpenCL standard version")
+command_options = parser.add_mutually_exclusive_group()
+list_option = command_options.add_argument(
+    "-l", dest="command", action="store_const", const="list",
+    help="List OpenCL platforms and devices")
+compile_option = command_options.add_argument(
+    "-c", dest="command", action="store_const", const="compile",
+    help="Compile source code to binary object (OpenCL 1.2+)")
+check_option = command_options.add_argument(
+    "-fsyntax-only", dest="command", action="store_const", const="check",
+    help="Build program and discard produced object")
+link_option = command_options.add_argument(
+    "--link", dest="command", action="store_const", const="link",
+    help="Compile source files to objects and link them with object and library inputs into one program (OpenCL 1.2+)")
+assembler_option = command_options.add_argument(
+    "-S", dest="command", action="store_const", const="assemble",
+    help="Build program and produce assembly listing (AMD platform only)")
+library_option = parser.add_argument(
+    "--library", dest="library", action="store_true",
+    help="With --link, create a library instead of an executable program")
+object_dir_option = parser.add_argument(
+    "--object-dir", dest="object_dir",
+    help="With --link, directory for objects compiled from source files (default: next to the sources)")
+debug_option = parser.add_argument(
+    "-g", dest="debug", action="store_true",
+    help="Generate debug info (where applicable)")
+platform_option = parser.add_argument(
+    "-p", "--platform", dest="platform",
+    help="Target OpenCL platform")
+device_option = parser.add_argument(
+    "-d", "--device", dest="device", default="1",
+    help="Target OpenCL device, comma-separated list of devices, or \"all\" to build once for all devices of the platform")
+include_option = parser.add_argument(
+    "-I", dest="include", action="append",
+    help="Include directory paths")
+parser.add_argument(
+    "-o", dest="output",
+    help="Output file name (object file), or a directory or {name} pattern when compiling multiple files")
+archive_option = parser.add_argument(
+    "--archive", dest="archive", metavar="FILE",
+    help="Pack the binaries of all inputs, devices and sweep variants into one indexed archive instead of separate output files")
+dependencies_option = parser.add_argument(
+    "-MD", dest="dependencies", action="store_true",
+    help="Write a Make-compatible dependency file next to the output (implied by -MF, -MT and -MP)")
+depfile_option = parser.add_argument(
+    "-MF", dest="depfile",
+    help="Dependency file name, or a {name} pattern when compiling multiple files")
+deptarget_option = parser.add_argument(
+    "-MT", dest="deptarget",
+    help="Target of the rule in the dependency file (default: output file names)")
+depphony_option = parser.add_argument(
+    "-MP", dest="depphony", action="store_true",
+    help="Add a phony target for each header to the dependency file")
+refresh_devices_option = parser.add_argument(
+    "--refresh-devices", dest="refresh_devices", action="store_true",
+    help="Query OpenCL platforms and devices again instead of using the saved device list")
+time_report_option = parser.add_argument(
+    "--time-report", dest="time_report", action="store_true",
+    help="Print wall-clock time spent in each phase of compilation")
+trace_option = parser.add_argument(
+    "--trace", dest="trace", metavar="FILE",
+    help="Write a Chrome trace (JSON) of compilation phases to FILE")
+cache_dir_option = parser.add_argument(
+    "--cache-dir", dest="cache_dir", default=os.environ.get("CLCC_CACHE_DIR"),
+    help="Directory of the persistent compile cache (default: $CLCC_CACHE_DIR; no caching if unset)")
+cache_size_option = parser.add_argument(
+    "--cache-size", dest="cache_size", default=CACHE_DEFAULT_MAX_SIZE // (1024 * 1024), type=int,
+    help="Maximum size of the compile cache in MB; least recently used entries are evicted")
+cache_stats_option = parser.add_argument(
+    "--cache-stats", dest="cache_stats", action="store_true",
+    help="Print compile cache statistics (hits, misses, bytes)")
+server_option = parser.add_argument(
+    "--server", dest="server", action="store_true",
+    help="Run a compile server which keeps OpenCL platforms, devices and contexts loaded between builds")
+socket_option = parser.add_argument(
+    "--socket", dest="socket",
+    help="Unix domain socket of the compile server (default: $CLCC_SERVER_SOCKET or clcc-<uid>.sock in the runtime directory)")
+listen_option = parser.add_argument(
+    "--listen", dest="listen", metavar="HOST[:PORT]",
+    help="With --server, run a builder for remote clients on a TCP address instead of the Unix domain socket (default port: 3637)")
+remote_option = parser.add_argument(
+    "--remote", dest="remote", action="append", metavar="HOST[:PORT]",
+    help="Send builds to a builder (clcc --server --listen) which has the target platform and device (repeatable; default: $CLCC_BUILDERS)")
+no_server_option = parser.add_argument(
+    "--no-server", dest="no_server", action="store_true",
+    help="Always compile in-process, even if a compile server is running or builders are configured")
+parser.add_argument(
+    "-j", "--jobs", dest="jobs", default=1, type=int,
+    help="Number of files to compile in parallel")
+async_builds_option = parser.add_argument(
+    "--async-builds", dest="async_builds", action="store_true",
+    help="Submit builds from a single thread and let the driver run up to -j of them asynchronously")
+isolate_option = parser.add_argument(
+    "--isolate", dest="isolate", action="store_true",
+    help="Run builds in up to -j worker processes, so that a compiler crash or hang fails only the build which caused it")
+build_timeout_option = parser.add_argument(
+    "--build-timeout", dest="build_timeout", type=float, metavar="SECONDS",
+    help="With --isolate, kill a worker process if its build takes longer than SECONDS")
+worker_memory_option = parser.add_argument(
+    "--worker-memory", dest="worker_memory", type=int, metavar="MB",
+    help="With --isolate, kill a worker process whose resident memory exceeds MB during a build, and replace it after builds which exceed it")
+worker_builds_option = parser.add_argument(
+    "--worker-builds", dest="worker_builds", type=int, metavar="N",
+    help="With --isolate, replace each worker process after N builds")
+build_retries_option = parser.add_argument(
+    "--build-retries", dest="build_retries", default=1, type=int, metavar="N",
+    help="With --isolate, retry a build which crashed, timed out or exceeded the memory limit up to N times (default: 1)")
+resource_report_option = parser.add_argument(
+    "--resource-report", dest="resource_report", action="store_true",
+    help="Print work-group size, local and private memory, registers and spills of every kernel after the build")
+resource_json_option = parser.add_argument(
+    "--resource-json", dest="resource_json", metavar="FILE",
+    help="Write the kernel resource report as JSON to FILE instead of printing it")
+project_option = parser.add_argument(
+    "--project", dest="project", metavar="MANIFEST",
+    help="Build the kernels listed in a JSON (or TOML) project manifest with their own flags, platforms, devices and outputs, "
+         "skipping outputs which are up to date")
+rebuild_option = parser.add_argument(
+    "--rebuild", dest="rebuild", action="store_true",
+    help="With --project, build all outputs even if they are up to date")
+watch_option = parser.add_argument(
+    "--watch", dest="watch", action="store_true",
+    help="After the build, keep the device context and rebuild inputs whenever they or headers they include change, until interrupted")
+bench_option = parser.add_argument(
+    "--bench", dest="bench", metavar="KERNEL",
+    help="After each program build, launch KERNEL on synthetic arguments on every target device and report its profiled times")
+bench_args_option = parser.add_argument(
+    "--bench-args", dest="bench_args", metavar="SPEC",
+    help="Comma-separated arguments of the benchmarked kernel: TYPE[COUNT] for a buffer (e.g. float[1M]), local[BYTES], or TYPE=VALUE")
+bench_global_option = parser.add_argument(
+    "--bench-global", dest="bench_global", default="1048576", metavar="X[,Y[,Z]]",
+    help="Global work size of the benchmarked kernel (default: 1048576)")
+bench_local_option = parser.add_argument(
+    "--bench-local", dest="bench_local", metavar="X[,Y[,Z]]",
+    help="Local work size of the benchmarked kernel (default: chosen by the driver)")
+bench_warmup_option = parser.add_argument(
+    "--bench-warmup", dest="bench_warmup", default=2, type=int, metavar="N",
+    help="Untimed kernel launches before the timed ones (default: 2)")
+bench_repeat_option = parser.add_argument(
+    "--bench-repeat", dest="bench_repeat", default=10, type=int, metavar="N",
+    help="Timed kernel launches (default: 10)")
+sweep_option = parser.add_argument(
+    "--sweep", dest="sweep", action="append", metavar="NAME=VALUES",
+    help="Compile a variant of the input for every combination of comma-separated values of macro NAME (repeatable)")
+sweep_file_option = parser.add_argument(
+    "--sweep-file", dest="sweep_file", metavar="FILE",
+    help="JSON (or YAML) file with a sweep grid: an object of macro value lists, or a list of variant objects")
+sweep_index_option = parser.add_argument(
+    "--sweep-index", dest="sweep_index", metavar="FILE",
+    help="Write the variants of a sweep with their macros, outputs, build status and time as JSON to FILE")
+parser.add_argument(
+    "inputs", nargs="*", metavar="input",
+    help="Input file names (source files or SPIR-V modules; with --link also objects and libraries)")
+parser.set_defaults(command="build")
+
+
+def get_dependency_output(options):
+    if not (options.dependencies or options.depfile or options.deptarget or options.depphony):
+        return None
+    if len(options.inputs) > 1:
+        for option_name, option_value in [("-MF", options.depfile), ("-MT", options.deptarget)]:
+            if option_value is not None and "{" not in option_value:
+                report.error("option %s must be a pattern with {name} when compiling multiple files" % option_name)
+    return DependencyOutput(options.depfile, options.deptarget, options.depphony)
+
+
+def finish_profiling(options):
+    profiler = timing.get_profiler()
+    if profiler is not None:
+        if options.time_report:
+            profiler.print_report()
+        if options.trace is not None:
+            profiler.write_trace(options.trace)
+
+
+def get_output_filename(output_pattern, input_filename, command, batch, device_id=None, multiple_devices=False, variant=None):
+    # When a single build produces binaries for several devices, outputs without a {device} field get a .d<N> suffix.
+    # Likewise, variants of a sweep get a .v<N> suffix unless the output has a {variant} field.
+    input_dirname, input_basename = os.path.split(input_filename)
+    input_name = os.path.splitext(input_basename)[0]
+    output_extension = {"compile": ".o", "assemble": ".s"}.get(command, ".bin")
+    variant_suffix = ".v%d" % variant if variant is not None else ""
+    device_suffix = ".d%d" % device_id if multiple_devices else ""
+    if output_pattern is None:
+        return os.path.join(input_dirname, input_name + variant_suffix + device_suffix + output_extension)
+    elif "{" in output_pattern:
+        output_filename = output_pattern.format(name=input_name, dir=input_dirname or ".", device=device_id, variant=variant)
+        if "{variant}" in output_pattern:
+            variant_suffix = ""
+        if "{device}" in output_pattern:
+            device_suffix = ""
+    elif os.path.isdir(output_pattern) or output_pattern.endswith(os.sep):
+        return os.path.join(output_pattern, input_name + variant_suffix + device_suffix + output_extension)
+    elif batch:
+        report.error("output %s must be a directory or a pattern with {name} when compiling multiple files" % output_pattern)
+    else:
+        output_filename = output_pattern
+
+    if not variant_suffix and not device_suffix:
+        return output_filename
+    output_root, output_extension = os.path.splitext(output_filename)
+    return output_root + variant_suffix + device_suffix + output_extension
+
+
+def get_output_filenames(output_pattern, input_filename, command, batch, device_ids, variant=None):
+    multiple_devices = len(device_ids) > 1
+    return [get_output_filename(output_pattern, input_filename, command, batch, device_id, multiple_devices, variant) for device_id in device_ids]
+
+
+def read_source(input_filename):
+    # Returns the OpenCL C source code, or a SpirvModule if the input is a SPIR-V module
+    with open(input_filename, "rb") as input_file:
+        magic = input_file.read(4)
+        if is_spirv(magic):
+            return SpirvModule(magic + input_file.read())
+    open_kwargs = {}
+    if sys.version_info >= (3,):
+        open_kwargs["encoding"] = "utf8"
+    with open(input_filename, "r", **open_kwargs) as input_file:
+        return input_file.read()
+
+
+def write_binaries(output_filenames, binaries):
+    for output_filename, binary in zip(output_filenames, binaries):
+        with open(output_filename, "wb") as output_file:
+            output_file.write(memoryview(binary))
+
+
+def create_thread_pool(jobs):
+    # multiprocessing is a large part of the startup time, so it is imported only when a pool is needed
+    from multiprocessing.pool import ThreadPool
+    return ThreadPool(max(jobs, 1))
+
+
+def print_batch_summary(results):
+    failures = 0
+    for input_filename, output_filenames, status, elapsed in results:
+        if status == 0:
+            if output_filenames is not None:
+                print("OK    %s -> %s (%.3f s)" % (input_filename, ", ".join(output_filenames), elapsed))
+            else:
+                print("OK    %s (%.3f s)" % (input_filename, elapsed))
+        else:
+            failures += 1
+            print("FAIL  %s (%.3f s)" % (input_filename, elapsed))
+    print("%d files compiled, %d failed" % (len(results) - failures, failures))
+    return 0 if failures == 0 else 1
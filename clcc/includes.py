@@ -0,0 +1,108 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import re
+import sys
+import threading
+
+from .spirv import SpirvModule
+
+
+include_regex = re.compile(r"^[ \t]*#[ \t]*include[ \t]*([<\"])([^>\"]+)[>\"]", re.MULTILINE)
+
+
+def read_text(path):
+    open_kwargs = {}
+    if sys.version_info >= (3,):
+        open_kwargs["encoding"] = "utf8"
+        open_kwargs["errors"] = "replace"
+    with open(path, "r", **open_kwargs) as text_file:
+        return text_file.read()
+
+
+def find_header(header_name, current_dirname, include_paths, quoted):
+    search_paths = list(include_paths or [])
+    if quoted:
+        search_paths.insert(0, current_dirname)
+    for search_path in search_paths:
+        header_path = os.path.normpath(os.path.join(search_path, header_name))
+        if os.path.isfile(header_path):
+            return header_path
+    return None
+
+
+def parse_includes(source_code):
+    return [(delimiter == "\"", header_name) for delimiter, header_name in include_regex.findall(source_code)]
+
+
+class HeaderCache:
+    # Text and #include directives of headers, shared by all sources in a batch.
+    # Entries are validated against the file modification time and size, so the cache may outlive edits.
+    def __init__(self):
+        self._headers = {}
+        self._lock = threading.Lock()
+
+    def _get(self, header_path):
+        stat = os.stat(header_path)
+        file_version = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            entry = self._headers.get(header_path)
+        if entry is None or entry[0] != file_version:
+            header_code = read_text(header_path)
+            entry = (file_version, header_code, parse_includes(header_code))
+            with self._lock:
+                self._headers[header_path] = entry
+        return entry
+
+    def read_text(self, header_path):
+        return self._get(header_path)[1]
+
+    def get_includes(self, header_path):
+        return self._get(header_path)[2]
+
+
+def _walk_includes(input_filename, source_code, include_paths, header_cache):
+    # Yields the name in the #include directive and the path of each header, visiting every header once
+    if isinstance(source_code, SpirvModule):
+        # Modules are self-contained: the preprocessor ran before they were produced
+        return
+    if header_cache is None:
+        header_cache = HeaderCache()
+    visited = set()
+    pending = [(os.path.dirname(input_filename) or ".", parse_includes(source_code))]
+    while pending:
+        current_dirname, current_includes = pending.pop()
+        for quoted, header_name in current_includes:
+            header_path = find_header(header_name, current_dirname, include_paths, quoted)
+            if header_path is not None:
+                yield header_name, header_path
+                if header_path not in visited:
+                    visited.add(header_path)
+                    pending.append((os.path.dirname(header_path), header_cache.get_includes(header_path)))
+
+
+def scan_includes(input_filename, source_code, include_paths, header_cache=None):
+    # Returns paths of all headers transitively included from the source.
+    # Headers which can not be found in the include paths (e.g. driver built-ins) are skipped.
+    headers = []
+    visited = set()
+    for header_name, header_path in _walk_includes(input_filename, source_code, include_paths, header_cache):
+        if header_path not in visited:
+            visited.add(header_path)
+            headers.append(header_path)
+    return headers
+
+
+def scan_include_names(input_filename, source_code, include_paths, header_cache=None):
+    # Returns (include name, header path) pairs as needed for the input headers of clCompileProgram.
+    # If the same name refers to different headers, the first one found wins.
+    header_names = []
+    visited = set()
+    for header_name, header_path in _walk_includes(input_filename, source_code, include_paths, header_cache):
+        if header_name not in visited:
+            visited.add(header_name)
+            header_names.append((header_name, header_path))
+    return header_names
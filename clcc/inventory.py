@@ -0,0 +1,164 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import sys
+import json
+import ctypes
+
+from .opencl import PLATFORM_NAME as CL_PLATFORM_NAME, \
+    PLATFORM_PROFILE as CL_PLATFORM_PROFILE, \
+    PLATFORM_VERSION as CL_PLATFORM_VERSION, \
+    PLATFORM_EXTENSIONS as CL_PLATFORM_EXTENSIONS, \
+    DEVICE_NAME as CL_DEVICE_NAME, \
+    DEVICE_VERSION as CL_DEVICE_VERSION, \
+    DRIVER_VERSION as CL_DRIVER_VERSION, \
+    DEVICE_EXTENSIONS as CL_DEVICE_EXTENSIONS, \
+    DEVICE_TYPE as CL_DEVICE_TYPE, \
+    DEVICE_TYPE_GPU as CL_DEVICE_TYPE_GPU, \
+    DEVICE_GFXIP_MAJOR_AMD as CL_DEVICE_GFXIP_MAJOR_AMD, \
+    DEVICE_GFXIP_MINOR_AMD as CL_DEVICE_GFXIP_MINOR_AMD, \
+    DEVICE_COMPUTE_CAPABILITY_MAJOR_NV as CL_DEVICE_COMPUTE_CAPABILITY_MAJOR_NV, \
+    DEVICE_COMPUTE_CAPABILITY_MINOR_NV as CL_DEVICE_COMPUTE_CAPABILITY_MINOR_NV
+from .cache import default_cache_directory, write_file_atomic
+from . import timing
+
+
+# Bump when the set of queried attributes changes
+INVENTORY_FORMAT_VERSION = 1
+
+ICD_VENDORS_DIRECTORY = "/etc/OpenCL/vendors"
+
+
+def default_inventory_path():
+    return os.path.join(default_cache_directory(), "devices.json")
+
+
+def find_library_file(library_path):
+    if os.path.isabs(library_path):
+        return library_path
+    if sys.platform.startswith("linux"):
+        # The dynamic loader resolved the name already: find the file it mapped into this process
+        library_name = os.path.basename(library_path)
+        try:
+            with open("/proc/self/maps", "r") as maps_file:
+                for line in maps_file:
+                    fields = line.split(None, 5)
+                    if len(fields) == 6 and os.path.basename(fields[5].strip()).startswith(library_name):
+                        return os.path.realpath(fields[5].strip())
+        except EnvironmentError:
+            pass
+    # ctypes.util imports subprocess and friends: keep it out of the startup path
+    import ctypes.util
+    return ctypes.util.find_library(os.path.splitext(library_path)[0].replace("lib", "", 1)) or library_path
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _get_vendor_library(vendor_path):
+    # An ICD file names the library of the vendor driver on its first line
+    try:
+        with open(vendor_path, "r") as vendor_file:
+            return vendor_file.readline().strip() or None
+    except EnvironmentError:
+        return None
+
+
+def get_inventory_key(cl):
+    # The snapshot is valid as long as the OpenCL library, the registered ICDs and the driver libraries they name do not
+    # change: a driver upgrade which keeps its ICD file changes the driver versions of the devices
+    library_file = find_library_file(cl.library_path)
+    vendors_directory = os.environ.get("OCL_ICD_VENDORS") or ICD_VENDORS_DIRECTORY
+    vendors = []
+    if os.path.isdir(vendors_directory):
+        for vendor_filename in sorted(os.listdir(vendors_directory)):
+            vendor_path = os.path.join(vendors_directory, vendor_filename)
+            vendor = [vendor_path, _get_mtime(vendor_path)]
+            vendor_library = _get_vendor_library(vendor_path) if vendor_filename.endswith(".icd") else None
+            if vendor_library is not None:
+                vendor_library_file = find_library_file(vendor_library)
+                vendor += [vendor_library_file, _get_mtime(vendor_library_file)]
+            vendors.append(vendor)
+    return {
+        "version": INVENTORY_FORMAT_VERSION,
+        "library": library_file,
+        "library_mtime": _get_mtime(library_file),
+        "vendors": vendors
+    }
+
+
+def query_inventory(cl):
+    platforms = []
+    for platform in cl.get_platform_ids():
+        platform_info = {
+            "name": cl.get_platform_info(platform, CL_PLATFORM_NAME),
+            "profile": cl.get_platform_info(platform, CL_PLATFORM_PROFILE),
+            "version": cl.get_platform_info(platform, CL_PLATFORM_VERSION),
+            "extensions": cl.get_platform_info(platform, CL_PLATFORM_EXTENSIONS).split(),
+            "devices": []
+        }
+        for device in cl.get_platform_devices(platform):
+            device_info = {
+                "type": cl.get_device_info(device, CL_DEVICE_TYPE, ctypes.c_uint64),
+                "name": cl.get_device_string_info(device, CL_DEVICE_NAME),
+                "version": cl.get_device_string_info(device, CL_DEVICE_VERSION),
+                "driver_version": cl.get_device_string_info(device, CL_DRIVER_VERSION),
+                "extensions": cl.get_device_string_info(device, CL_DEVICE_EXTENSIONS).split(),
+                "gfxip": None,
+                "compute_capability": None
+            }
+            if device_info["type"] == CL_DEVICE_TYPE_GPU:
+                if "cl_amd_device_attribute_query" in device_info["extensions"]:
+                    device_info["gfxip"] = [
+                        cl.get_device_info(device, CL_DEVICE_GFXIP_MAJOR_AMD, ctypes.c_uint32),
+                        cl.get_device_info(device, CL_DEVICE_GFXIP_MINOR_AMD, ctypes.c_uint32)]
+                elif "cl_nv_device_attribute_query" in device_info["extensions"]:
+                    device_info["compute_capability"] = [
+                        cl.get_device_info(device, CL_DEVICE_COMPUTE_CAPABILITY_MAJOR_NV, ctypes.c_uint32),
+                        cl.get_device_info(device, CL_DEVICE_COMPUTE_CAPABILITY_MINOR_NV, ctypes.c_uint32)]
+            platform_info["devices"].append(device_info)
+            cl.release_device(device)
+        platforms.append(platform_info)
+    return platforms
+
+
+def get_device_fingerprint(device_info):
+    # Devices with equal fingerprints get identical binaries from the compiler: the same device name and architecture,
+    # OpenCL C and driver versions, and extensions (which enable optional features of the compiled code)
+    return (device_info["name"], device_info["type"], tuple(device_info["gfxip"] or ()), tuple(device_info["compute_capability"] or ()),
+            device_info["version"], device_info["driver_version"], tuple(sorted(device_info["extensions"])))
+
+
+def load_inventory(cl, inventory_path=None, refresh=False):
+    # Returns the list of platforms with their attributes and devices, from the snapshot if it is up to date
+    if inventory_path is None:
+        inventory_path = default_inventory_path()
+    inventory_key = get_inventory_key(cl)
+    if not refresh:
+        try:
+            with open(inventory_path, "r") as inventory_file:
+                snapshot = json.load(inventory_file)
+            if snapshot["key"] == inventory_key:
+                return snapshot["platforms"]
+        except (EnvironmentError, ValueError, KeyError):
+            pass
+
+    with timing.phase("query platforms and devices"):
+        platforms = query_inventory(cl)
+    snapshot = {"key": inventory_key, "platforms": platforms}
+    try:
+        inventory_dirname = os.path.dirname(inventory_path)
+        if inventory_dirname and not os.path.isdir(inventory_dirname):
+            os.makedirs(inventory_dirname)
+        write_file_atomic(inventory_path, json.dumps(snapshot, indent=1).encode("utf8"))
+    except EnvironmentError:
+        # A read-only cache directory only disables the snapshot
+        pass
+    return platforms
@@ -0,0 +1,201 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import re
+import struct
+import collections
+
+from .elf import ElfFile, is_elf
+
+
+# Statistics are None where the binary does not provide them
+KernelCode = collections.namedtuple("KernelCode", ["name", "il", "isa", "vgprs", "sgprs", "lds_size", "work_group_size"])
+
+# CAL notes of the per-kernel images in binaries of the AMD APP SDK (Catalyst) runtime
+_CAL_NOTE_NAME = "ATI CAL"
+_CAL_NOTE_PROGINFO = 1
+# Program info registers: pairs of 32-bit register address and value
+_PROGINFO_NUM_VGPRS = 0x80001041
+_PROGINFO_NUM_SGPRS = 0x80001042
+
+_STT_FUNC = 2
+_STT_AMDGPU_HSA_KERNEL = 10
+
+# Limits of a GCN SIMD: waves in flight, registers, and local memory per compute unit of 4 SIMDs
+_GCN_MAX_WAVES_PER_SIMD = 10
+_GCN_VGPRS_PER_SIMD = 256
+_GCN_LDS_PER_CU = 65536
+_GCN_SIMDS_PER_CU = 4
+_GCN_WAVE_SIZE = 64
+
+
+def _round_up(value, granularity):
+    return (value + granularity - 1) // granularity * granularity
+
+
+def _get_amd_app_kernels(elf):
+    # Kernel NAME has __OpenCL_NAME_kernel (CAL image with the ISA), __OpenCL_NAME_amdil (AMDIL text),
+    # and __OpenCL_NAME_metadata (text with ;memory:hwlocal:<LDS bytes> and ;cws:<x>:<y>:<z> lines)
+    kernels = collections.OrderedDict()
+    for symbol in elf.get_symbols():
+        symbol_match = re.match(r"__OpenCL_(\w+)_(kernel|amdil|metadata)$", symbol.name)
+        if symbol_match is not None:
+            kernels.setdefault(symbol_match.group(1), {})[symbol_match.group(2)] = elf.get_symbol_data(symbol)
+
+    kernel_codes = []
+    for name, parts in kernels.items():
+        il = None
+        if "amdil" in parts:
+            il = bytes(parts["amdil"]).rstrip(b"\0").decode("ascii", "replace")
+        lds_size, work_group_size = None, None
+        if "metadata" in parts:
+            metadata = bytes(parts["metadata"]).decode("ascii", "replace")
+            lds_match = re.search(r"^;memory:hwlocal:(\d+)", metadata, re.MULTILINE)
+            if lds_match is not None:
+                lds_size = int(lds_match.group(1))
+            cws_match = re.search(r"^;cws:(\d+):(\d+):(\d+)", metadata, re.MULTILINE)
+            if cws_match is not None and int(cws_match.group(1)) != 0:
+                work_group_size = int(cws_match.group(1)) * int(cws_match.group(2)) * int(cws_match.group(3))
+        isa, vgprs, sgprs = None, None, None
+        if "kernel" in parts and is_elf(parts["kernel"]):
+            image = ElfFile(parts["kernel"])
+            text_section = image.get_section(".text")
+            if text_section is not None:
+                isa = bytes(image.get_section_data(text_section))
+            for note in image.get_notes():
+                if note.name == _CAL_NOTE_NAME and note.type == _CAL_NOTE_PROGINFO:
+                    for offset in range(0, len(note.description) // 8 * 8, 8):
+                        address, value = struct.unpack_from("<II", note.description, offset)
+                        if address == _PROGINFO_NUM_VGPRS:
+                            vgprs = value
+                        elif address == _PROGINFO_NUM_SGPRS:
+                            sgprs = value
+        kernel_codes.append(KernelCode(name, il, isa, vgprs, sgprs, lds_size, work_group_size))
+    return kernel_codes
+
+
+def _get_code_object_kernels(elf):
+    # HSA code objects (ROCm): kernel code follows an amd_kernel_code_t header (code object v2),
+    # or is described by a NAME.kd kernel descriptor (code object v3+)
+    symbols = elf.get_symbols()
+    descriptors = dict((symbol.name[:-3], symbol) for symbol in symbols if symbol.name.endswith(".kd"))
+    kernel_codes = []
+    for symbol in symbols:
+        if symbol.type not in [_STT_FUNC, _STT_AMDGPU_HSA_KERNEL] or symbol.size == 0:
+            continue
+        code = bytes(elf.get_symbol_data(symbol))
+        vgprs, sgprs, lds_size = None, None, None
+        if symbol.name in descriptors:
+            descriptor = bytes(elf.get_symbol_data(descriptors[symbol.name]))
+            if len(descriptor) >= 52:
+                lds_size, = struct.unpack_from("<I", descriptor, 0)
+                rsrc1, = struct.unpack_from("<I", descriptor, 48)
+                vgprs = ((rsrc1 & 0x3F) + 1) * 4
+                sgprs = (((rsrc1 >> 6) & 0xF) + 1) * 8
+        elif symbol.type == _STT_AMDGPU_HSA_KERNEL and len(code) >= 256:
+            version_major, = struct.unpack_from("<I", code, 0)
+            entry_offset, = struct.unpack_from("<q", code, 16)
+            if version_major == 1 and 0 < entry_offset <= len(code):
+                lds_size, = struct.unpack_from("<I", code, 64)
+                sgprs, vgprs = struct.unpack_from("<HH", code, 84)
+                code = code[entry_offset:]
+        kernel_codes.append(KernelCode(symbol.name, None, code, vgprs, sgprs, lds_size, None))
+    return kernel_codes
+
+
+def extract_kernels(binary):
+    # Returns the KernelCode of every kernel in a program binary; raises ValueError if the binary can not be parsed
+    if not is_elf(binary):
+        raise ValueError("program binary is not an ELF file")
+    elf = ElfFile(binary)
+    if any(symbol.name.startswith("__OpenCL_") for symbol in elf.get_symbols()):
+        return _get_amd_app_kernels(elf)
+    return _get_code_object_kernels(elf)
+
+
+def get_gcn_instruction_size(words, index, gfxip_major):
+    # Size in 32-bit words of the GCN (GFXIP 6-9) instruction which starts at words[index], including a literal constant
+    word = words[index]
+    if word >> 31 == 0:
+        # VOP2, VOP1, VOPC: a source operand of 255 is a literal, 249/250 are SDWA/DPP extensions on GFXIP 8+
+        src0 = word & 0x1FF
+        return 2 if src0 == 255 or (gfxip_major >= 8 and src0 in [249, 250]) else 1
+    elif word >> 30 == 0b10:
+        if word >> 23 == 0b101111111:
+            # SOPP
+            return 1
+        elif word >> 23 == 0b101111101:
+            # SOP1
+            return 2 if word & 0xFF == 255 else 1
+        elif word >> 23 != 0b101111110 and word >> 28 == 0b1011:
+            # SOPK
+            return 1
+        # SOP2, SOPC
+        return 2 if word & 0xFF == 255 or (word >> 8) & 0xFF == 255 else 1
+    top6 = word >> 26
+    if gfxip_major >= 8 and top6 == 0b110000:
+        # SMEM
+        return 2
+    elif gfxip_major < 8 and word >> 27 == 0b11000:
+        # SMRD: a literal offset on GFXIP 7
+        return 2 if gfxip_major == 7 and word & 0x1FF == 0xFF else 1
+    elif top6 in [0b110100, 0b110110, 0b110111, 0b111000, 0b111010, 0b111100, 0b111110]:
+        # VOP3 (and VOP3P on GFXIP 9), DS, FLAT, MUBUF, MTBUF, MIMG, EXP
+        return 2
+    # VINTRP and unknown encodings
+    return 1
+
+
+def split_gcn_instructions(isa, gfxip_major):
+    # Returns (offset, words) of each instruction; trailing bytes which do not form a word are ignored
+    words = struct.unpack("<%dI" % (len(isa) // 4), isa[:len(isa) // 4 * 4])
+    instructions = []
+    index = 0
+    while index < len(words):
+        size = min(get_gcn_instruction_size(words, index, gfxip_major), len(words) - index)
+        instructions.append((index * 4, words[index:index + size]))
+        index += size
+    return instructions
+
+
+def estimate_occupancy(gfxip_major, vgprs, sgprs, lds_size, work_group_size=None):
+    # Waves per SIMD (out of 10) of a GCN kernel, as limited by registers and local memory; None for other architectures
+    if gfxip_major is None or gfxip_major < 6 or vgprs is None:
+        return None
+    waves = _GCN_MAX_WAVES_PER_SIMD
+    waves = min(waves, _GCN_VGPRS_PER_SIMD // max(_round_up(vgprs, 4), 4))
+    if sgprs is not None:
+        sgprs_per_simd = 512 if gfxip_major < 8 else 800
+        waves = min(waves, sgprs_per_simd // max(_round_up(sgprs, 8), 8))
+    if lds_size:
+        waves_per_work_group = _round_up(work_group_size or 256, _GCN_WAVE_SIZE) // _GCN_WAVE_SIZE
+        work_groups_per_cu = _GCN_LDS_PER_CU // lds_size
+        waves = min(waves, work_groups_per_cu * waves_per_work_group // _GCN_SIMDS_PER_CU)
+    return waves
+
+
+def format_listing(kernels, device_description, gfxip_major):
+    # Assembly listing: statistics, AMDIL text, and instruction words of the ISA (there is no disassembler)
+    lines = ["; Device: %s" % device_description]
+    for kernel in kernels:
+        instructions = None
+        if kernel.isa is not None and gfxip_major is not None and gfxip_major >= 6:
+            instructions = split_gcn_instructions(kernel.isa, gfxip_major)
+        lines += ["", "; Kernel: %s" % kernel.name]
+        for stat_name, stat_value in [("VGPRs", kernel.vgprs), ("SGPRs", kernel.sgprs), ("LDS bytes", kernel.lds_size),
+                                      ("Instructions", None if instructions is None else len(instructions))]:
+            if stat_value is not None:
+                lines.append(";   %s: %d" % (stat_name, stat_value))
+        if kernel.il is not None:
+            lines += ["", "; AMDIL", kernel.il.rstrip()]
+        if instructions is not None:
+            lines += ["", "; ISA"]
+            lines += ["  %06X: %s" % (offset, " ".join("%08X" % word for word in words)) for offset, words in instructions]
+        elif kernel.isa is not None:
+            lines += ["", "; ISA (%d bytes)" % len(kernel.isa)]
+            isa_words = struct.unpack("<%dI" % (len(kernel.isa) // 4), kernel.isa[:len(kernel.isa) // 4 * 4])
+            lines += ["  %06X: %s" % (offset * 4, " ".join("%08X" % word for word in isa_words[offset:offset + 4]))
+                      for offset in range(0, len(isa_words), 4)]
+    return "\n".join(lines) + "\n"
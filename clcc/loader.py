@@ -0,0 +1,158 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import collections
+from ctypes import c_void_p
+
+from .opencl import DEVICE_NAME as CL_DEVICE_NAME, \
+    DEVICE_PLATFORM as CL_DEVICE_PLATFORM, \
+    BUILD_SUCCESS as CL_BUILD_SUCCESS
+from .target import Target, create_program
+from .archive import Archive
+from .cache import CompileCache, get_prebuilt_key, read_stamp, DEFAULT_MAX_SIZE as CACHE_DEFAULT_MAX_SIZE
+from .includes import scan_includes
+from . import report
+from . import timing
+
+
+class LoadedProgram(collections.namedtuple("LoadedProgram", ["program", "origin", "build_log"])):
+    # origin is "file", "archive" or "cache" if the program was created from a prebuilt binary, or "source".
+    # The caller owns the program and releases it with clReleaseProgram.
+    pass
+
+
+class ProgramLoader:
+    # Creates programs for one device of an application's context from binaries which clcc built ahead of time.
+    # Binaries are looked up in a loose output file, an archive (--archive) and the compile cache (--cache-dir), in this
+    # order. A binary which is missing, stale (built from another source, other included headers or with other flags), or
+    # rejected by the driver, is skipped; when no binary loads, the program is built from the source and stored in the cache.
+    # Loose binaries are checked through the stamps which clcc writes next to them, and binaries without one are skipped.
+    # Flags must be the complete build flags, as recorded in archive entries, for binaries to match.
+    def __init__(self, cl, context, device, archive_path=None, cache_dir=None, cache_size=CACHE_DEFAULT_MAX_SIZE, include_paths=None):
+        self.cl = cl
+        self.context = context
+        self.device = device
+        self.device_name = cl.get_device_string_info(device, CL_DEVICE_NAME)
+        platform = c_void_p(cl.get_device_info(device, CL_DEVICE_PLATFORM, c_void_p))
+        # The target only provides the identity of the device for cache keys: builds use the application's context
+        self.target = Target(cl, platform, [device], [1])
+        self.include_paths = list(include_paths or [])
+        self.archive = None
+        if archive_path is not None:
+            try:
+                self.archive = Archive(archive_path)
+            except (EnvironmentError, report.Error) as e:
+                report.warning("prebuilt binaries in %s are not used: %s" % (archive_path, e))
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = CompileCache(cache_dir, cache_size)
+
+    def _find_file_binary(self, binary_path, prebuilt_key):
+        if read_stamp(binary_path) != prebuilt_key:
+            return None
+        try:
+            with open(binary_path, "rb") as binary_file:
+                return binary_file.read()
+        except EnvironmentError:
+            return None
+
+    def _find_archive_binary(self, name, prebuilt_key):
+        for entry in self.archive.find(name, self.device_name):
+            if entry.prebuilt_key == prebuilt_key:
+                binary_view = self.archive.read(entry)
+                try:
+                    # The mapping is read-only, but the driver interface takes writable buffers
+                    return binary_view.tobytes()
+                finally:
+                    binary_view.release()
+        return None
+
+    def _find_cache_binary(self, cache_key):
+        result = self.cache.lookup(cache_key)
+        if result is None or result[0] != 0 or result[2] is None:
+            return None
+        return result[2][0]
+
+    def _build(self, program, flags):
+        # Returns the build status; only programs in the CL_BUILD_SUCCESS state count as built
+        status = self.cl.build_program(program, [self.device], flags)
+        if status == 0 and self.cl.get_program_build_status(program, self.device) != CL_BUILD_SUCCESS:
+            status = -1
+        return status
+
+    def _load_binary(self, binary, flags):
+        # Returns the built program, or None if the driver rejects the binary
+        try:
+            with timing.phase("create program"):
+                program = self.cl.create_program_with_binary(self.context, [self.device], [binary])
+        except report.Error:
+            return None
+        try:
+            with timing.phase("build program"):
+                status = self._build(program, flags)
+        except:
+            self.cl.release_program(program)
+            raise
+        if status != 0:
+            self.cl.release_program(program)
+            return None
+        return program
+
+    def load(self, source_code, flags="", name=None, filename="<source>.cl", binary_path=None):
+        # name is the archive entry name: the base name of the source file, with a .v<N> suffix for sweep variants.
+        # Relative includes are resolved against filename.
+        if name is None:
+            name = os.path.splitext(os.path.basename(filename))[0]
+        prebuilt_key, cache_key = None, None
+        if binary_path is not None or self.archive is not None or self.cache is not None:
+            with timing.phase("scan includes"):
+                header_paths = scan_includes(filename, source_code, self.include_paths)
+            prebuilt_key = get_prebuilt_key(source_code, header_paths, flags)
+            if self.cache is not None:
+                cache_key = self.cache.get_key(self.target, "build", source_code, header_paths, flags)
+
+        lookups = [
+            ("file", lambda: None if binary_path is None else self._find_file_binary(binary_path, prebuilt_key)),
+            ("archive", lambda: None if self.archive is None else self._find_archive_binary(name, prebuilt_key)),
+            ("cache", lambda: None if cache_key is None else self._find_cache_binary(cache_key))
+        ]
+        for origin, lookup in lookups:
+            with timing.phase("find binary", origin=origin):
+                binary = lookup()
+            if binary is not None:
+                program = self._load_binary(binary, flags)
+                if program is not None:
+                    return LoadedProgram(program, origin, self.cl.get_program_build_log(program, self.device))
+
+        with timing.phase("create program"):
+            program = create_program(self.cl, self.context, source_code)
+        try:
+            with timing.phase("build program"):
+                status = self._build(program, flags)
+            build_log = self.cl.get_program_build_log(program, self.device)
+            if status != 0:
+                report.error("could not build program %s from source:\n%s" % (name, build_log.strip()))
+            if cache_key is not None:
+                with timing.phase("cache store"):
+                    self.cache.store(cache_key, status, build_log, self.cl.get_program_binaries(program))
+        except:
+            self.cl.release_program(program)
+            raise
+        return LoadedProgram(program, "source", build_log)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        if self.cache is not None:
+            self.cache.save_stats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -3,10 +3,13 @@
 
 
 from __future__ import print_function, absolute_import
-from ctypes import CDLL, POINTER, c_int32, c_uint32, c_uint64, c_void_p, c_char_p, c_size_t, byref, pointer, create_string_buffer, cast, sizeof
+from ctypes import CDLL, CFUNCTYPE, POINTER, c_int32, c_uint32, c_uint64, c_void_p, c_char, c_char_p, c_size_t, byref, pointer, create_string_buffer, cast, sizeof, addressof
 import sys
+import itertools
+import threading
 
 from . import report
+from . import timing
 
 
 PLATFORM_PROFILE    = 0x0900
@@ -16,7 +19,10 @@ PLATFORM_EXTENSIONS = 0x0904
 
 DEVICE_TYPE                        = 0x1000
 DEVICE_NAME                        = 0x102B
+DRIVER_VERSION                     = 0x102D
+DEVICE_VERSION                     = 0x102F
 DEVICE_EXTENSIONS                  = 0x1030
+DEVICE_PLATFORM                    = 0x1031
 DEVICE_COMPILER_AVAILABLE          = 0x1028
 DEVICE_LINKER_AVAILABLE            = 0x103E
 DEVICE_BUILT_IN_KERNELS            = 0x103F
@@ -25,6 +31,8 @@ DEVICE_GFXIP_MINOR_AMD             = 0x404B
 DEVICE_COMPUTE_CAPABILITY_MAJOR_NV = 0x4000
 DEVICE_COMPUTE_CAPABILITY_MINOR_NV = 0x4001
 
+PROGRAM_NUM_DEVICES  = 0x1162
+
 CONTEXT_DEVICES     = 0x1081
 CONTEXT_NUM_DEVICES = 0x1083
 
@@ -34,8 +42,33 @@ PROGRAM_NUM_KERNELS  = 0x1167
 PROGRAM_KERNEL_NAMES = 0x1168
 PROGRAM_IL           = 0x1169
 
+PROGRAM_BUILD_STATUS = 0x1181
 PROGRAM_BUILD_LOG    = 0x1183
 
+KERNEL_WORK_GROUP_SIZE                    = 0x11B0
+KERNEL_COMPILE_WORK_GROUP_SIZE            = 0x11B1
+KERNEL_LOCAL_MEM_SIZE                     = 0x11B2
+KERNEL_PREFERRED_WORK_GROUP_SIZE_MULTIPLE = 0x11B3
+KERNEL_PRIVATE_MEM_SIZE                   = 0x11B4
+KERNEL_SPILL_MEM_SIZE_INTEL               = 0x4109
+
+QUEUE_PROFILING_ENABLE = 0x00000002
+
+MEM_READ_WRITE     = 0x00000001
+MEM_COPY_HOST_PTR  = 0x00000020
+
+PROFILING_COMMAND_START = 0x1282
+PROFILING_COMMAND_END   = 0x1283
+
+BUILD_SUCCESS     = 0
+BUILD_NONE        = -1
+BUILD_ERROR       = -2
+BUILD_IN_PROGRESS = -3
+
+BUILD_PROGRAM_FAILURE   = -11
+COMPILE_PROGRAM_FAILURE = -15
+LINK_PROGRAM_FAILURE    = -17
+
 CONTEXT_PLATFORM            = 0x1084
 CONTEXT_OFFLINE_DEVICES_AMD = 0x403F
 
@@ -47,93 +80,167 @@ DEVICE_TYPE_CUSTOM      = 0x00000010
 DEVICE_TYPE_ALL         = 0xFFFFFFFF
 
 
+if sys.platform == "win32":
+    # CL_CALLBACK is __stdcall on Windows
+    from ctypes import WINFUNCTYPE as _CALLBACK_FUNCTYPE
+else:
+    _CALLBACK_FUNCTYPE = CFUNCTYPE
+
+# void (CL_CALLBACK *pfn_notify)(cl_program, void* user_data)
+_PROGRAM_NOTIFY_FUNCTION = _CALLBACK_FUNCTYPE(None, c_void_p, c_void_p)
+
+
+# Attribute name -> symbol name, result type, argument types, and whether the entry point may be missing
+# (clReleaseDevice, clCompileProgram and clLinkProgram appeared in OpenCL 1.2, clCreateProgramWithIL in OpenCL 2.1)
+_FUNCTIONS = {
+    # cl_int clGetPlatformIDs(cl_uint, cl_platform_id*, cl_uint*)
+    "_get_platform_ids": ("clGetPlatformIDs", c_int32,
+        [c_uint32, POINTER(c_void_p), POINTER(c_uint32)], False),
+    # cl_int clGetPlatformInfo(cl_platform_id, cl_platform_info, size_t, void*, size_t*)
+    "_get_platform_info": ("clGetPlatformInfo", c_int32,
+        [c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)], False),
+    # cl_int clGetDeviceIDs(cl_platform_id, cl_device_type, cl_uint, cl_device_id*, cl_uint*)
+    "_get_device_ids": ("clGetDeviceIDs", c_int32,
+        [c_void_p, c_uint64, c_uint32, POINTER(c_void_p), POINTER(c_uint32)], False),
+    # cl_int clGetDeviceInfo(cl_device_id, cl_device_info, size_t, void*, size_t*)
+    "_get_device_info": ("clGetDeviceInfo", c_int32,
+        [c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)], False),
+    # cl_int clReleaseDevice(cl_device_id)
+    "_release_device": ("clReleaseDevice", c_int32,
+        [c_void_p], True),
+    # cl_context clCreateContext(cl_context_properties*, cl_uint num_devices, const cl_device_id*, void (*)(const char*, const void*, size_t, void*), void*, cl_int*)
+    "_create_context": ("clCreateContext", c_void_p,
+        [POINTER(c_void_p), c_uint32, POINTER(c_void_p), c_void_p, c_void_p, POINTER(c_int32)], False),
+    # cl_context clCreateContextFromType(cl_context_properties*, cl_device_type, void (*)(const char*, const void*, size_t, void*), void*, cl_int*)
+    "_create_context_from_type": ("clCreateContextFromType", c_void_p,
+        [POINTER(c_void_p), c_uint64, c_void_p, c_void_p, POINTER(c_int32)], False),
+    # cl_int clGetContextInfo(cl_context, cl_context_info, size_t, void*, size_t)
+    "_get_context_info": ("clGetContextInfo", c_int32,
+        [c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)], False),
+    # cl_int clReleaseContext(cl_context)
+    "release_context": ("clReleaseContext", c_int32,
+        [c_void_p], False),
+    # cl_program clCreateProgramWithSource(cl_context, cl_uint, const char**, const size_t*, cl_int*)
+    "_create_program_with_source": ("clCreateProgramWithSource", c_void_p,
+        [c_void_p, c_uint32, POINTER(c_char_p), POINTER(c_size_t), POINTER(c_int32)], False),
+    # cl_program clCreateProgramWithIL(cl_context, const void*, size_t, cl_int*)
+    "_create_program_with_il": ("clCreateProgramWithIL", c_void_p,
+        [c_void_p, c_void_p, c_size_t, POINTER(c_int32)], True),
+    # cl_program clCreateProgramWithBinary(cl_context, cl_uint, const cl_device_id*, const size_t*, const unsigned char**, cl_int*, cl_int*)
+    "_create_program_with_binary": ("clCreateProgramWithBinary", c_void_p,
+        [c_void_p, c_uint32, POINTER(c_void_p), POINTER(c_size_t), POINTER(c_void_p), POINTER(c_int32), POINTER(c_int32)], False),
+    # cl_int clBuildProgram(cl_program, cl_uint, const cl_device_id*, const char*, void (*)(cl_program, void*), void*)
+    "_build_program": ("clBuildProgram", c_int32,
+        [c_void_p, c_uint32, POINTER(c_void_p), c_char_p, c_void_p, c_void_p], False),
+    # cl_int clCompileProgram(cl_program, cl_uint, const cl_device_id*, const char*, cl_uint, const cl_program*, const char**, void (*)(cl_program, void*), void*)
+    "_compile_program": ("clCompileProgram", c_int32,
+        [c_void_p, c_uint32, POINTER(c_void_p), c_char_p, c_uint32, POINTER(c_void_p), POINTER(c_char_p), c_void_p, c_void_p], True),
+    # cl_program clLinkProgram(cl_context, cl_uint, const cl_device_id*, const char*, cl_uint, const cl_program*, void (*)(cl_program, void*), void*, cl_int*)
+    "_link_program": ("clLinkProgram", c_void_p,
+        [c_void_p, c_uint32, POINTER(c_void_p), c_char_p, c_uint32, POINTER(c_void_p), c_void_p, c_void_p, POINTER(c_int32)], True),
+    # cl_int clGetProgramBuildInfo(cl_program, cl_device_id, cl_program_build_info, size_t, void*, size_t*)
+    "_get_program_build_info": ("clGetProgramBuildInfo", c_int32,
+        [c_void_p, c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)], False),
+    # cl_int clGetProgramInfo(cl_program, cl_program_info, size_t, void*, size_t*)
+    "_get_program_info": ("clGetProgramInfo", c_int32,
+        [c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)], False),
+    # cl_int clReleaseProgram(cl_program)
+    "release_program": ("clReleaseProgram", c_int32,
+        [c_void_p], False),
+    # cl_kernel clCreateKernel(cl_program, const char*, cl_int*)
+    "_create_kernel": ("clCreateKernel", c_void_p,
+        [c_void_p, c_char_p, POINTER(c_int32)], False),
+    # cl_int clGetKernelWorkGroupInfo(cl_kernel, cl_device_id, cl_kernel_work_group_info, size_t, void*, size_t*)
+    "_get_kernel_work_group_info": ("clGetKernelWorkGroupInfo", c_int32,
+        [c_void_p, c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)], False),
+    # cl_int clReleaseKernel(cl_kernel)
+    "release_kernel": ("clReleaseKernel", c_int32,
+        [c_void_p], False),
+    # cl_int clSetKernelArg(cl_kernel, cl_uint, size_t, const void*)
+    "_set_kernel_arg": ("clSetKernelArg", c_int32,
+        [c_void_p, c_uint32, c_size_t, c_void_p], False),
+    # cl_command_queue clCreateCommandQueue(cl_context, cl_device_id, cl_command_queue_properties, cl_int*)
+    "_create_command_queue": ("clCreateCommandQueue", c_void_p,
+        [c_void_p, c_void_p, c_uint64, POINTER(c_int32)], False),
+    # cl_int clReleaseCommandQueue(cl_command_queue)
+    "release_command_queue": ("clReleaseCommandQueue", c_int32,
+        [c_void_p], False),
+    # cl_mem clCreateBuffer(cl_context, cl_mem_flags, size_t, void*, cl_int*)
+    "_create_buffer": ("clCreateBuffer", c_void_p,
+        [c_void_p, c_uint64, c_size_t, c_void_p, POINTER(c_int32)], False),
+    # cl_int clReleaseMemObject(cl_mem)
+    "release_mem_object": ("clReleaseMemObject", c_int32,
+        [c_void_p], False),
+    # cl_int clEnqueueNDRangeKernel(cl_command_queue, cl_kernel, cl_uint, const size_t*, const size_t*, const size_t*, cl_uint, const cl_event*, cl_event*)
+    "_enqueue_nd_range_kernel": ("clEnqueueNDRangeKernel", c_int32,
+        [c_void_p, c_void_p, c_uint32, POINTER(c_size_t), POINTER(c_size_t), POINTER(c_size_t), c_uint32, POINTER(c_void_p), POINTER(c_void_p)], False),
+    # cl_int clWaitForEvents(cl_uint, const cl_event*)
+    "_wait_for_events": ("clWaitForEvents", c_int32,
+        [c_uint32, POINTER(c_void_p)], False),
+    # cl_int clGetEventProfilingInfo(cl_event, cl_profiling_info, size_t, void*, size_t*)
+    "_get_event_profiling_info": ("clGetEventProfilingInfo", c_int32,
+        [c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)], False),
+    # cl_int clReleaseEvent(cl_event)
+    "release_event": ("clReleaseEvent", c_int32,
+        [c_void_p], False),
+}
+
+
+def default_library_path():
+    if sys.platform == "darwin":
+        return "/Library/Frameworks/OpenCL.framework/OpenCL"
+    elif sys.platform.startswith("linux"):
+        return "libOpenCL.so"
+    elif sys.platform == "win32":
+        return "OpenCL.dll"
+    else:
+        return "OpenCL"
+
+
+def _make_device_array(devices):
+    if isinstance(devices, c_void_p):
+        devices = [devices]
+    return (c_void_p * len(devices))(*[device.value for device in devices])
+
+
+def _encode(text):
+    if sys.version_info >= (3,) and isinstance(text, str):
+        # Python 3: ctypes char pointers accept only bytes
+        return text.encode("utf8")
+    else:
+        return text
+
+
 class OpenCL:
     def __init__(self, library_path):
+        self.library_path = library_path
+        # A single ctypes callback serves all asynchronous builds: user_data selects the Python notify function
+        self._program_notify_functions = {}
+        self._program_notify_lock = threading.Lock()
+        self._program_notify_keys = itertools.count(1)
+        self._program_notify_callback = _PROGRAM_NOTIFY_FUNCTION(self._dispatch_program_notify)
         try:
             self.library = CDLL(library_path)
         except:
             report.error("failed to load OpenCL library (%s)" % library_path)
 
-        # cl_int clGetPlatformIDs(cl_uint, cl_platform_id*, cl_uint*)
-        self._get_platform_ids = self.library.clGetPlatformIDs
-        self._get_platform_ids.restype = c_int32
-        self._get_platform_ids.argtype = [c_uint32, POINTER(c_void_p), POINTER(c_uint32)]
-
-        # cl_int clGetPlatformInfo(cl_platform_id, cl_platform_info, size_t, void*, size_t*)
-        self._get_platform_info = self.library.clGetPlatformInfo
-        self._get_platform_info.restype = c_int32
-        self._get_platform_info.argtype = [c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)]
-
-        # cl_int clGetDeviceIDs(cl_platform_id, cl_device_type, cl_uint, cl_device_id*, cl_uint*)
-        self._get_device_ids = self.library.clGetDeviceIDs
-        self._get_device_ids.restype = c_int32
-        self._get_device_ids.argtype = [c_void_p, c_uint64, c_uint32, POINTER(c_void_p), POINTER(c_uint32)]
-
-        # cl_int clGetDeviceInfo(cl_device_id, cl_device_info, size_t, void*, size_t*)
-        self._get_device_info = self.library.clGetDeviceInfo
-        self._get_device_info.restype = c_int32
-        self._get_device_info.argtype = [c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)]
-
+    def __getattr__(self, name):
+        # Entry points are resolved on first use and then cached as instance attributes.
+        # Missing optional entry points are cached as None.
+        if name not in _FUNCTIONS:
+            raise AttributeError(name)
+        symbol_name, restype, argtypes, optional = _FUNCTIONS[name]
         try:
-            # cl_int clReleaseDevice(cl_device_id)
-            self._release_device = self.library.clReleaseDevice
-            self._release_device.restype = c_int32
-            self._release_device.argtype = [c_void_p]
-        except:
-            self._release_device = None
-
-        # cl_context clCreateContext(cl_context_properties*, cl_uint num_devices, const cl_device_id*, void (*)(const char*, const void*, size_t, void*), void*, cl_int*)
-        self._create_context = self.library.clCreateContext
-        self._create_context.restype = c_void_p
-        self._create_context.argtype = [POINTER(c_void_p), c_uint32, POINTER(c_void_p), c_void_p, c_void_p, POINTER(c_int32)]
-
-        # cl_context clCreateContextFromType(cl_context_properties*, cl_device_type, void (*)(const char*, const void*, size_t, void*), void*, cl_int*)
-        self._create_context_from_type = self.library.clCreateContextFromType
-        self._create_context_from_type.restype = c_void_p
-        self._create_context_from_type.argtype = [POINTER(c_void_p), c_uint64, c_void_p, c_void_p, POINTER(c_int32)]
-
-        # cl_int clGetContextInfo(cl_context, cl_context_info, size_t, void*, size_t)
-        self._get_context_info = self.library.clGetContextInfo
-        self._get_context_info.restype = c_int32
-        self._get_context_info.argtype = [c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)]
-
-        # cl_int clReleaseContext(cl_context)
-        self.release_context = self.library.clReleaseContext
-        self.release_context.restype = c_int32
-        self.release_context.argtype = [c_void_p]
-
-        # cl_program clCreateProgramWithSource(cl_context, cl_uint, const char**, const size_t*, cl_int*)
-        self._create_program_with_source = self.library.clCreateProgramWithSource
-        self._create_program_with_source.restype = c_void_p
-        self._create_program_with_source.argtype = [c_void_p, c_uint32, POINTER(c_char_p), POINTER(c_size_t), POINTER(c_int32)]
-
-        # cl_int clBuildProgram(cl_program, cl_uint, const cl_device_id*, const char*, void (*)(cl_program, void*), void*)
-        self._build_program = self.library.clBuildProgram
-        self._build_program.restype = c_int32
-        self._build_program.argtype = [c_uint32, POINTER(c_void_p), c_char_p, c_void_p, c_void_p]
-
-        try:
-            # cl_int clCompileProgram(cl_program, cl_uint, const cl_device_id*, const char*, cl_uint, const cl_program*, const char**, void (*)(cl_program, void*), void*)
-            self._compile_program = self.library.clCompileProgram
-            self._compile_program.restype = c_int32
-            self._compile_program.argtype = [c_void_p, c_uint32, POINTER(c_void_p), c_char_p, c_uint32, POINTER(c_void_p), POINTER(c_char_p), c_void_p, c_void_p]
-        except:
-            self._compile_program = None
-
-        # cl_int clGetProgramBuildInfo(cl_program, cl_device_id, cl_program_build_info, size_t, void*, size_t*)
-        self._get_program_build_info = self.library.clGetProgramBuildInfo
-        self._get_program_build_info.restype = c_int32
-        self._get_program_build_info.argtype = [c_void_p, c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)]
-
-        # cl_int clGetProgramInfo(cl_program, cl_program_info, size_t, void*, size_t*)
-        self._get_program_info = self.library.clGetProgramInfo
-        self._get_program_info.restype = c_int32
-        self._get_program_info.argtype = [c_void_p, c_uint32, c_size_t, c_void_p, POINTER(c_size_t)]
-
-        # cl_int clReleaseProgram(cl_program)
-        self.release_program = self.library.clReleaseProgram
-        self.release_program.restype = c_int32
-        self.release_program.argtype = [c_void_p]
+            function = getattr(self.library, symbol_name)
+        except AttributeError:
+            if not optional:
+                report.error("OpenCL library (%s) does not export %s" % (self.library_path, symbol_name))
+            function = None
+        else:
+            function.restype = restype
+            function.argtypes = argtypes
+        self.__dict__[name] = function
+        return function
 
     def get_platform_ids(self):
         platforms_count = c_uint32()
@@ -208,21 +315,22 @@ class OpenCL:
         if self._release_device:
             status = self._release_device(device)
             if status != 0:
-                report.Warning("could not release device object", function="clReleaseDevice", cl_status=status)
+                report.warning("could not release device object", function="clReleaseDevice", cl_status=status)
 
-    def create_context(self, context_properties, device):
+    def create_context(self, context_properties, devices):
+        devices = _make_device_array(devices)
         status = c_int32()
-        context = self._create_context(context_properties, 1, byref(device), None, None, byref(status))
+        context = self._create_context(context_properties, len(devices), devices, None, None, byref(status))
         if status.value != 0:
             report.error("could not create context", function="clCreateContext", cl_status=status.value)
-        return context
+        return c_void_p(context)
 
     def create_context_from_type(self, context_properties, device_type=DEVICE_TYPE_ALL):
         status = c_int32()
         context = self._create_context_from_type(context_properties, device_type, None, None, byref(status))
         if status.value != 0:
             report.error("could not create context", function="clCreateContextFromType", cl_status=status.value)
-        return context
+        return c_void_p(context)
 
     def get_context_devices(self, context):
         devices_count = c_uint32()
@@ -248,40 +356,228 @@ class OpenCL:
             context_properties[1] = platform
             context_properties[2] = cast(CONTEXT_OFFLINE_DEVICES_AMD, c_void_p)
             context_properties[3] = cast(1, c_void_p)
-            context = self.create_context_from_type(context_properties)
-            devices = self.get_context_devices(context)
-            self.release_context(context)
+            with timing.phase("create offline devices context"):
+                context = self.create_context_from_type(context_properties)
+                devices = self.get_context_devices(context)
+                self.release_context(context)
             return devices
         else:
             return self.get_device_ids(platform)
 
     def create_program_with_source(self, context, code):
-        code_pointer = c_char_p(code)
+        code_pointer = c_char_p(_encode(code))
         status = c_int32()
         program = self._create_program_with_source(context, 1, pointer(code_pointer), None, byref(status))
         if status.value != 0:
             report.error("could not create program", function="clCreateProgramWithSource", cl_status=status.value)
-        return program
+        return c_void_p(program)
+
+    def create_program_with_il(self, context, il):
+        if self._create_program_with_il is None:
+            report.error("OpenCL library (%s) does not support IL programs (OpenCL 2.1+ required)" % self.library_path)
+        il_buffer = (c_char * len(il)).from_buffer_copy(il)
+        status = c_int32()
+        program = self._create_program_with_il(context, cast(il_buffer, c_void_p), len(il), byref(status))
+        if status.value != 0:
+            report.error("could not create program from IL", function="clCreateProgramWithIL", cl_status=status.value)
+        return c_void_p(program)
+
+    def _dispatch_program_notify(self, program, user_data):
+        with self._program_notify_lock:
+            notify = self._program_notify_functions.pop(user_data, None)
+        if notify is not None:
+            notify()
+
+    def _register_program_notify(self, notify):
+        # Returns the pfn_notify and user_data arguments for notify function
+        if notify is None:
+            return None, None
+        with self._program_notify_lock:
+            key = next(self._program_notify_keys)
+            self._program_notify_functions[key] = notify
+        return cast(self._program_notify_callback, c_void_p), c_void_p(key)
+
+    def _check_program_notify(self, user_data, status):
+        # On failure the caller finishes the build itself: the notify function is dropped, as drivers need not call it
+        if user_data is not None and status != 0:
+            with self._program_notify_lock:
+                self._program_notify_functions.pop(user_data.value, None)
+
+    def build_program(self, program, devices, options, notify=None):
+        # With a notify function the driver may return before the build completes, and call notify() when it does
+        devices = _make_device_array(devices)
+        pfn_notify, user_data = self._register_program_notify(notify)
+        status = self._build_program(program, len(devices), devices, c_char_p(_encode(options)), pfn_notify, user_data)
+        self._check_program_notify(user_data, status)
+        return status
+
+    def create_program_with_binary(self, context, devices, binaries):
+        devices = _make_device_array(devices)
+        binary_sizes = (c_size_t * len(binaries))(*[len(binary) for binary in binaries])
+        # Immutable binaries are passed by reference and mutable ones through ctypes views: neither is copied
+        binary_arrays = [binary if isinstance(binary, bytes) else (c_char * len(binary)).from_buffer(binary) for binary in binaries]
+        binary_pointers = (c_void_p * len(binaries))(*[
+            cast(c_char_p(binary_array), c_void_p).value if isinstance(binary_array, bytes) else addressof(binary_array)
+            for binary_array in binary_arrays])
+        binary_status = (c_int32 * len(binaries))()
+        status = c_int32()
+        program = self._create_program_with_binary(context, len(devices), devices, binary_sizes, binary_pointers, binary_status, byref(status))
+        if status.value != 0:
+            report.error("could not create program from binary", function="clCreateProgramWithBinary", cl_status=status.value)
+        return c_void_p(program)
+
+    def compile_program(self, program, devices, options, input_headers=None, notify=None):
+        # input_headers is a list of (header program, include name) pairs to embed in the compilation
+        if self._compile_program is None:
+            report.error("separate compilation is not supported by the OpenCL library (OpenCL 1.2+ required)")
+        devices = _make_device_array(devices)
+        headers_count = 0
+        header_programs = None
+        header_names = None
+        if input_headers:
+            headers_count = len(input_headers)
+            header_programs = (c_void_p * headers_count)(*[header_program.value for header_program, header_name in input_headers])
+            header_names = (c_char_p * headers_count)(*[_encode(header_name) for header_program, header_name in input_headers])
+        pfn_notify, user_data = self._register_program_notify(notify)
+        status = self._compile_program(program, len(devices), devices, c_char_p(_encode(options)),
+            headers_count, header_programs, header_names, pfn_notify, user_data)
+        self._check_program_notify(user_data, status)
+        return status
+
+    def link_program(self, context, devices, options, input_programs):
+        # Returns the linked program (None if the driver could not create it) and the status of the link
+        if self._link_program is None:
+            report.error("linking is not supported by the OpenCL library (OpenCL 1.2+ required)")
+        devices = _make_device_array(devices)
+        programs = (c_void_p * len(input_programs))(*[input_program.value for input_program in input_programs])
+        status = c_int32()
+        program = self._link_program(context, len(devices), devices, c_char_p(_encode(options)),
+            len(input_programs), programs, None, None, byref(status))
+        return (None if program is None else c_void_p(program)), status.value
 
-    def build_program(self, program, device, options):
-        return self._build_program(program, 1, byref(device), c_char_p(options), None, None)
+    def get_program_binary_sizes(self, program):
+        devices_count = c_uint32()
+        status = self._get_program_info(program, PROGRAM_NUM_DEVICES, sizeof(devices_count), byref(devices_count), None)
+        if status != 0:
+            report.error("could not get the number of devices in a program", function="clGetProgramInfo", cl_status=status)
 
-    def compile_program(self, program, device, options):
-        return self._compile_program(program, 1, byref(device), c_char_p(options), 0, None, None, None, None)
+        binary_sizes = (c_size_t * devices_count.value)()
+        status = self._get_program_info(program, PROGRAM_BINARY_SIZES, sizeof(binary_sizes), binary_sizes, None)
+        if status != 0:
+            report.error("could not get program binary sizes", function="clGetProgramInfo", cl_status=status)
+        return list(binary_sizes)
+
+    def get_program_binaries(self, program, buffers=None):
+        # The driver writes binaries straight into the buffers, without intermediate copies: bytearrays allocated here,
+        # or writable buffers (e.g. mmap of output files) supplied by the caller, sized per get_program_binary_sizes.
+        # Binaries of devices with None in place of the buffer are skipped.
+        binary_sizes = self.get_program_binary_sizes(program)
+        if buffers is None:
+            buffers = [bytearray(binary_size) for binary_size in binary_sizes]
+        elif len(buffers) != len(binary_sizes) or \
+                any(buffer is not None and len(buffer) < binary_size for buffer, binary_size in zip(buffers, binary_sizes)):
+            report.error("program binary buffers do not match program binaries")
+
+        # Binaries are returned in the order of program devices, which is the order of devices in the context
+        buffer_arrays = [(c_char * len(buffer)).from_buffer(buffer) if buffer else None for buffer in buffers]
+        binary_pointers = (c_void_p * len(buffers))(*[None if buffer_array is None else addressof(buffer_array) for buffer_array in buffer_arrays])
+        status = self._get_program_info(program, PROGRAM_BINARIES, sizeof(binary_pointers), binary_pointers, None)
+        # ctypes views lock the buffers against resizing and closing
+        del buffer_arrays
+        if status != 0:
+            report.error("could not get program binaries", function="clGetProgramInfo", cl_status=status)
+        return buffers
 
     def get_program_binary(self, program):
-        binary_size = c_size_t()
-        status = self._get_program_info(program, PROGRAM_BINARY_SIZES, sizeof(binary_size), byref(binary_size), None)
+        return self.get_program_binaries(program)[0]
+
+    def get_program_kernel_names(self, program):
+        kernels_count = c_size_t()
+        status = self._get_program_info(program, PROGRAM_NUM_KERNELS, sizeof(kernels_count), byref(kernels_count), None)
+        if status != 0:
+            report.error("could not get the number of kernels in a program", function="clGetProgramInfo", cl_status=status)
+        if kernels_count.value == 0:
+            return []
+
+        names_size = c_size_t()
+        status = self._get_program_info(program, PROGRAM_KERNEL_NAMES, 0, None, byref(names_size))
+        if status == 0:
+            names = create_string_buffer(names_size.value + 1)
+            status = self._get_program_info(program, PROGRAM_KERNEL_NAMES, names_size.value, names, None)
+        if status != 0:
+            report.error("could not get kernel names", function="clGetProgramInfo", cl_status=status)
+        names = names.value.decode("ascii") if sys.version_info >= (3,) else names.value
+        return names.split(";")
+
+    def create_kernel(self, program, kernel_name):
+        status = c_int32()
+        kernel = self._create_kernel(program, _encode(kernel_name), byref(status))
+        if status.value != 0:
+            report.error("could not create kernel %s" % kernel_name, function="clCreateKernel", cl_status=status.value)
+        return c_void_p(kernel)
+
+    def get_kernel_work_group_info(self, kernel, device, info_id, info_type):
+        # info_type is a ctypes scalar type, or an array type for array-valued queries (returned as a list)
+        info = info_type()
+        status = self._get_kernel_work_group_info(kernel, device, info_id, sizeof(info_type), byref(info), None)
         if status != 0:
-            report.error("could not get program binary size", function="clGetProgramInfo", cl_status=status)
+            report.error("could not get kernel work-group info", function="clGetKernelWorkGroupInfo", cl_status=status)
+        return info.value if hasattr(info, "value") else list(info)
 
-        binary = create_string_buffer(binary_size.value)
-        binary_pointer = cast(binary, c_void_p)
-        status = self._get_program_info(program, PROGRAM_BINARIES, sizeof(binary_pointer), byref(binary_pointer), None)
+    def set_kernel_arg(self, kernel, arg_index, arg_size, arg_value):
+        # arg_value is a ctypes object passed by reference, or None for local memory arguments
+        status = self._set_kernel_arg(kernel, arg_index, arg_size, None if arg_value is None else byref(arg_value))
         if status != 0:
-            report.error("could not get program binary", function="clGetProgramInfo", cl_status=status)
+            report.error("could not set kernel argument %d" % arg_index, function="clSetKernelArg", cl_status=status)
 
-        return bytearray(binary.raw)
+    def create_command_queue(self, context, device, properties=0):
+        status = c_int32()
+        queue = self._create_command_queue(context, device, properties, byref(status))
+        if status.value != 0:
+            report.error("could not create command queue", function="clCreateCommandQueue", cl_status=status.value)
+        return c_void_p(queue)
+
+    def create_buffer(self, context, flags, size, host_data=None):
+        # host_data, if specified, is a writable buffer of size bytes, e.g. a bytearray
+        host_pointer = None
+        if host_data is not None:
+            host_pointer = addressof((c_char * size).from_buffer(host_data))
+        status = c_int32()
+        buffer = self._create_buffer(context, flags, size, host_pointer, byref(status))
+        if status.value != 0:
+            report.error("could not create buffer of %d bytes" % size, function="clCreateBuffer", cl_status=status.value)
+        return c_void_p(buffer)
+
+    def enqueue_nd_range_kernel(self, queue, kernel, global_size, local_size=None):
+        # Returns the event of the kernel launch; the caller releases it
+        work_dim = len(global_size)
+        global_work_size = (c_size_t * work_dim)(*global_size)
+        local_work_size = None if local_size is None else (c_size_t * work_dim)(*local_size)
+        event = c_void_p()
+        status = self._enqueue_nd_range_kernel(queue, kernel, work_dim, None, global_work_size, local_work_size, 0, None, byref(event))
+        if status != 0:
+            report.error("could not launch kernel", function="clEnqueueNDRangeKernel", cl_status=status)
+        return event
+
+    def wait_for_event(self, event):
+        status = self._wait_for_events(1, byref(event))
+        if status != 0:
+            report.error("kernel execution failed", function="clWaitForEvents", cl_status=status)
+
+    def get_event_profiling_info(self, event, info_id):
+        # Device timestamp in nanoseconds
+        timestamp = c_uint64()
+        status = self._get_event_profiling_info(event, info_id, sizeof(timestamp), byref(timestamp), None)
+        if status != 0:
+            report.error("could not get event profiling info", function="clGetEventProfilingInfo", cl_status=status)
+        return timestamp.value
+
+    def get_program_build_status(self, program, device):
+        build_status = c_int32()
+        status = self._get_program_build_info(program, device, PROGRAM_BUILD_STATUS, sizeof(build_status), byref(build_status), None)
+        if status != 0:
+            report.error("could not get program build status", function="clGetProgramBuildInfo", cl_status=status)
+        return build_status.value
 
     def get_program_build_log(self, program, device):
         log_size = c_size_t()
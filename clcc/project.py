@@ -0,0 +1,249 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import sys
+import json
+import time
+import threading
+import collections
+
+from .clcc import select_platform, parse_device_ids, select_target, get_build_flags, build_source
+from .frontend import get_output_filename, read_source, create_thread_pool
+from .cache import get_build_key, get_prebuilt_key, write_stamps, write_file_atomic
+from .includes import scan_includes, HeaderCache
+from .inventory import get_device_fingerprint
+from . import report
+from . import timing
+
+
+DEFAULT_STATE_FILENAME = ".clcc-state.json"
+
+# Bump when the layout of the state file changes to rebuild all outputs
+STATE_FORMAT_VERSION = 1
+
+_STANDARDS = ["1.0", "1.1", "1.2", "2.0", "2.1"]
+
+# Settings of a kernel, which default to the top-level settings of the manifest
+_KERNEL_SETTINGS = ["output", "flags", "platform", "devices", "include", "std"]
+
+ProjectKernel = collections.namedtuple("ProjectKernel", ["source", "output", "flags", "platform", "devices", "include", "std"])
+
+# A build of one kernel for devices with the same fingerprint, on the target of the first of them
+ProjectJob = collections.namedtuple("ProjectJob", ["kernel", "target", "device_ids", "output_filenames", "clflags"])
+
+
+def _load_toml(manifest_file, manifest_filename):
+    try:
+        import tomllib as toml_module
+    except ImportError:
+        try:
+            import tomli as toml_module
+        except ImportError:
+            report.error("TOML manifests require Python 3.11 or tomli (pip install tomli)")
+    try:
+        return toml_module.load(manifest_file)
+    except toml_module.TOMLDecodeError as e:
+        report.error("invalid project manifest %s: %s" % (manifest_filename, e))
+
+
+def load_manifest(manifest_filename):
+    # Returns the kernels of a manifest: a JSON object, or a TOML table, with a "kernels" list of source paths or of
+    # objects with a "source" path and any of the settings which the top level specifies for all kernels.
+    # Paths are relative to the directory of the manifest. Include paths are made absolute, as they are part of the build
+    # flags and so of the build keys, which must not depend on the working directory.
+    with open(manifest_filename, "rb") as manifest_file:
+        if manifest_filename.endswith(".toml"):
+            manifest = _load_toml(manifest_file, manifest_filename)
+        else:
+            try:
+                manifest = json.loads(manifest_file.read().decode("utf8"))
+            except ValueError as e:
+                report.error("invalid project manifest %s: %s" % (manifest_filename, e))
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("kernels"), list):
+        report.error("invalid project manifest %s: object with a list of kernels required" % manifest_filename)
+    for key in manifest:
+        if key not in _KERNEL_SETTINGS + ["kernels", "state"]:
+            report.error("invalid project manifest %s: unknown setting %s" % (manifest_filename, key))
+
+    manifest_dirname = os.path.dirname(manifest_filename)
+    kernels = []
+    for kernel_spec in manifest["kernels"]:
+        if not isinstance(kernel_spec, dict):
+            kernel_spec = {"source": kernel_spec}
+        for key in kernel_spec:
+            if key not in _KERNEL_SETTINGS + ["source"]:
+                report.error("invalid project manifest %s: unknown kernel setting %s" % (manifest_filename, key))
+        if not kernel_spec.get("source"):
+            report.error("invalid project manifest %s: kernel without a source" % manifest_filename)
+        settings = dict((key, kernel_spec.get(key, manifest.get(key))) for key in _KERNEL_SETTINGS)
+        include_paths = settings["include"] or []
+        if not isinstance(include_paths, list):
+            include_paths = [include_paths]
+        standard = None if settings["std"] is None else str(settings["std"])
+        if standard is not None and standard not in _STANDARDS:
+            report.error("invalid project manifest %s: std %s of %s is not one of %s" %
+                         (manifest_filename, standard, kernel_spec["source"], ", ".join(_STANDARDS)))
+        kernels.append(ProjectKernel(
+            source=os.path.join(manifest_dirname, kernel_spec["source"]),
+            output=None if settings["output"] is None else os.path.join(manifest_dirname, settings["output"]),
+            flags=settings["flags"] or "",
+            platform=None if settings["platform"] is None else str(settings["platform"]),
+            devices="1" if settings["devices"] is None else str(settings["devices"]),
+            include=[os.path.abspath(os.path.join(manifest_dirname, include_path)) for include_path in include_paths],
+            std=standard))
+    state_filename = os.path.join(manifest_dirname, manifest.get("state", DEFAULT_STATE_FILENAME))
+    return kernels, state_filename
+
+
+class ProjectState:
+    # Build keys of the outputs of the last build: an output is up to date if it exists and its key is the same.
+    # Keys hash the source, the included headers, the build flags and the compiler identity, as for cache entries.
+    def __init__(self, path):
+        self.path = path
+        self._outputs = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as state_file:
+                state = json.load(state_file)
+            if state.get("version") == STATE_FORMAT_VERSION:
+                self._outputs = state["outputs"]
+        except (EnvironmentError, ValueError, KeyError, AttributeError):
+            pass
+
+    def _get_output_key(self, output_filename):
+        # Outputs are recorded relative to the state file, so that the state does not depend on the working directory
+        return os.path.relpath(output_filename, os.path.dirname(self.path) or ".").replace(os.sep, "/")
+
+    def is_current(self, output_filename, build_key):
+        with self._lock:
+            record = self._outputs.get(self._get_output_key(output_filename))
+        if record is None or record["key"] != build_key:
+            return False
+        try:
+            return os.path.getsize(output_filename) == record["size"]
+        except EnvironmentError:
+            return False
+
+    def record(self, output_filename, build_key):
+        # build_key of None marks an output which must be rebuilt
+        with self._lock:
+            if build_key is None:
+                self._outputs.pop(self._get_output_key(output_filename), None)
+            else:
+                self._outputs[self._get_output_key(output_filename)] = {"key": build_key, "size": os.path.getsize(output_filename)}
+
+    def save(self, output_filenames):
+        # Outputs which are no longer in the manifest are forgotten
+        output_keys = set(map(self._get_output_key, output_filenames))
+        with self._lock:
+            outputs = dict((output_key, record) for output_key, record in self._outputs.items() if output_key in output_keys)
+        state = {"version": STATE_FORMAT_VERSION, "outputs": outputs}
+        write_file_atomic(self.path, json.dumps(state, indent=1, sort_keys=True).encode("utf8"))
+
+
+def _format_devices(device_ids):
+    return "device%s #%s" % ("s" if len(device_ids) > 1 else "", ", #".join(map(str, device_ids)))
+
+
+def _create_jobs(cl, kernels, inventory, debug_build):
+    # Every kernel is built separately for each of its devices, with one target per device shared by all kernels.
+    # Devices with the same fingerprint get the same binary, so a kernel is built once for them and the binary is
+    # copied to the outputs of all of them.
+    targets = {}
+    jobs = []
+    for kernel in kernels:
+        platform_index = select_platform(inventory, kernel.platform)
+        platform_devices = inventory[platform_index]["devices"]
+        device_ids = parse_device_ids(kernel.devices, len(platform_devices))
+        device_groups = collections.OrderedDict()
+        for device_id in device_ids:
+            device_groups.setdefault(get_device_fingerprint(platform_devices[device_id - 1]), []).append(device_id)
+        for group_device_ids in device_groups.values():
+            target = targets.get((platform_index, group_device_ids[0]))
+            if target is None:
+                target = select_target(cl, str(platform_index + 1), str(group_device_ids[0]), inventory)
+                targets[(platform_index, group_device_ids[0])] = target
+            output_filenames = [get_output_filename(kernel.output, kernel.source, "build", False, device_id, len(device_ids) > 1)
+                for device_id in group_device_ids]
+            clflags = " ".join(filter(None, [get_build_flags(target, kernel.include, debug_build, kernel.std), kernel.flags]))
+            jobs.append(ProjectJob(kernel, target, group_device_ids, output_filenames, clflags))
+    output_filenames = [output_filename for job in jobs for output_filename in job.output_filenames]
+    for output_filename in output_filenames:
+        if output_filenames.count(output_filename) > 1:
+            report.error("several kernel builds write output %s (use a {name} or {device} output pattern)" % output_filename)
+    return jobs, list(targets.values())
+
+
+def _write_output(output_filename, binary):
+    output_dirname = os.path.dirname(output_filename)
+    if output_dirname and not os.path.isdir(output_dirname):
+        try:
+            os.makedirs(output_dirname)
+        except OSError:
+            # Another job created it
+            if not os.path.isdir(output_dirname):
+                raise
+    write_file_atomic(output_filename, memoryview(binary))
+
+
+def build_project(cl, manifest_filename, jobs, debug_build=False, cache=None, inventory=None, rebuild=False):
+    # Builds the outputs of a manifest which are missing or stale, on a pool of jobs threads across all devices
+    kernels, state_filename = load_manifest(manifest_filename)
+    project_jobs, targets = _create_jobs(cl, kernels, inventory, debug_build)
+    state = ProjectState(state_filename)
+    header_cache = HeaderCache()
+
+    def build_job(job):
+        start_time = time.time()
+        # Headers included with quotes are found relative to the source: its absolute path keeps their paths absolute
+        source_path = os.path.abspath(job.kernel.source)
+        try:
+            with timing.phase("read source"):
+                source_code = read_source(source_path)
+            with timing.phase("scan includes"):
+                header_paths = scan_includes(source_path, source_code, job.kernel.include, header_cache)
+            build_key = get_build_key(job.target, "build", source_code, header_paths, job.clflags, header_cache)
+            if not rebuild and all(state.is_current(output_filename, build_key) for output_filename in job.output_filenames):
+                return job, None, None, time.time() - start_time
+            for output_filename in job.output_filenames:
+                state.record(output_filename, None)
+            status, build_log, binaries = build_source(job.target, "build", source_path, source_code, job.kernel.include, job.clflags,
+                cache, header_paths, header_cache)
+            if status == 0 and binaries is not None:
+                with timing.phase("write output"):
+                    for output_filename in job.output_filenames:
+                        _write_output(output_filename, binaries[0])
+                    write_stamps(job.output_filenames, get_prebuilt_key(source_code, header_paths, job.clflags, header_cache))
+                    for output_filename in job.output_filenames:
+                        state.record(output_filename, build_key)
+        except (EnvironmentError, report.Error) as e:
+            status, build_log = -1, str(e)
+        return job, status, build_log, time.time() - start_time
+
+    pool = create_thread_pool(jobs)
+    built, up_to_date, failures = 0, 0, 0
+    try:
+        for job, status, build_log, elapsed in pool.imap_unordered(build_job, project_jobs):
+            if status is None:
+                up_to_date += len(job.output_filenames)
+                continue
+            if build_log:
+                print("%s (%s):\n%s" % (job.kernel.source, _format_devices(job.device_ids), build_log))
+            if status == 0:
+                built += len(job.output_filenames)
+                print("OK    %s -> %s (%.3f s)" % (job.kernel.source, ", ".join(job.output_filenames), elapsed))
+            else:
+                failures += len(job.output_filenames)
+                print("FAIL  %s (%s, %.3f s)" % (job.kernel.source, _format_devices(job.device_ids), elapsed))
+            sys.stdout.flush()
+    finally:
+        pool.close()
+        pool.join()
+        state.save(set(output_filename for job in project_jobs for output_filename in job.output_filenames))
+        for target in targets:
+            target.release()
+    print("%d outputs built, %d up to date, %d failed" % (built, up_to_date, failures))
+    return 0 if failures == 0 else 1
@@ -0,0 +1,159 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import socket
+import threading
+
+from .clcc import select_platform, parse_device_ids
+from .includes import scan_includes
+from .server import PROTOCOL_VERSION, send_message, receive_message, parse_builder_address
+from . import report
+
+
+def create_bundle(input_filename, source_code, include_paths, header_cache=None):
+    # Returns the request fields and the payload chunks which carry a source and all headers it includes to a builder
+    header_paths = scan_includes(input_filename, source_code, include_paths, header_cache)
+    payload = [source_code.encode("utf8")]
+    files = []
+    for header_path in header_paths:
+        with open(header_path, "rb") as header_file:
+            header_data = header_file.read()
+        files.append((os.path.abspath(header_path), len(header_data)))
+        payload.append(header_data)
+    request = {
+        "input": os.path.abspath(input_filename),
+        "include": [os.path.abspath(include_path) for include_path in include_paths or []],
+        "cwd": os.getcwd(),
+        "files": files,
+        "source_size": len(payload[0])
+    }
+    return request, payload
+
+
+def _get_bundle_path(bundle_dirname, path):
+    # Files are laid out under the bundle directory by their absolute paths on the client
+    relative_path = os.path.splitdrive(path)[1].replace("\\", "/").lstrip("/")
+    bundle_path = os.path.normpath(os.path.join(bundle_dirname, relative_path))
+    if not bundle_path.startswith(os.path.join(bundle_dirname, "")):
+        report.error("invalid path %s in bundle" % path)
+    return bundle_path
+
+
+def extract_bundle(bundle_dirname, input_filename, source_code, include_paths, files, cwd=None):
+    # Writes the files of a bundle and returns the input file name and the include paths to build it with.
+    # As the files keep their paths relative to each other, quoted includes resolve as on the client; the working
+    # directory of the client, which drivers search for quoted includes, is appended to the include paths.
+    bundle_input_filename = _get_bundle_path(bundle_dirname, input_filename)
+    for file_path, file_data in [(input_filename, source_code.encode("utf8"))] + list(files):
+        bundle_path = _get_bundle_path(bundle_dirname, file_path)
+        if not os.path.isdir(os.path.dirname(bundle_path)):
+            os.makedirs(os.path.dirname(bundle_path))
+        with open(bundle_path, "wb") as bundle_file:
+            bundle_file.write(file_data)
+    bundle_include_paths = [_get_bundle_path(bundle_dirname, include_path) for include_path in include_paths or []]
+    if cwd is not None:
+        bundle_include_paths.append(_get_bundle_path(bundle_dirname, cwd))
+    return bundle_input_filename, bundle_include_paths
+
+
+class _Builder:
+    def __init__(self, name, address, device_ids):
+        self.name = name
+        self.address = address
+        self.device_ids = device_ids
+        self.pending = 0
+        self.available = True
+
+
+def _send_request(address, request, payload=None, connect_timeout=None):
+    sock = socket.create_connection(address, connect_timeout)
+    try:
+        sock.settimeout(None)
+        request = dict(request)
+        request["version"] = PROTOCOL_VERSION
+        send_message(sock, request, payload)
+        return receive_message(sock)
+    finally:
+        sock.close()
+
+
+class BuilderPool:
+    # Builders (clcc --server --listen) which have the target platform and devices. Each build goes to the builder
+    # with the fewest builds in flight; a builder which can not be reached is dropped and the build is sent to another.
+    def __init__(self, addresses, target_platform, target_devices, connect_timeout=5.0):
+        self.connect_timeout = connect_timeout
+        self.builders = []
+        self._lock = threading.Lock()
+        for builder_name in addresses:
+            try:
+                address = parse_builder_address(builder_name)
+            except ValueError as e:
+                report.error(str(e))
+            try:
+                response, _ = _send_request(address, {"type": "describe"}, connect_timeout=connect_timeout)
+            except (EnvironmentError, EOFError, ValueError) as e:
+                report.warning("builder %s is not available: %s" % (builder_name, e))
+                continue
+            if "error" in response:
+                report.warning("builder %s is not available: %s" % (builder_name, response["error"]))
+                continue
+            device_ids = self._get_target_device_ids(response["platforms"], target_platform, target_devices)
+            if device_ids is not None:
+                self.builders.append(_Builder(builder_name, address, device_ids))
+        if not self.builders:
+            report.error("no builder has platform %s and device %s" % (target_platform or "(default)", target_devices))
+
+    @staticmethod
+    def _get_target_device_ids(platforms, target_platform, target_devices):
+        # Device numbers of the target on a builder, as the builder would select them; None if it has no such target
+        try:
+            platform_index = select_platform(platforms, target_platform)
+            return parse_device_ids(target_devices, len(platforms[platform_index]["devices"]))
+        except report.Error:
+            return None
+
+    def _acquire(self, excluded):
+        with self._lock:
+            candidates = [builder for builder in self.builders if builder.available and builder not in excluded]
+            if not candidates:
+                return None
+            builder = min(candidates, key=lambda candidate: candidate.pending)
+            builder.pending += 1
+            return builder
+
+    def _release(self, builder, available=True):
+        with self._lock:
+            builder.pending -= 1
+            builder.available = builder.available and available
+
+    def build(self, request, payload):
+        # Returns (status, build log, binaries, device ids, prebuilt key) of the build on one of the builders
+        tried = []
+        failure = None
+        while True:
+            builder = self._acquire(tried)
+            if builder is None:
+                return -1, "no builder could build the program: %s" % failure, None, self.builders[0].device_ids, None
+            tried.append(builder)
+            try:
+                response, response_payload = _send_request(builder.address, request, payload, self.connect_timeout)
+            except (EnvironmentError, EOFError) as e:
+                self._release(builder, available=False)
+                failure = "builder %s failed: %s" % (builder.name, e)
+                report.warning(failure)
+                continue
+            self._release(builder)
+            if "error" in response:
+                return -1, "builder %s: %s" % (builder.name, response["error"]), None, builder.device_ids, None
+
+            binaries = None
+            if response["binary_sizes"] is not None:
+                binaries, offset = [], 0
+                payload_view = memoryview(response_payload)
+                for binary_size in response["binary_sizes"]:
+                    binaries.append(payload_view[offset:offset + binary_size])
+                    offset += binary_size
+            return response["status"], response["log"], binaries, response["device_ids"], response.get("prebuilt_key")
@@ -6,20 +6,36 @@ from __future__ import print_function, absolute_import
 import sys
 
 
-def message(text, function=None, cl_status=None):
+class Error(Exception):
+    # Raised by report.error: the command-line tool prints the message and exits, library users catch it
+    def __init__(self, text, function=None, cl_status=None):
+        super(Error, self).__init__(format_message(text, function, cl_status))
+        self.text = text
+        self.function = function
+        self.cl_status = cl_status
+
+
+def format_message(text, function=None, cl_status=None):
     if function is None:
-        print(message, file=sys.stderr)
+        return text
+    elif cl_status is None:
+        return "%s: %s failed" % (text, function)
     else:
-        if cl_status is None:
-            print("%s: %s failed" % (message, function), file=sys.stderr)
-        else:
-            print("%s: %s failed with error code %d" % (message, function, cl_status), file=sys.stderr)
+        return "%s: %s failed with error code %d" % (text, function, cl_status)
 
 
-def error(message, function=None, cl_status=None):
-    message("Error: " + message, function, cl_status)
-    sys.exit(1)
+def message(text, function=None, cl_status=None):
+    print(format_message(text, function, cl_status), file=sys.stderr)
 
 
-def warning(message, function=None, cl_status=None):
-    message("Warning: " + message, function, cl_status)
+def error(text, function=None, cl_status=None):
+    raise Error(text, function, cl_status)
+
+
+def warning(text, function=None, cl_status=None):
+    message("Warning: " + text, function, cl_status)
+
+
+def exit_with_error(e):
+    message("Error: " + str(e))
+    sys.exit(1)
@@ -0,0 +1,129 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import re
+import json
+import threading
+import collections
+from ctypes import c_size_t, c_uint64
+
+from .opencl import KERNEL_WORK_GROUP_SIZE as CL_KERNEL_WORK_GROUP_SIZE, \
+    KERNEL_COMPILE_WORK_GROUP_SIZE as CL_KERNEL_COMPILE_WORK_GROUP_SIZE, \
+    KERNEL_LOCAL_MEM_SIZE as CL_KERNEL_LOCAL_MEM_SIZE, \
+    KERNEL_PREFERRED_WORK_GROUP_SIZE_MULTIPLE as CL_KERNEL_PREFERRED_WORK_GROUP_SIZE_MULTIPLE, \
+    KERNEL_PRIVATE_MEM_SIZE as CL_KERNEL_PRIVATE_MEM_SIZE, \
+    KERNEL_SPILL_MEM_SIZE_INTEL as CL_KERNEL_SPILL_MEM_SIZE_INTEL
+from . import report
+
+
+# Vendor-specific fields (spill_mem_size on Intel; registers, spill_stores and spill_loads on nVidia) are None elsewhere
+KernelResources = collections.namedtuple("KernelResources", [
+    "device_id", "device_name", "kernel", "work_group_size", "work_group_size_multiple", "compile_work_group_size",
+    "local_mem_size", "private_mem_size", "spill_mem_size", "registers", "spill_stores", "spill_loads"])
+
+
+def parse_nv_verbose_log(build_log):
+    # With -cl-nv-verbose, the build log has the ptxas report of each kernel:
+    #   ptxas info    : Compiling entry function 'name' for 'sm_52'
+    #   ptxas info    : Function properties for name
+    #       0 bytes stack frame, 8 bytes spill stores, 8 bytes spill loads
+    #   ptxas info    : Used 32 registers, 344 bytes cmem[0]
+    kernels = {}
+    kernel_info = None
+    for line in build_log.splitlines():
+        entry_match = re.search(r"Compiling entry function '(\w+)'", line)
+        if entry_match is not None:
+            kernel_info = kernels.setdefault(entry_match.group(1), {})
+        elif kernel_info is not None:
+            spill_match = re.search(r"(\d+) bytes spill stores, (\d+) bytes spill loads", line)
+            if spill_match is not None:
+                kernel_info["spill_stores"], kernel_info["spill_loads"] = map(int, spill_match.groups())
+            registers_match = re.search(r"Used (\d+) registers", line)
+            if registers_match is not None:
+                kernel_info["registers"] = int(registers_match.group(1))
+    return kernels
+
+
+def get_kernel_resources(target, program):
+    # Creates every kernel of a built program and queries its work-group info on each device of the target
+    cl = target.cl
+    kernel_names = cl.get_program_kernel_names(program)
+    device_names = target.device_names
+    kernels = []
+    for device_id, device_name, device in zip(target.device_ids, device_names, target.devices):
+        nv_kernels = {}
+        if target.platform_name == "NVIDIA CUDA":
+            nv_kernels = parse_nv_verbose_log(cl.get_program_build_log(program, device))
+        for kernel_name in kernel_names:
+            kernel = cl.create_kernel(program, kernel_name)
+            try:
+                spill_mem_size = None
+                if target.platform_name in ["Intel(R) OpenCL", "Intel Gen OCL Driver"]:
+                    try:
+                        spill_mem_size = cl.get_kernel_work_group_info(kernel, device, CL_KERNEL_SPILL_MEM_SIZE_INTEL, c_uint64)
+                    except report.Error:
+                        # The spill memory query of cl_intel_device_attribute_query is not supported by all Intel drivers
+                        pass
+                nv_kernel = nv_kernels.get(kernel_name, {})
+                kernels.append(KernelResources(device_id, device_name, kernel_name,
+                    cl.get_kernel_work_group_info(kernel, device, CL_KERNEL_WORK_GROUP_SIZE, c_size_t),
+                    cl.get_kernel_work_group_info(kernel, device, CL_KERNEL_PREFERRED_WORK_GROUP_SIZE_MULTIPLE, c_size_t),
+                    cl.get_kernel_work_group_info(kernel, device, CL_KERNEL_COMPILE_WORK_GROUP_SIZE, c_size_t * 3),
+                    cl.get_kernel_work_group_info(kernel, device, CL_KERNEL_LOCAL_MEM_SIZE, c_uint64),
+                    cl.get_kernel_work_group_info(kernel, device, CL_KERNEL_PRIVATE_MEM_SIZE, c_uint64),
+                    spill_mem_size, nv_kernel.get("registers"), nv_kernel.get("spill_stores"), nv_kernel.get("spill_loads")))
+            finally:
+                cl.release_kernel(kernel)
+    return kernels
+
+
+class ResourceReport:
+    # Collects kernel resources of all builds and prints them as a table or writes them as JSON
+    def __init__(self, json_filename=None):
+        self.json_filename = json_filename
+        self._programs = []
+        self._lock = threading.Lock()
+
+    def get_build_flags(self, target, clflags):
+        # The nVidia compiler reports registers and spills only in a verbose build log
+        if target.platform_name == "NVIDIA CUDA":
+            return " ".join(filter(None, [clflags, "-cl-nv-verbose"]))
+        return clflags
+
+    def get_inspector(self, target, name):
+        # Callback for Target.build which adds the kernels of the built program to the report
+        return lambda program: self.add(name, get_kernel_resources(target, program))
+
+    def add(self, name, kernels):
+        with self._lock:
+            self._programs.append((name, kernels))
+
+    def reset(self):
+        # Starts a new report, e.g. for the next rebuild in watch mode
+        with self._lock:
+            self._programs = []
+
+    def write(self):
+        programs = sorted(self._programs, key=lambda program: program[0])
+        if self.json_filename is not None:
+            report_data = [collections.OrderedDict([("file", name)] + list(kernel._asdict().items()))
+                for name, kernels in programs for kernel in kernels]
+            with open(self.json_filename, "w") as json_file:
+                json.dump(report_data, json_file, indent=2)
+            return
+
+        def format_size(size):
+            return "-" if size is None else str(size)
+
+        print("%-24s %-16s %-24s %8s %8s %10s %12s %10s %12s" %
+              ("File", "Device", "Kernel", "WG size", "WG mult", "Local (B)", "Private (B)", "Registers", "Spills (B)"))
+        for name, kernels in programs:
+            for kernel in kernels:
+                spills = kernel.spill_mem_size
+                if kernel.spill_stores is not None:
+                    spills = kernel.spill_stores + kernel.spill_loads
+                print("%-24s %-16s %-24s %8d %8d %10d %12d %10s %12s" % (name, "#%d %s" % (kernel.device_id, kernel.device_name),
+                    kernel.kernel, kernel.work_group_size, kernel.work_group_size_multiple, kernel.local_mem_size,
+                    kernel.private_mem_size, format_size(kernel.registers), format_size(spills)))
@@ -0,0 +1,219 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import json
+import socket
+import struct
+try:
+    import socketserver
+except ImportError:
+    # Python 2
+    import SocketServer as socketserver
+
+from .spirv import SpirvModule
+
+
+PROTOCOL_VERSION = 3
+
+# TCP port of builders (clcc --server --listen) if the address does not specify one
+DEFAULT_BUILDER_PORT = 3637
+
+# Each message is a little-endian 64-bit length of the JSON header, the JSON header, and the optional payload.
+# The header specifies the payload size (or null if there is no payload).
+_message_length = struct.Struct("<Q")
+
+
+def default_socket_path():
+    socket_path = os.environ.get("CLCC_SERVER_SOCKET")
+    if socket_path:
+        return socket_path
+    import tempfile
+    runtime_dirname = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime_dirname, "clcc-%d.sock" % os.getuid())
+
+
+def parse_builder_address(address):
+    # HOST, HOST:PORT, or [IPV6-HOST]:PORT; raises ValueError if the port is not a number
+    if address.startswith("["):
+        host, _, port = address[1:].partition("]")
+        port = port[1:]
+    elif address.count(":") == 1:
+        host, port = address.split(":")
+    else:
+        host, port = address, ""
+    if not port:
+        return host, DEFAULT_BUILDER_PORT
+    try:
+        return host, int(port)
+    except ValueError:
+        raise ValueError("invalid builder address %s: port must be a number" % address)
+
+
+def send_message(sock, header, payload=None):
+    # The payload is a bytes-like object or a list of them, sent one after another without concatenation
+    payload_chunks = None
+    if payload is not None:
+        payload_chunks = payload if isinstance(payload, list) else [payload]
+    header = dict(header)
+    header["payload_size"] = None if payload_chunks is None else sum(len(chunk) for chunk in payload_chunks)
+    header_data = json.dumps(header).encode("utf8")
+    sock.sendall(_message_length.pack(len(header_data)) + header_data)
+    for chunk in payload_chunks or []:
+        sock.sendall(chunk)
+
+
+def _receive_exactly(sock, size):
+    chunks = []
+    while size != 0:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise EOFError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _receive_payload(sock, size):
+    # Received straight into one preallocated buffer: large binaries are not assembled from chunks
+    payload = bytearray(size)
+    payload_view = memoryview(payload)
+    offset = 0
+    while offset != size:
+        received = sock.recv_into(payload_view[offset:], min(size - offset, 1024 * 1024))
+        if received == 0:
+            raise EOFError("connection closed")
+        offset += received
+    return payload
+
+
+def receive_message(sock):
+    header_size, = _message_length.unpack(_receive_exactly(sock, _message_length.size))
+    header = json.loads(_receive_exactly(sock, header_size).decode("utf8"))
+    payload = None
+    if header.get("payload_size") is not None:
+        payload = _receive_payload(sock, header["payload_size"])
+    return header, payload
+
+
+def _decode_source(source_data, il):
+    # SPIR-V modules are sent as is, sources as UTF-8 text
+    source_data = memoryview(source_data).tobytes()
+    return SpirvModule(source_data) if il else source_data.decode("utf8")
+
+
+class _CompileRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request, payload = receive_message(self.request)
+            except (EOFError, socket.error):
+                return
+
+            if request.get("version") != PROTOCOL_VERSION:
+                send_message(self.request, {"error": "unsupported protocol version %s" % request.get("version")})
+                return
+
+            if request.get("type") == "describe":
+                send_message(self.request, {"platforms": self.server.describe()})
+                continue
+            files = request.pop("files", None)
+            if files is None:
+                request["source"] = _decode_source(payload, request.get("il"))
+            else:
+                # Bundle of a remote client: the source, then the headers it includes, back to back
+                payload_view = memoryview(payload)
+                offset = request["source_size"]
+                request["source"] = _decode_source(payload_view[:offset], request.get("il"))
+                request["files"] = []
+                for file_path, file_size in files:
+                    request["files"].append((file_path, payload_view[offset:offset + file_size].tobytes()))
+                    offset += file_size
+            try:
+                status, build_log, binaries, device_ids, prebuilt_key = self.server.build_request(request)
+            except Exception as e:
+                # The client falls back to in-process compilation, which reports the error
+                send_message(self.request, {"error": str(e) or "build failed on the compile server"})
+                continue
+
+            response = {
+                "status": status,
+                "log": build_log,
+                "device_ids": list(device_ids),
+                "prebuilt_key": prebuilt_key,
+                "binary_sizes": None if binaries is None else [len(binary) for binary in binaries]
+            }
+            send_message(self.request, response, binaries)
+
+
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, build_request, describe):
+        self.socket_path = socket_path
+        self.build_request = build_request
+        self.describe = describe
+        if os.path.exists(socket_path):
+            sock = connect(socket_path)
+            if sock is not None:
+                sock.close()
+                raise EnvironmentError("compile server is already running on %s" % socket_path)
+            # Stale socket of a server which did not shut down cleanly
+            os.unlink(socket_path)
+        old_umask = os.umask(0o077)
+        try:
+            socketserver.UnixStreamServer.__init__(self, socket_path, _CompileRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+
+class BuilderServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    # Compile server for remote clients: requests carry the headers of the source, as the builder can not read them
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, build_request, describe):
+        self.build_request = build_request
+        self.describe = describe
+        if ":" in address[0]:
+            self.address_family = socket.AF_INET6
+        socketserver.TCPServer.__init__(self, address, _CompileRequestHandler)
+
+
+def connect(socket_path):
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def request_build(sock, request, source_code):
+    request = dict(request)
+    request["version"] = PROTOCOL_VERSION
+    send_message(sock, request, source_code.encode("utf8"))
+    response, payload = receive_message(sock)
+    if "error" in response:
+        return None
+
+    binaries = None
+    if response["binary_sizes"] is not None:
+        binaries, offset = [], 0
+        payload_view = memoryview(payload)
+        for binary_size in response["binary_sizes"]:
+            binaries.append(payload_view[offset:offset + binary_size])
+            offset += binary_size
+    return response["status"], response["log"], binaries, response["device_ids"], response.get("prebuilt_key")
@@ -0,0 +1,84 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import collections
+
+from .opencl import OpenCL, default_library_path
+from .inventory import load_inventory
+from .cache import CompileCache, DEFAULT_MAX_SIZE as CACHE_DEFAULT_MAX_SIZE
+from .includes import HeaderCache
+from .clcc import select_target, get_build_flags, build_source, get_embedded_headers, read_source
+
+
+class CompileResult(collections.namedtuple("CompileResult", ["status", "log", "binaries"])):
+    # status is 0 on success; binaries are in the order of the session devices, or None if the build failed
+    @property
+    def binary(self):
+        return None if self.binaries is None else self.binaries[0]
+
+
+class Session:
+    # Compiles kernels in-process: the OpenCL library, the target devices and their context stay loaded between builds.
+    # Errors raise report.Error; failed builds are reported through the status and log of the result.
+    def __init__(self, platform=None, device=1, library_path=None, include_paths=None, debug=False, standard=None,
+                 cache_dir=None, cache_size=CACHE_DEFAULT_MAX_SIZE, refresh_devices=False):
+        self.cl = OpenCL(library_path or default_library_path())
+        self.inventory = load_inventory(self.cl, refresh=refresh_devices)
+        self.target = select_target(self.cl, platform, device, self.inventory)
+        self.include_paths = list(include_paths or [])
+        self.clflags = get_build_flags(self.target, self.include_paths, debug, standard)
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = CompileCache(cache_dir, cache_size)
+        self.header_cache = HeaderCache()
+
+    @property
+    def device_ids(self):
+        return self.target.device_ids
+
+    def _get_clflags(self, flags):
+        return " ".join(filter(None, [self.clflags, flags]))
+
+    def compile(self, source_code, flags="", command="build", filename="<source>.cl"):
+        # command is "build" for an executable program, "compile" for an object, or "check" to only check the syntax.
+        # Relative includes are resolved against the directory of filename.
+        status, build_log, binaries = build_source(self.target, command, filename, source_code, self.include_paths,
+            self._get_clflags(flags), self.cache, header_cache=self.header_cache)
+        return CompileResult(status, build_log, binaries)
+
+    def compile_file(self, filename, flags="", command="build"):
+        return self.compile(read_source(filename), flags, command, filename)
+
+    def compile_async(self, source_code, flags="", command="build", filename="<source>.cl"):
+        # Returns a concurrent.futures.Future of the CompileResult; the build runs in the driver without a Python thread
+        headers = None
+        if command != "build":
+            headers = get_embedded_headers(filename, source_code, self.include_paths, self.header_cache)
+        build_future = self.target.build_async(command, source_code, self._get_clflags(flags), headers)
+        result_future = type(build_future)()
+
+        def complete(build_future):
+            try:
+                result_future.set_result(CompileResult(*build_future.result()))
+            except BaseException as e:
+                result_future.set_exception(e)
+
+        build_future.add_done_callback(complete)
+        return result_future
+
+    def close(self):
+        if self.target is not None:
+            self.target.release()
+            self.target = None
+        if self.cache is not None:
+            self.cache.save_stats()
+            self.cache.trim()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,24 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import struct
+
+
+SPIRV_MAGIC = 0x07230203
+
+
+def is_spirv(data):
+    # SPIR-V modules start with the magic number in the byte order of the producer
+    if len(data) < 4:
+        return False
+    return SPIRV_MAGIC in struct.unpack("<I", data[:4]) + struct.unpack(">I", data[:4])
+
+
+class SpirvModule(bytes):
+    # Program IL used in place of OpenCL C source code: programs are created with clCreateProgramWithIL.
+    # encode() returns the module itself, so hashing and transport of sources handle modules unchanged.
+    def encode(self, encoding="utf8", errors="strict"):
+        return bytes(self)
+
@@ -0,0 +1,68 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import json
+import itertools
+
+from . import report
+
+
+def parse_sweep_option(sweep_option):
+    # NAME=VALUE1,VALUE2,... -> (NAME, [VALUE1, VALUE2, ...])
+    name, separator, values = sweep_option.partition("=")
+    name = name.strip()
+    if not separator or not name:
+        report.error("invalid sweep parameter %s: NAME=VALUE1,VALUE2,... required" % sweep_option)
+    return name, [value.strip() for value in values.split(",")]
+
+
+def load_sweep_file(sweep_filename):
+    # A grid is an object which maps macro names to lists of values, and expands to all their combinations,
+    # or a list of such objects with single values, each being one variant
+    with open(sweep_filename, "r") as sweep_file:
+        if sweep_filename.endswith(".yaml") or sweep_filename.endswith(".yml"):
+            try:
+                import yaml
+            except ImportError:
+                report.error("YAML sweep files require PyYAML (pip install pyyaml)")
+            grid = yaml.safe_load(sweep_file)
+        else:
+            try:
+                grid = json.load(sweep_file)
+            except ValueError as e:
+                report.error("invalid sweep file %s: %s" % (sweep_filename, e))
+    if isinstance(grid, dict):
+        return expand_grid([(name, values if isinstance(values, list) else [values]) for name, values in sorted(grid.items())])
+    elif isinstance(grid, list) and all(isinstance(variant, dict) for variant in grid):
+        return [sorted(variant.items()) for variant in grid]
+    else:
+        report.error("invalid sweep file %s: object of value lists or list of objects required" % sweep_filename)
+
+
+def expand_grid(parameters):
+    # [(NAME, [VALUES])] -> list of variants, each a list of (NAME, VALUE) pairs
+    names = [name for name, values in parameters]
+    return [list(zip(names, values)) for values in itertools.product(*[values for name, values in parameters])]
+
+
+def format_define(name, value):
+    if value is None or value is True:
+        return "-D" + name
+    elif value is False:
+        return None
+    else:
+        return "-D%s=%s" % (name, value)
+
+
+def get_variant_flags(variant):
+    # Macros are sorted by name, so that variants which differ only in the order of parameters get the same flags
+    return " ".join(filter(None, [format_define(name, value) for name, value in sorted(variant)]))
+
+
+def deduplicate_variants(variants):
+    # Returns the flags of every variant and, for each variant, the index of the first variant with the same flags
+    variant_flags = [get_variant_flags(variant) for variant in variants]
+    first_variants = {}
+    return variant_flags, [first_variants.setdefault(flags, index) for index, flags in enumerate(variant_flags)]
@@ -0,0 +1,298 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import ctypes
+import threading
+
+from .opencl import PLATFORM_NAME as CL_PLATFORM_NAME, \
+    PLATFORM_VERSION as CL_PLATFORM_VERSION, \
+    DEVICE_NAME as CL_DEVICE_NAME, \
+    DEVICE_VERSION as CL_DEVICE_VERSION, \
+    DRIVER_VERSION as CL_DRIVER_VERSION, \
+    CONTEXT_PLATFORM as CL_CONTEXT_PLATFORM, \
+    BUILD_SUCCESS as CL_BUILD_SUCCESS, \
+    BUILD_PROGRAM_FAILURE as CL_BUILD_PROGRAM_FAILURE, \
+    COMPILE_PROGRAM_FAILURE as CL_COMPILE_PROGRAM_FAILURE
+from .spirv import SpirvModule
+from .inventory import get_device_fingerprint
+from . import report
+from . import timing
+
+
+def create_program(cl, context, source_code):
+    # SPIR-V modules are created with clCreateProgramWithIL, and only need the back-end of the device compiler
+    if isinstance(source_code, SpirvModule):
+        return cl.create_program_with_il(context, source_code)
+    return cl.create_program_with_source(context, source_code)
+
+
+class Target:
+    def __init__(self, cl, platform, devices, device_ids, identity=None, device_infos=None):
+        # device_ids are the 1-based numbers of devices in the platform, as listed by clcc -l.
+        # device_infos are the inventory records of the devices, if known.
+        self.cl = cl
+        self.platform = platform
+        self.devices = tuple(devices)
+        self.device_ids = tuple(device_ids)
+        self.device_infos = None if device_infos is None else tuple(device_infos)
+        self._identity = None if identity is None else tuple(identity)
+        if self._identity is not None:
+            self.platform_name = self._identity[0]
+        else:
+            self.platform_name = cl.get_platform_info(platform, CL_PLATFORM_NAME)
+        self._context = None
+        self._context_lock = threading.Lock()
+        # Index of the device which builds the binary of each device: devices with the same fingerprint share a binary,
+        # so the program is built only for the first of them (the build devices)
+        self.binary_sources = tuple(range(len(self.devices)))
+        if self.device_infos is not None:
+            first_devices = {}
+            self.binary_sources = tuple(first_devices.setdefault(get_device_fingerprint(device_info), device_index)
+                for device_index, device_info in enumerate(self.device_infos))
+        self.build_devices = tuple(device for device_index, device in enumerate(self.devices) if self.binary_sources[device_index] == device_index)
+
+    @property
+    def context(self):
+        # The context is created on first use and then shared by all builds for this platform and set of devices
+        with self._context_lock:
+            if self._context is None:
+                context_properties = (ctypes.c_void_p * 4)()
+                context_properties[0] = ctypes.cast(CL_CONTEXT_PLATFORM, ctypes.c_void_p)
+                context_properties[1] = self.platform
+                with timing.phase("create context"):
+                    self._context = self.cl.create_context(context_properties, self.devices)
+            return self._context
+
+    def get_identity(self):
+        # Strings which identify the compilers behind this target: binaries are interchangeable only if they match.
+        # Platform name and version, then name, version and driver version of each device.
+        if self._identity is None:
+            identity = [self.platform_name, self.cl.get_platform_info(self.platform, CL_PLATFORM_VERSION)]
+            for device in self.devices:
+                identity += [
+                    self.cl.get_device_string_info(device, CL_DEVICE_NAME),
+                    self.cl.get_device_string_info(device, CL_DEVICE_VERSION),
+                    self.cl.get_device_string_info(device, CL_DRIVER_VERSION)]
+            self._identity = tuple(identity)
+        return self._identity
+
+    @property
+    def device_names(self):
+        # Device names of the identity, in the order of devices
+        return list(self.get_identity()[2::3])
+
+    def get_build_log(self, program, devices=None):
+        # devices are those the program was built for, by default all devices of the target
+        if len(self.devices) == 1:
+            return self.cl.get_program_build_log(program, self.devices[0])
+
+        device_logs = []
+        for device_id, device in zip(self.device_ids, self.devices):
+            if devices is not None and all(device is not build_device for build_device in devices):
+                continue
+            device_log = self.cl.get_program_build_log(program, device).strip()
+            if device_log:
+                device_name = self.cl.get_device_string_info(device, CL_DEVICE_NAME)
+                device_logs.append("Device #%d (%s):\n%s" % (device_id, device_name, device_log))
+        return "\n".join(device_logs)
+
+    def _get_build_devices(self, inspect=None):
+        # Inspection needs a program which is built for every device, so an inspected build does not share binaries
+        # between devices with the same fingerprint. Builds which already produced binaries, cache hits and asynchronous
+        # builds, keep the sharing and are inspected through inspect_binaries instead.
+        return self.devices if inspect is not None else self.build_devices
+
+    def _share_binaries(self, binaries):
+        # Binaries of a program built for the build devices -> binaries of all devices, in the order of devices.
+        # Programs have a binary, empty if not built, for every device of the context, but linked programs only have
+        # binaries for the devices they were linked for.
+        if len(binaries) == len(self.devices):
+            return [binaries[source_index] for source_index in self.binary_sources]
+        build_indices = sorted(set(self.binary_sources))
+        return [binaries[build_indices.index(source_index)] for source_index in self.binary_sources]
+
+    def _start_build(self, command, source_code, clflags, headers, notify=None, devices=None):
+        # Returns the program, the header programs and the status of clBuildProgram or clCompileProgram
+        if devices is None:
+            devices = self.devices
+        context = self.context
+        with timing.phase("create program"):
+            program = create_program(self.cl, context, source_code)
+        header_programs = []
+        try:
+            if command == "build":
+                with timing.phase("build program"):
+                    status = self.cl.build_program(program, devices, clflags, notify)
+            else:
+                with timing.phase("create header programs"):
+                    for header_name, header_code in headers or []:
+                        header_programs.append((self.cl.create_program_with_source(context, header_code), header_name))
+                with timing.phase("compile program"):
+                    status = self.cl.compile_program(program, devices, clflags, header_programs, notify)
+        except:
+            self._release_programs(program, header_programs)
+            raise
+        return program, header_programs, status
+
+    def _finish_build(self, command, program, header_programs, status, output_buffer=None, inspect=None):
+        devices = self._get_build_devices(inspect)
+        share_binaries = len(devices) < len(self.devices)
+        try:
+            with timing.phase("get build log"):
+                build_log = self.get_build_log(program, devices)
+            if status == 0 and inspect is not None:
+                with timing.phase("inspect program"):
+                    inspect(program)
+
+            binaries = None
+            if status == 0 and command != "check":
+                with timing.phase("get program binaries"):
+                    if output_buffer is None:
+                        binaries = self.cl.get_program_binaries(program)
+                        if share_binaries:
+                            binaries = self._share_binaries(binaries)
+                    else:
+                        binaries = self.get_program_binaries_into(program, output_buffer, share_binaries)
+        finally:
+            self._release_programs(program, header_programs)
+        return status, build_log, binaries
+
+    def _release_programs(self, program, header_programs):
+        for header_program, header_name in header_programs:
+            self.cl.release_program(header_program)
+        self.cl.release_program(program)
+
+    def build(self, command, source_code, clflags, headers=None, output_buffer=None, inspect=None):
+        # A single build covers all devices of the target; binaries are returned in the order of devices.
+        # Devices with the same fingerprint share the binary of one build.
+        # headers are (include name, source code) pairs embedded into the compilation of an object.
+        # output_buffer(device_index, binary_size), if specified, is a context manager which provides a writable buffer
+        # for the binary of a device; binaries are then retrieved one at a time and the buffers are not returned.
+        # inspect(program), if specified, is called with the program of a successful build before it is released.
+        program, header_programs, status = self._start_build(command, source_code, clflags, headers, devices=self._get_build_devices(inspect))
+        return self._finish_build(command, program, header_programs, status, output_buffer, inspect)
+
+    def inspect_binaries(self, binaries, clflags, inspect):
+        # Calls inspect(program) for a program created from prebuilt binaries, e.g. of a cache hit; returns the build status
+        program = self.cl.create_program_with_binary(self.context, self.devices, binaries)
+        try:
+            with timing.phase("build program"):
+                status = self.cl.build_program(program, self.devices, clflags)
+            if status == 0:
+                with timing.phase("inspect program"):
+                    inspect(program)
+        finally:
+            self.cl.release_program(program)
+        return status
+
+    def build_async(self, command, source_code, clflags, headers=None):
+        # Returns a concurrent.futures.Future of the (status, build log, binaries) result of build().
+        # The driver calls back on completion, so a single thread can keep many builds in flight;
+        # the result is collected in the driver thread which calls back. There is no inspect hook: OpenCL calls which
+        # block, such as kernel launches, are not allowed in the callback, so the caller inspects the binaries instead.
+        try:
+            from concurrent.futures import Future
+        except ImportError:
+            # Python 2 without the futures backport
+            report.error("asynchronous builds require concurrent.futures (pip install futures)")
+        future = Future()
+        finish_lock = threading.RLock()
+        started = []
+        finished = []
+
+        def finish(status=None):
+            with finish_lock:
+                if not started:
+                    # Called back from within clBuildProgram: finished once it returns
+                    finished.append(None)
+                    return
+                if finished:
+                    return
+                finished.append(status)
+            try:
+                program, header_programs = started[0]
+                if status is None:
+                    status = self.get_build_status(command, program, self.build_devices)
+                future.set_result(self._finish_build(command, program, header_programs, status))
+            except BaseException as e:
+                future.set_exception(e)
+
+        # A callback from another thread waits until the programs are known
+        with finish_lock:
+            program, header_programs, status = self._start_build(command, source_code, clflags, headers, finish, self.build_devices)
+            started.append((program, header_programs))
+            called_back = bool(finished)
+            del finished[:]
+        if status != 0 or called_back:
+            # The build completed synchronously, or failed to start and there will be no callback
+            finish(status if status != 0 else None)
+        return future
+
+    def build_awaitable(self, command, source_code, clflags, headers=None):
+        # asyncio flavour of build_async; must be called from a coroutine running in an event loop
+        import asyncio
+        return asyncio.wrap_future(self.build_async(command, source_code, clflags, headers))
+
+    def get_build_status(self, command, program, devices=None):
+        # Status of a completed build, in terms of the return value of clBuildProgram or clCompileProgram
+        for device in devices or self.devices:
+            if self.cl.get_program_build_status(program, device) != CL_BUILD_SUCCESS:
+                return CL_BUILD_PROGRAM_FAILURE if command == "build" else CL_COMPILE_PROGRAM_FAILURE
+        return 0
+
+    def get_program_binaries_into(self, program, output_buffer, share_binaries=False):
+        # With share_binaries, the binary of each build device is also copied into the buffers of equivalent devices
+        binary_sizes = self.cl.get_program_binary_sizes(program)
+        for device_index, binary_size in enumerate(binary_sizes):
+            if share_binaries and self.binary_sources[device_index] != device_index:
+                continue
+            with output_buffer(device_index, binary_size) as binary_buffer:
+                binary_buffers = [None] * len(binary_sizes)
+                binary_buffers[device_index] = binary_buffer
+                self.cl.get_program_binaries(program, binary_buffers)
+                if share_binaries:
+                    for copy_index, source_index in enumerate(self.binary_sources):
+                        if source_index == device_index and copy_index != device_index:
+                            with output_buffer(copy_index, binary_size) as copy_buffer:
+                                if copy_buffer is not None and binary_buffer is not None:
+                                    copy_buffer[:binary_size] = binary_buffer[:binary_size]
+        return [None] * len(binary_sizes)
+
+    def link(self, objects, link_flags):
+        # objects are lists of binaries (one per device of the target) of compiled objects or libraries
+        context = self.context
+        programs = []
+        try:
+            with timing.phase("create object programs"):
+                for object_binaries in objects:
+                    programs.append(self.cl.create_program_with_binary(context, self.devices, object_binaries))
+            with timing.phase("link program"):
+                program, status = self.cl.link_program(context, self.build_devices, link_flags, programs)
+        finally:
+            for object_program in programs:
+                self.cl.release_program(object_program)
+        if program is None:
+            return status, "", None
+
+        try:
+            with timing.phase("get build log"):
+                build_log = self.get_build_log(program, self.build_devices)
+            binaries = None
+            if status == 0:
+                with timing.phase("get program binaries"):
+                    binaries = self.cl.get_program_binaries(program)
+                    if len(self.build_devices) < len(self.devices):
+                        binaries = self._share_binaries(binaries)
+        finally:
+            self.cl.release_program(program)
+        return status, build_log, binaries
+
+    def release(self):
+        with self._context_lock:
+            if self._context is not None:
+                self.cl.release_context(self._context)
+                self._context = None
+        for device in self.devices:
+            self.cl.release_device(device)
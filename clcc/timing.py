@@ -0,0 +1,117 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import sys
+import json
+import time
+import threading
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_null_phase = _NullPhase()
+
+
+class _Phase:
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add_event(self.name, self.start_time, time.time(), self.args)
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        self.start_time = time.time()
+        self.events = []
+        self._thread_ids = {}
+        self._thread_names = {}
+        self._lock = threading.Lock()
+
+    def phase(self, name, **args):
+        return _Phase(self, name, args)
+
+    def add_event(self, name, start_time, end_time, args):
+        thread = threading.current_thread()
+        with self._lock:
+            # Small sequential thread numbers make the trace timeline readable
+            thread_id = self._thread_ids.setdefault(thread.ident, len(self._thread_ids) + 1)
+            self._thread_names[thread_id] = thread.name
+            self.events.append((name, start_time, end_time, thread_id, args))
+
+    def print_report(self, file=sys.stderr):
+        phase_names = []
+        phase_stats = {}
+        with self._lock:
+            events = list(self.events)
+        for name, start_time, end_time, thread_id, args in events:
+            if name not in phase_stats:
+                phase_names.append(name)
+                phase_stats[name] = [0, 0.0, start_time]
+            phase_stats[name][0] += 1
+            phase_stats[name][1] += end_time - start_time
+            phase_stats[name][2] = min(phase_stats[name][2], start_time)
+
+        print("%-36s %8s %12s %12s" % ("Phase", "Count", "Total (ms)", "Mean (ms)"), file=file)
+        # Phases are listed in the order they first started
+        for name in sorted(phase_names, key=lambda name: phase_stats[name][2]):
+            count, total, first_start_time = phase_stats[name]
+            print("%-36s %8d %12.3f %12.3f" % (name, count, total * 1000.0, total * 1000.0 / count), file=file)
+        print("Total wall time: %.3f ms" % ((time.time() - self.start_time) * 1000.0), file=file)
+
+    def write_trace(self, trace_path):
+        # Chrome trace event format: load in chrome://tracing or Perfetto
+        pid = os.getpid()
+        trace_events = []
+        with self._lock:
+            for thread_id, thread_name in self._thread_names.items():
+                trace_events.append({
+                    "name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                    "args": {"name": thread_name}
+                })
+            for name, start_time, end_time, thread_id, args in self.events:
+                trace_events.append({
+                    "name": name, "cat": "clcc", "ph": "X", "pid": pid, "tid": thread_id,
+                    "ts": (start_time - self.start_time) * 1.0e6,
+                    "dur": (end_time - start_time) * 1.0e6,
+                    "args": args
+                })
+        with open(trace_path, "w") as trace_file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, trace_file)
+
+
+_profiler = None
+
+
+def enable():
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def phase(name, **args):
+    # Returns a context manager which records the wall time of the enclosed code if profiling is enabled
+    if _profiler is None:
+        return _null_phase
+    return _profiler.phase(name, **args)
@@ -0,0 +1,199 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import sys
+import time
+import errno
+import select
+import struct
+
+from . import report
+
+
+# Editors save files in bursts of events (write, rename, delete of a backup): changes are collected until none
+# arrived for this long, so that a save triggers one rebuild, of the complete file
+_SETTLE_TIME = 0.05
+
+_POLL_INTERVAL = 0.25
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_CLOEXEC = 0o2000000
+
+# Directories are watched rather than files, as editors replace files on save and watches of files follow the old inode
+_IN_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+_INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _get_version(path):
+    # Modification time and size of a file, or None if it does not exist
+    try:
+        stat = os.stat(path)
+    except EnvironmentError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+class _Inotify:
+    def __init__(self, libc, fd):
+        self._libc = libc
+        self.fd = fd
+        self._dirnames = {}
+        self._watches = {}
+
+    @staticmethod
+    def create():
+        # Returns None where inotify is not available
+        if not sys.platform.startswith("linux"):
+            return None
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            inotify_init1, inotify_add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError):
+            return None
+        inotify_init1.restype = ctypes.c_int
+        inotify_init1.argtypes = [ctypes.c_int]
+        inotify_add_watch.restype = ctypes.c_int
+        inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        fd = inotify_init1(_IN_CLOEXEC)
+        if fd < 0:
+            return None
+        return _Inotify(libc, fd)
+
+    def add_watch(self, dirname):
+        # Returns False if the directory can not be watched, e.g. when the limit of watches is reached
+        if dirname in self._watches:
+            return True
+        import ctypes
+        encoded_dirname = os.fsencode(dirname) if hasattr(os, "fsencode") else dirname
+        wd = self._libc.inotify_add_watch(self.fd, encoded_dirname, _IN_WATCH_MASK)
+        if wd < 0:
+            if ctypes.get_errno() == errno.ENOENT:
+                return True
+            return False
+        self._watches[dirname] = wd
+        self._dirnames[wd] = dirname
+        return True
+
+    def read_events(self):
+        # Returns the paths of changed files, or None if events were lost and any file may have changed
+        try:
+            data = os.read(self.fd, 65536)
+        except OSError as e:
+            if e.errno in [errno.EINTR, errno.EAGAIN]:
+                return set()
+            raise
+        paths = set()
+        offset = 0
+        while offset + _INOTIFY_EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = _INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT_HEADER.size
+            name = data[offset:offset + name_length].split(b"\0", 1)[0]
+            offset += name_length
+            if mask & _IN_Q_OVERFLOW:
+                return None
+            if wd in self._dirnames and name:
+                if hasattr(os, "fsdecode"):
+                    name = os.fsdecode(name)
+                paths.add(os.path.join(self._dirnames[wd], name))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    # Waits for changes of a set of files: through inotify on Linux, or by polling their modification times and sizes.
+    # The set can change between waits; changes of files which stay in the set are not lost meanwhile.
+    def __init__(self, poll_interval=_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._paths = set()
+        self._versions = {}
+        self._inotify = _Inotify.create()
+
+    @property
+    def method(self):
+        return "polling" if self._inotify is None else "inotify"
+
+    def set_paths(self, paths):
+        paths = set(os.path.abspath(path) for path in paths)
+        for path in paths - self._paths:
+            self._versions[path] = _get_version(path)
+            if self._inotify is not None and not self._inotify.add_watch(os.path.dirname(path)):
+                report.warning("could not watch %s through inotify (too many watches?): polling files for changes" %
+                               os.path.dirname(path))
+                self._inotify.close()
+                self._inotify = None
+        for path in self._paths - paths:
+            del self._versions[path]
+        self._paths = paths
+
+    def _poll_changes(self):
+        changed = set()
+        for path in self._paths:
+            version = _get_version(path)
+            if version != self._versions[path]:
+                self._versions[path] = version
+                changed.add(path)
+        return changed
+
+    def _wait_inotify(self, timeout):
+        # Returns the watched paths with events within the timeout
+        changed = set()
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.time(), 0.0)
+            try:
+                readable, _, _ = select.select([self._inotify.fd], [], [], remaining)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            if not readable:
+                return changed
+            paths = self._inotify.read_events()
+            if paths is None:
+                return set(self._paths)
+            changed |= paths & self._paths
+            if changed:
+                return changed
+
+    def wait(self):
+        # Blocks until some of the files change, and returns their absolute paths
+        while True:
+            if self._inotify is not None:
+                changed = self._wait_inotify(None)
+            else:
+                time.sleep(self.poll_interval)
+                changed = self._poll_changes()
+            if not changed:
+                continue
+            # Collect the rest of the burst of changes
+            while True:
+                if self._inotify is not None:
+                    more_changes = self._wait_inotify(_SETTLE_TIME)
+                else:
+                    time.sleep(_SETTLE_TIME)
+                    more_changes = self._poll_changes()
+                if not more_changes:
+                    break
+                changed |= more_changes
+            for path in changed:
+                self._versions[path] = _get_version(path)
+            return changed
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
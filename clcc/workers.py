@@ -0,0 +1,315 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import sys
+import time
+import signal
+import select
+import socket
+import threading
+import subprocess
+
+from .target import Target
+from .server import send_message, receive_message
+from .spirv import SpirvModule
+from . import report
+from . import timing
+
+
+# Interval of checks for timeouts and memory use of a worker while it builds
+_POLL_INTERVAL = 0.05
+
+
+def _get_max_rss():
+    # Peak resident set size of this process in bytes, or None where it is not known
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux and BSDs report kilobytes, macOS reports bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _describe_exit(returncode):
+    if returncode < 0:
+        try:
+            return "was killed by signal %d (%s)" % (-returncode, signal.Signals(-returncode).name)
+        except (AttributeError, ValueError):
+            return "was killed by signal %d" % -returncode
+    return "exited with status %d" % returncode
+
+
+class _WorkerFailure(Exception):
+    pass
+
+
+class _Worker:
+    # A child process with its own OpenCL library instance and target, which builds one program at a time.
+    # Requests and responses use the message format of the compile server over a socket pair.
+    def __init__(self, target_platform, target_devices):
+        parent_socket, child_socket = socket.socketpair()
+        command = [sys.executable, "-m", "clcc.workers", str(child_socket.fileno()), target_platform or "", target_devices]
+        # The worker imports this package from the same location as the parent
+        env = dict(os.environ)
+        package_dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_dirname, env.get("PYTHONPATH")]))
+        if sys.version_info >= (3, 2):
+            popen_kwargs = {"pass_fds": [child_socket.fileno()]}
+        else:
+            popen_kwargs = {"close_fds": False}
+        try:
+            self.process = subprocess.Popen(command, env=env, **popen_kwargs)
+        finally:
+            child_socket.close()
+        self.socket = parent_socket
+        self.builds = 0
+        self.max_rss = None
+
+    def start(self, timeout=None):
+        # Returns the target identity of the worker, once it loaded the OpenCL library and created its target
+        try:
+            response = self.receive(timeout)
+        except _WorkerFailure as e:
+            report.error("worker process did not start: %s" % e)
+        if "error" in response[0]:
+            report.error("worker process could not create the target: %s" % response[0]["error"])
+        return tuple(response[0]["identity"])
+
+    def get_rss(self):
+        # Current resident set size in bytes, or None if the platform does not expose it
+        try:
+            with open("/proc/%d/statm" % self.process.pid) as statm_file:
+                return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (EnvironmentError, ValueError, IndexError):
+            return None
+
+    def receive(self, timeout=None, memory_limit=None):
+        # Waits for a response; a worker which exits, runs out of time or exceeds the memory limit raises _WorkerFailure
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            readable, _, _ = select.select([self.socket], [], [], _POLL_INTERVAL)
+            if readable:
+                try:
+                    return receive_message(self.socket)
+                except (EOFError, socket.error):
+                    # The worker died: the socket was closed without a response
+                    self.process.wait()
+                    raise _WorkerFailure("worker process %s" % _describe_exit(self.process.returncode))
+            if self.process.poll() is not None:
+                raise _WorkerFailure("worker process %s" % _describe_exit(self.process.returncode))
+            if deadline is not None and time.time() > deadline:
+                raise _WorkerFailure("worker process did not respond within %g s" % timeout)
+            if memory_limit is not None:
+                rss = self.get_rss()
+                if rss is not None and rss > memory_limit:
+                    raise _WorkerFailure("worker process exceeded the memory limit (%d MB)" % (rss // (1024 * 1024)))
+
+    def build(self, command, source_code, clflags, headers, timeout=None, memory_limit=None):
+        request = {"command": command, "clflags": clflags, "headers": headers, "il": isinstance(source_code, SpirvModule)}
+        try:
+            send_message(self.socket, request, source_code.encode("utf8"))
+        except socket.error:
+            self.process.wait()
+            raise _WorkerFailure("worker process %s" % _describe_exit(self.process.returncode))
+        response, payload = self.receive(timeout, memory_limit)
+        self.builds += 1
+        self.max_rss = response.get("max_rss")
+        if "error" in response:
+            report.error(response["error"])
+
+        binaries = None
+        if response["binary_sizes"] is not None:
+            binaries, offset = [], 0
+            payload_view = memoryview(payload)
+            for binary_size in response["binary_sizes"]:
+                binaries.append(payload_view[offset:offset + binary_size])
+                offset += binary_size
+        return response["status"], response["log"], binaries
+
+    def stop(self):
+        # Closing the socket asks the worker to exit; a worker which does not is killed
+        self.socket.close()
+        deadline = time.time() + 1.0
+        while self.process.poll() is None and time.time() < deadline:
+            time.sleep(_POLL_INTERVAL)
+        self.kill()
+
+    def kill(self):
+        self.socket.close()
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+class WorkerPool:
+    # Runs builds in up to size worker processes, so that a compiler which crashes, hangs or leaks memory takes down
+    # only its worker. A failed build is retried in a fresh worker up to retries times before it is reported.
+    # Workers are replaced after max_builds builds, or when their memory use exceeds memory_limit (in bytes).
+    def __init__(self, size, target_platform, target_devices, timeout=None, memory_limit=None, max_builds=None, retries=1):
+        if os.name != "posix":
+            report.error("isolated builds are supported only on POSIX systems")
+        self.size = max(size, 1)
+        self.target_platform = target_platform
+        self.target_devices = target_devices
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_builds = max_builds
+        self.retries = retries
+        self.identity = None
+        self._idle_workers = []
+        self._workers_count = 0
+        self._condition = threading.Condition()
+
+    def _acquire(self):
+        with self._condition:
+            while not self._idle_workers and self._workers_count >= self.size:
+                self._condition.wait()
+            if self._idle_workers:
+                return self._idle_workers.pop()
+            self._workers_count += 1
+        try:
+            with timing.phase("start worker"):
+                worker = _Worker(self.target_platform, self.target_devices)
+                try:
+                    identity = worker.start(self.timeout)
+                except:
+                    worker.kill()
+                    raise
+            if self.identity is not None and identity != self.identity:
+                worker.kill()
+                report.error("worker process selected other devices than the parent process (use --refresh-devices)")
+        except:
+            self._release(None)
+            raise
+        return worker
+
+    def _release(self, worker):
+        # Returns a healthy worker to the pool, or frees its slot
+        with self._condition:
+            if worker is not None:
+                self._idle_workers.append(worker)
+            else:
+                self._workers_count -= 1
+            self._condition.notify()
+
+    def _is_worn_out(self, worker):
+        if self.max_builds is not None and worker.builds >= self.max_builds:
+            return True
+        return self.memory_limit is not None and worker.max_rss is not None and worker.max_rss > self.memory_limit
+
+    def build(self, command, source_code, clflags, headers=None):
+        # Returns (status, build log, binaries) as Target.build does; builds which fail in every attempt have status -1
+        for attempt in range(self.retries + 1):
+            worker = self._acquire()
+            try:
+                with timing.phase("worker build", attempt=attempt):
+                    result = worker.build(command, source_code, clflags, headers, self.timeout, self.memory_limit)
+            except _WorkerFailure as e:
+                worker.kill()
+                self._release(None)
+                failure = str(e)
+                if attempt < self.retries:
+                    report.warning("%s; retrying the build in a new worker process" % failure)
+                continue
+            except report.Error:
+                # Errors of OpenCL calls are reported by the worker, which is still usable
+                self._release(worker)
+                raise
+            except:
+                worker.kill()
+                self._release(None)
+                raise
+            if self._is_worn_out(worker):
+                worker.stop()
+                self._release(None)
+            else:
+                self._release(worker)
+            return result
+        attempts = self.retries + 1
+        return -1, "%s (%d attempt%s)" % (failure, attempts, "" if attempts == 1 else "s"), None
+
+    def close(self):
+        with self._condition:
+            workers, self._idle_workers = self._idle_workers, []
+            self._workers_count -= len(workers)
+        for worker in workers:
+            worker.stop()
+
+
+class IsolatedTarget(Target):
+    # Target whose builds run in a worker pool. The identity, the devices and the context (for inspection of binaries)
+    # stay in this process, so cache keys, output names and archives are the same as for in-process builds.
+    def __init__(self, target, pool):
+        Target.__init__(self, target.cl, target.platform, target.devices, target.device_ids, target.get_identity(), target.device_infos)
+        self.pool = pool
+        pool.identity = self.get_identity()
+
+    def build(self, command, source_code, clflags, headers=None, output_buffer=None, inspect=None):
+        status, build_log, binaries = self.pool.build(command, source_code, clflags, headers)
+        if status == 0 and binaries is not None:
+            if inspect is not None:
+                self.inspect_binaries(binaries, clflags, inspect)
+            if output_buffer is not None:
+                for device_index, binary in enumerate(binaries):
+                    with output_buffer(device_index, len(binary)) as binary_buffer:
+                        if binary_buffer is not None:
+                            binary_buffer[:len(binary)] = bytes(binary)
+                binaries = [None] * len(binaries)
+        return status, build_log, binaries
+
+    def build_async(self, command, source_code, clflags, headers=None):
+        report.error("asynchronous builds are not supported in isolated worker processes")
+
+    def release(self):
+        self.pool.close()
+        Target.release(self)
+
+
+def worker_main(args):
+    socket_fd, target_platform, target_devices = int(args[0]), args[1] or None, args[2]
+    sock = socket.fromfd(socket_fd, socket.AF_UNIX, socket.SOCK_STREAM)
+    os.close(socket_fd)
+    # Ctrl+C reaches the whole process group: workers exit quietly and the parent reports the interrupt
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    from .opencl import OpenCL, default_library_path
+    from .inventory import load_inventory
+    from .clcc import select_target
+    try:
+        cl = OpenCL(default_library_path())
+        target = select_target(cl, target_platform, target_devices, load_inventory(cl))
+    except report.Error as e:
+        send_message(sock, {"error": str(e)})
+        return
+    send_message(sock, {"identity": list(target.get_identity())})
+
+    try:
+        while True:
+            try:
+                request, payload = receive_message(sock)
+            except (EOFError, socket.error):
+                break
+            source_code = SpirvModule(payload) if request["il"] else payload.decode("utf8")
+            try:
+                status, build_log, binaries = target.build(request["command"], source_code, request["clflags"],
+                    [tuple(header) for header in request["headers"] or []])
+            except report.Error as e:
+                send_message(sock, {"error": str(e), "max_rss": _get_max_rss()})
+                continue
+            response = {
+                "status": status,
+                "log": build_log,
+                "binary_sizes": None if binaries is None else [len(binary) for binary in binaries],
+                "max_rss": _get_max_rss()
+            }
+            send_message(sock, response, binaries)
+    finally:
+        target.release()
+
+
+if __name__ == "__main__":
+    worker_main(sys.argv[1:])
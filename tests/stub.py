@@ -0,0 +1,86 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import print_function, absolute_import
+import os
+import sys
+import shutil
+import atexit
+import tempfile
+import unittest
+import subprocess
+
+
+root_dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_library_dirname = []
+
+
+def get_stub_library_dirname():
+    # The stub OpenCL library of the benchmarks is built once per test run; tests which need it are skipped without a C compiler
+    if not _library_dirname:
+        library_dirname = tempfile.mkdtemp(prefix="clcc-test-lib-")
+        atexit.register(shutil.rmtree, library_dirname, True)
+        command = [os.environ.get("CC", "cc"), "-std=gnu99", "-O2", "-shared", "-fPIC", "-o",
+                   os.path.join(library_dirname, "libOpenCL.so"), os.path.join(root_dirname, "benchmarks", "stub", "stub_opencl.c"), "-lpthread"]
+        try:
+            subprocess.check_call(command)
+        except (EnvironmentError, subprocess.CalledProcessError):
+            _library_dirname.append(None)
+        else:
+            _library_dirname.append(library_dirname)
+    if _library_dirname[0] is None:
+        raise unittest.SkipTest("could not build the stub OpenCL library")
+    return _library_dirname[0]
+
+
+class StubTestCase(unittest.TestCase):
+    # Runs clcc in a subprocess against the stub OpenCL library, in a temporary working directory.
+    # The stub has a platform with one CPU device (#1) and an AMD offline-devices platform (#2).
+    def setUp(self):
+        if not sys.platform.startswith("linux"):
+            raise unittest.SkipTest("the stub OpenCL library requires Linux")
+        library_dirname = get_stub_library_dirname()
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+        self.environment = dict((name, value) for name, value in os.environ.items()
+            if not name.startswith("CLCC_") and not name.startswith("STUB_CL_"))
+        self.environment.update({
+            "LD_LIBRARY_PATH": os.pathsep.join(filter(None, [library_dirname, os.environ.get("LD_LIBRARY_PATH")])),
+            "PYTHONPATH": os.pathsep.join(filter(None, [root_dirname, os.environ.get("PYTHONPATH")])),
+            "XDG_CACHE_HOME": os.path.join(self.dirname, "cache"),
+            "XDG_RUNTIME_DIR": self.dirname
+        })
+
+    def path(self, *names):
+        return os.path.join(self.dirname, *names)
+
+    def write_file(self, name, text):
+        path = self.path(name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as text_file:
+            text_file.write(text)
+        return path
+
+    def read_file(self, name, mode="r"):
+        with open(self.path(name), mode) as data_file:
+            return data_file.read()
+
+    def run_python(self, args, environment=None):
+        # Returns the exit status and the combined output
+        process_environment = dict(self.environment)
+        process_environment.update(environment or {})
+        process = subprocess.Popen([sys.executable] + args, env=process_environment, cwd=self.dirname,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0].decode("utf8")
+        return process.returncode, output
+
+    def run_clcc(self, *args, **kwargs):
+        return self.run_python([os.path.join(root_dirname, "bin", "clcc")] + list(args), kwargs.get("environment"))
+
+    def check_clcc(self, *args, **kwargs):
+        status, output = self.run_clcc(*args, **kwargs)
+        self.assertEqual(status, 0, output)
+        return output
@@ -0,0 +1,122 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+from clcc.archive import Archive, ArchiveOutput, ArchiveEntry, get_source_hash, BINARY_ALIGNMENT
+from clcc.cache import get_prebuilt_key
+from clcc.report import Error
+from .stub import StubTestCase
+
+
+class FakeTarget:
+    def __init__(self, device_names, device_infos=None):
+        self.device_names = device_names
+        self.device_infos = device_infos
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+        self.path = os.path.join(self.dirname, "kernels.clar")
+        self.header_path = os.path.join(self.dirname, "scale.h")
+
+    def write_archive(self):
+        with open(self.header_path, "w") as header_file:
+            header_file.write("#define SCALE 2\n")
+        target = FakeTarget(["Tahiti", "GeForce"], [{"gfxip": [6, 0]}, {"gfxip": None, "compute_capability": [5, 2]}])
+        archive = ArchiveOutput(self.path)
+        archive.add(target, "src/scale.cl", "-O2", "scale source", [self.header_path], [b"tahiti scale", b"geforce scale"])
+        for variant in range(3):
+            archive.add(FakeTarget(["Tahiti"]), "sum.cl", "-DN=%d" % variant, "sum source", [], [b"sum %d" % variant], variant)
+        archive.add_duplicate("sum.cl", 3, 1)
+        self.assertEqual(archive.finish(), 6)
+
+    def test_find(self):
+        self.write_archive()
+        with Archive(self.path) as archive:
+            self.assertEqual(len(archive), 6)
+            entries = archive.find("scale", "GeForce")
+            self.assertEqual(len(entries), 1)
+            entry = entries[0]
+            self.assertEqual((entry.name, entry.device_name, entry.arch, entry.flags), ("scale", "GeForce", ("sm", 5, 2), "-O2"))
+            self.assertEqual(entry.source_hash, get_source_hash("scale source"))
+            self.assertEqual(entry.prebuilt_key, get_prebuilt_key("scale source", [self.header_path], "-O2"))
+            self.assertNotEqual(archive.find("sum.v0", "Tahiti")[0].prebuilt_key, archive.find("sum.v1", "Tahiti")[0].prebuilt_key)
+            self.assertEqual(entry.offset % BINARY_ALIGNMENT, 0)
+            self.assertEqual(bytes(archive.read(entry)), b"geforce scale")
+            self.assertEqual(archive.find("scale", "Tahiti")[0].arch, ("gfxip", 6, 0))
+            self.assertEqual(archive.find("scale", "Hawaii"), [])
+            self.assertEqual(archive.find("sum.v2", "Tahiti")[0].flags, "-DN=2")
+
+    def test_duplicate_variants_share_binaries(self):
+        self.write_archive()
+        with Archive(self.path) as archive:
+            duplicate, = archive.find("sum.v3", "Tahiti")
+            original, = archive.find("sum.v1", "Tahiti")
+            self.assertEqual((duplicate.offset, duplicate.size, duplicate.flags), (original.offset, original.size, original.flags))
+            self.assertEqual(sorted(entry.name for entry in archive), ["scale", "scale", "sum.v0", "sum.v1", "sum.v2", "sum.v3"])
+            self.assertTrue(all(isinstance(entry, ArchiveEntry) for entry in archive))
+
+    def test_duplicate_names(self):
+        archive = ArchiveOutput(self.path)
+        archive.add(FakeTarget(["Tahiti", "Tahiti"]), "a/k.cl", "", "", [], [b"first", b"first"])
+        self.assertRaises(Error, archive.add, FakeTarget(["Tahiti"]), "b/k.cl", "", "", [], [b"second"])
+        self.assertRaises(Error, archive.add_duplicate, "a/k.cl", None, None)
+        self.assertEqual(archive.finish(), 1)
+
+    def test_discard(self):
+        archive = ArchiveOutput(self.path)
+        archive.add(FakeTarget(["Tahiti"]), "a.cl", "", "", [], [b"binary"])
+        archive.discard()
+        self.assertEqual(os.listdir(self.dirname), [])
+
+    def test_invalid_archives(self):
+        for name, data in [("empty", b""), ("short", b"CLCCFAT\0"), ("magic", b"NOTCLCC\0" + b"\0" * 64)]:
+            path = os.path.join(self.dirname, name)
+            with open(path, "wb") as archive_file:
+                archive_file.write(data)
+            self.assertRaises(Error, Archive, path)
+        self.write_archive()
+        with open(self.path, "rb") as archive_file:
+            data = archive_file.read()
+        with open(self.path, "wb") as archive_file:
+            archive_file.write(data[:-1])
+        self.assertRaises(Error, Archive, self.path)
+
+
+class TestArchiveBuilds(StubTestCase):
+    def test_archive_of_devices(self):
+        self.write_file("a.cl", "kernel void k(global float* x) { x[0] = 1.0f; }\n")
+        self.write_file("b.cl", "kernel void k(global float* x) { x[0] = 2.0f; }\n")
+        output = self.check_clcc("--platform", "2", "-d", "all", "--archive", "kernels.clar", "a.cl", "b.cl")
+        self.assertIn("ARCHIVE  kernels.clar (8 binaries)", output)
+        self.assertFalse(os.path.exists(self.path("a.d1.bin")))
+        with Archive(self.path("kernels.clar")) as archive:
+            entry, = archive.find("b", "Hawaii")
+            self.assertEqual(entry.arch, ("gfxip", 7, 0))
+            self.assertTrue(bytes(archive.read(entry)).startswith(b"STUBBIN:Hawaii"))
+
+    def test_inputs_with_the_same_name(self):
+        self.write_file("a/k.cl", "kernel void k(global float* x) { x[0] = 1.0f; }\n")
+        self.write_file("b/k.cl", "kernel void k(global float* x) { x[0] = 2.0f; }\n")
+        status, output = self.run_clcc("--platform", "1", "--archive", "kernels.clar", "a/k.cl", "b/k.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("archive entry k of b/k.cl is already added from a/k.cl", output)
+        self.assertFalse(os.path.exists(self.path("kernels.clar")))
+
+    def test_failed_build_discards_archive(self):
+        self.write_file("a.cl", "#error broken\n")
+        status, output = self.run_clcc("--platform", "1", "--archive", "kernels.clar", "a.cl")
+        self.assertEqual(status, 1)
+        self.assertEqual(sorted(os.listdir(self.dirname)), ["a.cl", "cache"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import unittest
+from ctypes import c_void_p
+
+from clcc.opencl import OpenCL, BUILD_PROGRAM_FAILURE, COMPILE_PROGRAM_FAILURE
+from .stub import StubTestCase, get_stub_library_dirname
+
+
+KERNEL = "kernel void k(global float* x) { x[0] = 1.0f; }\n"
+
+
+class TestProgramNotify(unittest.TestCase):
+    def setUp(self):
+        self.cl = OpenCL(os.path.join(get_stub_library_dirname(), "libOpenCL.so"))
+        self.notified = []
+
+    def notify(self):
+        self.notified.append(True)
+
+    def test_failure_drops_notify(self):
+        for status in [BUILD_PROGRAM_FAILURE, -5]:
+            self.cl._build_program = lambda *args: status
+            self.assertEqual(self.cl.build_program(c_void_p(1), [], "", self.notify), status)
+            self.assertEqual(self.cl._program_notify_functions, {})
+        self.cl._compile_program = lambda *args: COMPILE_PROGRAM_FAILURE
+        self.assertEqual(self.cl.compile_program(c_void_p(1), [], "", notify=self.notify), COMPILE_PROGRAM_FAILURE)
+        self.assertEqual(self.cl._program_notify_functions, {})
+        self.assertEqual(self.notified, [])
+
+    def test_notify_is_called_once(self):
+        user_data = []
+
+        def build_program(program, devices_count, devices, options, pfn_notify, notify_user_data):
+            user_data.append(notify_user_data.value)
+            return 0
+
+        self.cl._build_program = build_program
+        self.assertEqual(self.cl.build_program(c_void_p(1), [], "", self.notify), 0)
+        self.assertEqual(len(self.cl._program_notify_functions), 1)
+        self.cl._dispatch_program_notify(None, user_data[0])
+        self.cl._dispatch_program_notify(None, user_data[0])
+        self.assertEqual(self.notified, [True])
+        self.assertEqual(self.cl._program_notify_functions, {})
+
+
+class TestAsyncBuilds(StubTestCase):
+    def setUp(self):
+        StubTestCase.setUp(self)
+        self.environment["STUB_CL_ASYNC_BUILDS"] = "1"
+        self.environment["STUB_CL_BUILD_LATENCY_US"] = "2000"
+
+    def test_async_batch(self):
+        inputs = []
+        for index in range(6):
+            inputs.append(self.write_file("k%d.cl" % index, "#error broken\n" if index == 3 else KERNEL))
+        status, output = self.run_clcc("--platform", "2", "-d", "1,2", "--async-builds", "-j", "3", *[os.path.basename(path) for path in inputs])
+        self.assertEqual(status, 1)
+        self.assertIn("FAIL  k3.cl", output)
+        self.assertIn("5 files compiled, 1 failed", output)
+        # Results are reported in the order of inputs
+        result_lines = [line for line in output.splitlines() if line.startswith("OK") or line.startswith("FAIL")]
+        self.assertEqual([line.split()[1] for line in result_lines], ["k%d.cl" % index for index in range(6)])
+        self.assertTrue(self.read_file("k5.d2.bin", "rb").startswith(b"STUBBIN:Pitcairn"))
+
+    def test_async_builds_with_inspection(self):
+        self.write_file("a.cl", KERNEL)
+        self.write_file("b.cl", KERNEL)
+        output = self.check_clcc("--platform", "1", "--async-builds", "-j", "2", "--resource-report", "--bench", "k", "a.cl", "b.cl")
+        report_lines = [line.split() for line in output.splitlines() if line.startswith("a.cl") or line.startswith("b.cl")]
+        # A resource report row and a benchmark row for each input
+        self.assertEqual(sorted(line[0] for line in report_lines), ["a.cl", "a.cl", "b.cl", "b.cl"])
+
+
+if __name__ == "__main__":
+    unittest.main()
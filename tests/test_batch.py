@@ -0,0 +1,50 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import unittest
+
+from .stub import StubTestCase
+
+
+KERNEL = "kernel void scale(global float* x) { x[get_global_id(0)] *= 2.0f; }\n"
+
+
+class TestBatch(StubTestCase):
+    def test_parallel_batch(self):
+        for name in ["a", "b", "c"]:
+            self.write_file(name + ".cl", KERNEL)
+        output = self.check_clcc("--platform", "1", "-j", "2", "a.cl", "b.cl", "c.cl")
+        self.assertIn("3 files compiled, 0 failed", output)
+        for name in ["a", "b", "c"]:
+            self.assertTrue(self.read_file(name + ".bin", "rb").startswith(b"STUBBIN:"))
+
+    def test_failure_does_not_stop_batch(self):
+        self.write_file("good.cl", KERNEL)
+        self.write_file("bad.cl", "#error broken\n")
+        status, output = self.run_clcc("--platform", "1", "-j", "2", "bad.cl", "good.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("FAIL  bad.cl", output)
+        self.assertIn("OK    good.cl -> good.bin", output)
+        self.assertIn("1 files compiled, 1 failed", output)
+        self.assertFalse(os.path.exists(self.path("bad.bin")))
+
+    def test_output_directory(self):
+        self.write_file("a.cl", KERNEL)
+        self.write_file("b.cl", KERNEL)
+        os.mkdir(self.path("out"))
+        self.check_clcc("--platform", "1", "-o", "out", "a.cl", "b.cl")
+        self.assertEqual(sorted(os.listdir(self.path("out"))), ["a.bin", "a.bin.stamp", "b.bin", "b.bin.stamp"])
+
+    def test_output_file_with_several_inputs(self):
+        self.write_file("a.cl", KERNEL)
+        self.write_file("b.cl", KERNEL)
+        status, output = self.run_clcc("--platform", "1", "-o", "program.bin", "a.cl", "b.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("must be a directory or a pattern with {name}", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
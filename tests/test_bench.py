@@ -0,0 +1,85 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import struct
+import unittest
+
+from clcc.bench import parse_bench_args, parse_work_size, BenchArg, _get_buffer_data, _get_median
+from clcc.report import Error
+from .stub import StubTestCase
+
+
+KERNEL = "kernel void scale(global float* x, float a, local float* t) { x[get_global_id(0)] *= a; }\n"
+
+
+class TestArguments(unittest.TestCase):
+    def test_parse_bench_args(self):
+        self.assertEqual(parse_bench_args("float[1M], local[256], int=0x10, double=0.5, uchar[3K]"), [
+            BenchArg("buffer", "float", 1024 * 1024), BenchArg("local", None, 256), BenchArg("scalar", "int", 16),
+            BenchArg("scalar", "double", 0.5), BenchArg("buffer", "uchar", 3072)])
+        self.assertEqual(parse_bench_args(None), [])
+
+    def test_invalid_bench_args(self):
+        for spec in ["float4[16]", "float[1T]", "int=1.5", "buffer"]:
+            self.assertRaises(Error, parse_bench_args, spec)
+
+    def test_parse_work_size(self):
+        self.assertEqual(parse_work_size("1024", "--bench-global"), [1024])
+        self.assertEqual(parse_work_size("64,8,2", "--bench-local"), [64, 8, 2])
+        for spec in ["", "0", "1,2,3,4", "16,x"]:
+            self.assertRaises(Error, parse_work_size, spec, "--bench-global")
+
+    def test_buffer_data(self):
+        data = _get_buffer_data(BenchArg("buffer", "float", 5000), 0)
+        self.assertEqual(len(data), 5000 * 4)
+        values = struct.unpack("<5000f", bytes(data))
+        self.assertTrue(all(0.0 <= value < 1.0 for value in values))
+        self.assertEqual(values[4096:], values[:904])
+        self.assertEqual(data, _get_buffer_data(BenchArg("buffer", "float", 5000), 0))
+        self.assertTrue(all(value < 128 for value in bytearray(_get_buffer_data(BenchArg("buffer", "char", 100), 1))))
+
+    def test_median(self):
+        self.assertEqual(_get_median([3, 1, 2]), 2)
+        self.assertEqual(_get_median([4, 1, 3, 2]), 2.5)
+
+
+class TestBenchmarks(StubTestCase):
+    def get_rows(self, output):
+        # Benchmark rows after the header of the table: (file, device, kernel, runs, median)
+        lines = output[output.index("Median (us)"):].splitlines()[1:]
+        rows = []
+        for line in lines:
+            fields = line.split()
+            if len(fields) >= 9 and fields[-5].isdigit():
+                rows.append((fields[0], " ".join(fields[1:-6]), fields[-6], int(fields[-5]), float(fields[-3])))
+        return rows
+
+    def test_kernel_times(self):
+        self.write_file("a.cl", KERNEL)
+        self.write_file("b.cl", KERNEL)
+        output = self.check_clcc("--platform", "1", "--bench", "scale", "--bench-args", "float[64K],float=2,local[256]",
+                                 "--bench-global", "65536", "--bench-repeat", "3", "a.cl", "b.cl")
+        rows = self.get_rows(output)
+        self.assertEqual([row[:4] for row in rows], [("a.cl", "#1 pthread-Intel(R) Core(TM) i7", "scale", 3),
+                                                     ("b.cl", "#1 pthread-Intel(R) Core(TM) i7", "scale", 3)])
+        # The stub runs kernels for 1 ns per work-item
+        for row in rows:
+            self.assertTrue(65.0 <= row[4] < 65.0 * 20, output)
+
+    def test_kernel_not_found(self):
+        self.write_file("a.cl", KERNEL)
+        status, output = self.run_clcc("--platform", "1", "--bench", "missing", "a.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("kernel missing is not in a.cl (kernels: scale)", output)
+
+    def test_invalid_work_size(self):
+        self.write_file("a.cl", KERNEL)
+        status, output = self.run_clcc("--platform", "1", "--bench", "scale", "--bench-global", "0", "a.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("invalid --bench-global value 0", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import json
+import unittest
+
+from .stub import StubTestCase, root_dirname
+
+
+class TestBenchmarks(StubTestCase):
+    def test_benchmark_suite(self):
+        # A small run with budgets which any machine meets: this checks the suite, not the performance
+        status, output = self.run_python([os.path.join(root_dirname, "benchmarks", "run.py"), "--repetitions", "1", "--batch-size", "3",
+            "--build-latency", "0", "--import-budget", "1e6", "--first-compile-budget", "1e6", "--json", "results.json"])
+        self.assertEqual(status, 0, output)
+        results = json.loads(self.read_file("results.json"))
+        for name in ["import", "list", "single", "batch-j1", "batch-all-devices"]:
+            self.assertIn(name, results)
+        self.assertTrue(all(budget["ok"] for budget in results["budgets"].values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import unittest
+
+from .stub import StubTestCase
+
+
+KERNEL = "kernel void k(global float* x) { x[0] = 1.0f; }\n"
+
+
+class TestBinaries(StubTestCase):
+    def test_streamed_and_cached_binaries_are_equal(self):
+        # Without a cache binaries are streamed into the output files; with one they are stored first
+        self.write_file("a.cl", KERNEL)
+        environment = {"STUB_CL_BINARY_PADDING": str(3 * 1024 * 1024 + 5)}
+        self.check_clcc("--platform", "2", "-d", "all", "-o", "{name}-{device}.stream", "a.cl", environment=environment)
+        self.check_clcc("--platform", "2", "-d", "all", "-o", "{name}-{device}.cached", "--cache-dir", "cache-dir", "a.cl",
+                        environment=environment)
+        for device_id, device_name in enumerate(["Tahiti", "Pitcairn", "Hawaii", "Fiji"], 1):
+            binary = self.read_file("a-%d.stream" % device_id, "rb")
+            self.assertTrue(binary.startswith(b"STUBBIN:" + device_name.encode("ascii") + KERNEL.encode("ascii")))
+            self.assertEqual(len(binary), len("STUBBIN:" + device_name + KERNEL) + 3 * 1024 * 1024 + 5)
+            self.assertEqual(binary, self.read_file("a-%d.cached" % device_id, "rb"))
+
+    def test_failed_build_leaves_no_output(self):
+        self.write_file("a.cl", "#error broken\n")
+        status, output = self.run_clcc("--platform", "1", "a.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("stub build failure", output)
+        self.assertRaises(EnvironmentError, self.read_file, "a.bin")
+
+
+if __name__ == "__main__":
+    unittest.main()
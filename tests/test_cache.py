@@ -0,0 +1,120 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from clcc.cache import CompileCache, get_build_key
+from .stub import StubTestCase
+
+
+class FakeTarget:
+    def __init__(self, identity):
+        self.identity = identity
+
+    def get_identity(self):
+        return self.identity
+
+
+TARGET = FakeTarget(("Platform", "OpenCL 1.2", "Device", "OpenCL 1.2", "1.0"))
+
+
+class TestBuildKey(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+        self.header_path = os.path.join(self.dirname, "a.h")
+        with open(self.header_path, "w") as header_file:
+            header_file.write("#define A 1\n")
+
+    def test_key_is_stable(self):
+        self.assertEqual(get_build_key(TARGET, "build", "source", [self.header_path], "-O2"),
+                         get_build_key(TARGET, "build", "source", [self.header_path], "-O2"))
+
+    def test_key_depends_on_all_inputs(self):
+        key = get_build_key(TARGET, "build", "source", [self.header_path], "-O2")
+        self.assertNotEqual(key, get_build_key(TARGET, "compile", "source", [self.header_path], "-O2"))
+        self.assertNotEqual(key, get_build_key(TARGET, "build", "source2", [self.header_path], "-O2"))
+        self.assertNotEqual(key, get_build_key(TARGET, "build", "source", [], "-O2"))
+        self.assertNotEqual(key, get_build_key(TARGET, "build", "source", [self.header_path], "-O3"))
+        other_target = FakeTarget(TARGET.identity[:-1] + ("2.0",))
+        self.assertNotEqual(key, get_build_key(other_target, "build", "source", [self.header_path], "-O2"))
+        with open(self.header_path, "w") as header_file:
+            header_file.write("#define A 2\n")
+        self.assertNotEqual(key, get_build_key(TARGET, "build", "source", [self.header_path], "-O2"))
+
+    def test_fields_do_not_run_together(self):
+        # Every field is prefixed with its length
+        self.assertNotEqual(get_build_key(TARGET, "build", "ab", [], "c"), get_build_key(TARGET, "build", "a", [], "bc"))
+
+
+class TestCompileCache(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+
+    def test_store_and_lookup(self):
+        cache = CompileCache(os.path.join(self.dirname, "cache"))
+        key = get_build_key(TARGET, "build", "source", [], "")
+        self.assertIsNone(cache.lookup(key))
+        cache.store(key, 0, "warning", [b"binary", b""])
+        self.assertEqual(cache.lookup(key), (0, "warning", [b"binary", b""]))
+        cache.store(key, 0, "", None)
+        self.assertEqual(cache.lookup(key), (0, "", None))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_truncated_entry_is_a_miss(self):
+        cache = CompileCache(self.dirname)
+        key = get_build_key(TARGET, "build", "source", [], "")
+        cache.store(key, 0, "", [b"binary"])
+        entry_path = cache._get_entry_path(key)
+        with open(entry_path, "rb") as entry_file:
+            entry_data = entry_file.read()
+        with open(entry_path, "wb") as entry_file:
+            entry_file.write(entry_data[:-1])
+        self.assertIsNone(cache.lookup(key))
+
+    def test_trim_evicts_least_recently_used(self):
+        cache = CompileCache(self.dirname, max_size=0)
+        keys = [get_build_key(TARGET, "build", "source %d" % index, [], "") for index in range(3)]
+        for index, key in enumerate(keys):
+            cache.store(key, 0, "", [b"x" * 100])
+            os.utime(cache._get_entry_path(key), (time.time() - 100 + index, time.time() - 100 + index))
+        entry_size = os.path.getsize(cache._get_entry_path(keys[0]))
+        # Looking up the oldest entry makes it the most recently used
+        self.assertIsNotNone(cache.lookup(keys[0]))
+        cache.max_size = 2 * entry_size
+        cache.trim()
+        self.assertIsNotNone(cache.lookup(keys[0]))
+        self.assertIsNone(cache.lookup(keys[1]))
+        self.assertIsNotNone(cache.lookup(keys[2]))
+
+    def test_stats_accumulate(self):
+        cache = CompileCache(self.dirname)
+        cache.lookup(get_build_key(TARGET, "build", "source", [], ""))
+        cache.save_stats()
+        cache.lookup(get_build_key(TARGET, "build", "source", [], ""))
+        cache.save_stats()
+        self.assertEqual(CompileCache(self.dirname).load_stats()["misses"], 2)
+
+
+class TestCachedBuilds(StubTestCase):
+    def test_second_build_hits(self):
+        self.write_file("a.cl", "kernel void k(global float* x) { x[0] = 1.0f; }\n")
+        cache_dirname = self.path("compile-cache")
+        self.check_clcc("--platform", "1", "--cache-dir", cache_dirname, "a.cl")
+        first_binary = self.read_file("a.bin", "rb")
+        os.unlink(self.path("a.bin"))
+        output = self.check_clcc("--platform", "1", "--cache-dir", cache_dirname, "--cache-stats", "a.cl")
+        self.assertIn("Cache hits: 1", output)
+        self.assertIn("Cache misses: 1", output)
+        self.assertEqual(self.read_file("a.bin", "rb"), first_binary)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import unittest
+
+from clcc.depfile import DependencyOutput, escape_make_path
+from .stub import StubTestCase
+
+
+class TestDependencyOutput(unittest.TestCase):
+    def test_escape_make_path(self):
+        self.assertEqual(escape_make_path("a b/$x#1.h"), "a\\ b/$$x\\#1.h")
+
+    def test_format(self):
+        dependencies = DependencyOutput()
+        self.assertEqual(dependencies.format("k.cl", ["k.bin"], ["inc/a.h", "my dir/b.h"]),
+                         "k.bin: k.cl \\\n inc/a.h \\\n my\\ dir/b.h\n")
+        self.assertEqual(dependencies.format("k.cl", ["k.d1.bin", "k.d2.bin"], []), "k.d1.bin k.d2.bin: k.cl\n")
+
+    def test_target_pattern(self):
+        dependencies = DependencyOutput(target_pattern="out/{name}.stamp")
+        self.assertEqual(dependencies.format("src/k.cl", ["k.bin"], []), "out/k.stamp: src/k.cl\n")
+
+    def test_phony_targets(self):
+        dependencies = DependencyOutput(phony_targets=True)
+        self.assertEqual(dependencies.format("k.cl", ["k.bin"], ["a.h", "b$.h"]),
+                         "k.bin: k.cl \\\n a.h \\\n b$$.h\n\na.h:\n\nb$$.h:\n")
+
+    def test_depfile_path(self):
+        self.assertEqual(DependencyOutput().get_depfile_path("src/k.cl", ["out/k.bin"]), "out/k.d")
+        self.assertEqual(DependencyOutput("deps/{name}.dep").get_depfile_path("src/k.cl", ["out/k.bin"]), "deps/k.dep")
+
+    def test_depfile_path_of_several_devices(self):
+        dependencies = DependencyOutput()
+        self.assertEqual(dependencies.get_depfile_path("src/k.cl", ["out/k.d1.bin", "out/k.d2.bin"]), "out/k.d")
+        self.assertEqual(dependencies.get_depfile_path("src/k.cl", ["out/k-1.bin", "out/k-2.bin"]), os.path.join("out", "k.d"))
+
+
+class TestDependencyFiles(StubTestCase):
+    def test_build_writes_depfile(self):
+        self.write_file("include/common.h", "#define N 4\n")
+        self.write_file("k.cl", "#include <common.h>\nkernel void k(global float* x) { x[0] = N; }\n")
+        self.check_clcc("--platform", "1", "-MD", "-MP", "-I", "include", "k.cl")
+        self.assertEqual(self.read_file("k.d"), "k.bin: k.cl \\\n include/common.h\n\ninclude/common.h:\n")
+
+    def test_depfile_pattern_with_several_inputs(self):
+        self.write_file("a.cl", "")
+        self.write_file("b.cl", "")
+        status, output = self.run_clcc("--platform", "1", "-MD", "-MF", "deps.d", "a.cl", "b.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("option -MF must be a pattern with {name}", output)
+        self.check_clcc("--platform", "1", "-MD", "-MF", "{name}.dep", "a.cl", "b.cl")
+        self.assertEqual(self.read_file("b.dep"), "b.bin: b.cl\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
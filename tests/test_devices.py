@@ -0,0 +1,52 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import unittest
+
+from clcc.clcc import parse_device_ids
+from clcc.report import Error
+from .stub import StubTestCase
+
+
+KERNEL = "kernel void k(global float* x) { x[0] = 1.0f; }\n"
+
+
+class TestParseDeviceIds(unittest.TestCase):
+    def test_device_lists(self):
+        self.assertEqual(parse_device_ids("2", 4), [2])
+        self.assertEqual(parse_device_ids("3,1,3", 4), [3, 1])
+        self.assertEqual(parse_device_ids("all", 3), [1, 2, 3])
+
+    def test_invalid_devices(self):
+        self.assertRaises(Error, parse_device_ids, "0", 4)
+        self.assertRaises(Error, parse_device_ids, "5", 4)
+        self.assertRaises(Error, parse_device_ids, "1,x", 4)
+        self.assertRaises(Error, parse_device_ids, "all", 0)
+
+
+class TestMultiDeviceBuilds(StubTestCase):
+    def test_all_devices(self):
+        self.write_file("a.cl", KERNEL)
+        self.check_clcc("--platform", "2", "-d", "all", "a.cl")
+        for device_id, device_name in enumerate(["Tahiti", "Pitcairn", "Hawaii", "Fiji"], 1):
+            self.assertTrue(self.read_file("a.d%d.bin" % device_id, "rb").startswith(b"STUBBIN:" + device_name.encode("ascii")))
+
+    def test_device_list_with_pattern(self):
+        self.write_file("a.cl", KERNEL)
+        self.check_clcc("--platform", "2", "-d", "1,3", "-o", "{name}-{device}.bin", "a.cl")
+        self.assertTrue(self.read_file("a-3.bin", "rb").startswith(b"STUBBIN:Hawaii"))
+        self.assertTrue(os.path.exists(self.path("a-1.bin")))
+        self.assertFalse(os.path.exists(self.path("a-2.bin")))
+
+    def test_invalid_device(self):
+        self.write_file("a.cl", KERNEL)
+        status, output = self.run_clcc("--platform", "2", "-d", "9", "a.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("only 4 OpenCL devices are available", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import json
+import unittest
+
+from clcc.inventory import get_device_fingerprint
+from .stub import StubTestCase
+
+
+KERNEL = "kernel void scale(global float* x) { x[get_global_id(0)] *= 2.0f; }\n"
+
+DEVICE_INFO = {
+    "name": "Tahiti",
+    "type": "GPU",
+    "gfxip": [6, 0],
+    "compute_capability": None,
+    "version": "OpenCL 1.2 AMD-APP (1800.11)",
+    "driver_version": "1800.11",
+    "extensions": ["cl_khr_fp64", "cl_amd_device_attribute_query"]
+}
+
+# Prints the index of the device which builds the binary of each device of a session
+BINARY_SOURCES_SCRIPT = """
+from clcc import Session
+with Session(platform="2", device="all") as session:
+    print(",".join(map(str, session.target.binary_sources)))
+"""
+
+
+class TestDeviceFingerprint(unittest.TestCase):
+    def test_equal_devices(self):
+        device_info = dict(DEVICE_INFO)
+        device_info["extensions"] = list(reversed(DEVICE_INFO["extensions"]))
+        self.assertEqual(get_device_fingerprint(device_info), get_device_fingerprint(DEVICE_INFO))
+
+    def test_different_devices(self):
+        for key, value in [("name", "Pitcairn"), ("gfxip", [7, 0]), ("driver_version", "1912.5"), ("extensions", ["cl_khr_fp64"])]:
+            device_info = dict(DEVICE_INFO)
+            device_info[key] = value
+            self.assertNotEqual(get_device_fingerprint(device_info), get_device_fingerprint(DEVICE_INFO))
+
+    def test_devices_without_architecture(self):
+        device_info = dict(DEVICE_INFO, gfxip=None)
+        self.assertEqual(get_device_fingerprint(device_info), get_device_fingerprint(dict(DEVICE_INFO, gfxip=[])))
+
+
+class TestSharedBinaries(StubTestCase):
+    def setUp(self):
+        StubTestCase.setUp(self)
+        # Devices #5-#8 repeat devices #1-#4 of the AMD platform
+        self.environment["STUB_CL_OFFLINE_DEVICES"] = "8"
+        self.check_clcc("--refresh-devices", "-l")
+
+    def get_binary_sources(self):
+        status, output = self.run_python(["-c", BINARY_SOURCES_SCRIPT])
+        self.assertEqual(status, 0, output)
+        return output.strip()
+
+    def test_build_once_per_fingerprint(self):
+        self.assertEqual(self.get_binary_sources(), "0,1,2,3,0,1,2,3")
+        self.write_file("a.cl", KERNEL)
+        self.check_clcc("--platform", "2", "-d", "all", "a.cl")
+        binaries = [self.read_file("a.d%d.bin" % device_id, "rb") for device_id in range(1, 9)]
+        self.assertEqual(binaries[4:], binaries[:4])
+        self.assertTrue(binaries[4].startswith(b"STUBBIN:Tahiti"))
+        self.assertEqual(len(set(binaries)), 4)
+
+    def test_different_drivers(self):
+        snapshot_path = self.path("cache", "clcc", "devices.json")
+        with open(snapshot_path, "r") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        snapshot["platforms"][1]["devices"][4]["driver_version"] = "1912.5"
+        with open(snapshot_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        self.assertEqual(self.get_binary_sources(), "0,1,2,3,4,1,2,3")
+
+    def test_inspected_builds(self):
+        # Inspection of a program needs binaries of all devices, so an inspected build does not share them
+        self.write_file("a.cl", KERNEL)
+        self.check_clcc("--platform", "2", "-d", "all", "--resource-json", "resources.json", "a.cl")
+        kernels = json.loads(self.read_file("resources.json"))
+        self.assertEqual([kernel["device_id"] for kernel in kernels], list(range(1, 9)))
+        self.assertTrue(os.path.exists(self.path("a.d8.bin")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+from clcc.includes import parse_includes, scan_includes, scan_include_names, HeaderCache
+from clcc.spirv import SpirvModule
+
+
+class TestIncludes(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+
+    def write_file(self, name, text):
+        path = os.path.join(self.dirname, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as text_file:
+            text_file.write(text)
+        return path
+
+    def test_parse_includes(self):
+        source_code = "#include \"local.h\"\n  #  include <system.h>\n// #include \"comment.h\"\nint x;\n"
+        self.assertEqual(parse_includes(source_code), [(True, "local.h"), (False, "system.h")])
+
+    def test_scan_includes(self):
+        source_path = self.write_file("src/kernel.cl", "#include \"common.h\"\n#include <lib.h>\n#include <builtin.h>\n")
+        common_path = self.write_file("src/common.h", "#include \"sub/types.h\"\n")
+        types_path = self.write_file("src/sub/types.h", "#include \"../common.h\"\n")
+        lib_path = self.write_file("include/lib.h", "#include \"types.h\"\n")
+        with open(source_path) as source_file:
+            source_code = source_file.read()
+        # Headers are listed once, cycles end, and headers which can not be found are skipped
+        header_paths = scan_includes(source_path, source_code, [os.path.join(self.dirname, "include")])
+        self.assertEqual(sorted(header_paths), sorted([common_path, types_path, lib_path]))
+
+    def test_quoted_includes_search_the_current_directory_first(self):
+        source_path = self.write_file("src/kernel.cl", "")
+        local_path = self.write_file("src/config.h", "")
+        self.write_file("include/config.h", "")
+        include_paths = [os.path.join(self.dirname, "include")]
+        self.assertEqual(scan_includes(source_path, "#include \"config.h\"\n", include_paths), [local_path])
+        self.assertEqual(scan_includes(source_path, "#include <config.h>\n", include_paths),
+                         [os.path.join(self.dirname, "include", "config.h")])
+
+    def test_scan_include_names(self):
+        source_path = self.write_file("kernel.cl", "")
+        header_path = self.write_file("a.h", "#include \"b.h\"\n")
+        other_path = self.write_file("b.h", "")
+        self.assertEqual(scan_include_names(source_path, "#include \"a.h\"\n#include \"b.h\"\n", []),
+                         [("a.h", header_path), ("b.h", other_path)])
+
+    def test_spirv_modules_have_no_includes(self):
+        source_path = self.write_file("kernel.spv", "")
+        self.assertEqual(scan_includes(source_path, SpirvModule(b"\x03\x02\x23\x07"), []), [])
+
+    def test_header_cache_sees_edits(self):
+        header_path = self.write_file("a.h", "#include \"b.h\"\n")
+        header_cache = HeaderCache()
+        self.assertEqual(header_cache.get_includes(header_path), [(True, "b.h")])
+        self.write_file("a.h", "#include \"b.h\"\n#include \"c.h\"\n")
+        self.assertEqual(header_cache.get_includes(header_path), [(True, "b.h"), (True, "c.h")])
+        self.assertEqual(header_cache.read_text(header_path), "#include \"b.h\"\n#include \"c.h\"\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import json
+import unittest
+
+from .stub import StubTestCase
+
+
+class TestInventory(StubTestCase):
+    def edit_snapshot(self, edit):
+        snapshot_path = self.path("cache", "clcc", "devices.json")
+        with open(snapshot_path, "r") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        edit(snapshot["platforms"])
+        with open(snapshot_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+
+    def test_list_devices(self):
+        output = self.check_clcc("-l")
+        self.assertIn("Platform #1: POCL", output)
+        self.assertIn("Platform #2: AMD", output)
+        self.assertIn("Device #3 [GPU]: Hawaii [GFXIP 7.0; GCN 1.1]", output)
+
+    def test_snapshot_is_reused(self):
+        self.check_clcc("-l")
+
+        def rename_device(platforms):
+            platforms[1]["devices"][0]["name"] = "Renamed"
+
+        self.edit_snapshot(rename_device)
+        self.assertIn("Device #1 [GPU]: Renamed", self.check_clcc("-l"))
+        output = self.check_clcc("--refresh-devices", "-l")
+        self.assertIn("Device #1 [GPU]: Tahiti", output)
+        self.assertNotIn("Renamed", output)
+
+    def test_refresh_devices(self):
+        self.check_clcc("-l")
+        environment = {"STUB_CL_OFFLINE_DEVICES": "6"}
+        self.assertNotIn("Device #6", self.check_clcc("-l", environment=environment))
+        self.assertIn("Device #6", self.check_clcc("--refresh-devices", "-l", environment=environment))
+
+    def test_driver_upgrade(self):
+        # The ICD file stays the same, the driver library it names changes
+        driver_path = self.write_file("drivers/libstubdriver.so", "driver")
+        self.write_file("vendors/stub.icd", driver_path + "\n")
+        self.environment["OCL_ICD_VENDORS"] = self.path("vendors")
+        self.check_clcc("-l")
+
+        def rename_device(platforms):
+            platforms[1]["devices"][0]["name"] = "Renamed"
+
+        self.edit_snapshot(rename_device)
+        self.assertIn("Device #1 [GPU]: Renamed", self.check_clcc("-l"))
+        driver_mtime = os.stat(driver_path).st_mtime + 10
+        os.utime(driver_path, (driver_mtime, driver_mtime))
+        output = self.check_clcc("-l")
+        self.assertIn("Device #1 [GPU]: Tahiti", output)
+        self.assertNotIn("Renamed", output)
+
+    def test_invalid_snapshot(self):
+        self.check_clcc("-l")
+        with open(self.path("cache", "clcc", "devices.json"), "w") as snapshot_file:
+            snapshot_file.write("{")
+        self.assertIn("Device #1 [GPU]: Tahiti", self.check_clcc("-l"))
+
+
+if __name__ == "__main__":
+    unittest.main()
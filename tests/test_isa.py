@@ -0,0 +1,164 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import struct
+import unittest
+
+from clcc.elf import ElfFile, SHT_NOTE
+from clcc.isa import extract_kernels, split_gcn_instructions, estimate_occupancy, format_listing, KernelCode
+from .stub import StubTestCase
+
+
+SHT_PROGBITS = 1
+SHT_STRTAB = 3
+STT_OBJECT = 1
+STT_FUNC = 2
+
+
+def _add_string(table, text):
+    offset = len(table)
+    table.extend(text.encode("utf8") + b"\0")
+    return offset
+
+
+def build_elf(sections, symbols=()):
+    # Relocatable 64-bit little-endian ELF file with the (name, type, data) sections, a symbol table of the
+    # (name, section name, offset, size, type) symbols, and the string tables
+    section_names = [name for name, section_type, section_data in sections]
+    strings = bytearray(b"\0")
+    symbol_table = bytearray(b"\0" * 24)
+    for name, section_name, value, size, symbol_type in symbols:
+        symbol_table += struct.pack("<IBBHQQ", _add_string(strings, name), symbol_type, 0, section_names.index(section_name) + 1, value, size)
+    sections = list(sections) + [(".symtab", 2, bytes(symbol_table)), (".strtab", SHT_STRTAB, bytes(strings))]
+    section_header_names = bytearray(b"\0")
+    name_offsets = [_add_string(section_header_names, name) for name, section_type, section_data in sections + [(".shstrtab", None, None)]]
+    sections.append((".shstrtab", SHT_STRTAB, bytes(section_header_names)))
+
+    data = bytearray(64)
+    section_headers = [struct.pack("<IIQQQQIIQQ", *([0] * 10))]
+    for index, (name, section_type, section_data) in enumerate(sections):
+        # The symbol table links to the string table after it
+        link = index + 2 if section_type == 2 else 0
+        section_headers.append(struct.pack("<IIQQQQIIQQ", name_offsets[index], section_type, 0, 0, len(data), len(section_data), link, 0, 1, 0))
+        data += section_data
+    section_headers_offset = len(data)
+    data += b"".join(section_headers)
+    data[0:64] = b"\x7fELF\x02\x01\x01" + b"\0" * 9 + struct.pack("<HHIQQQIHHHHHH",
+        1, 0, 1, 0, 0, section_headers_offset, 0, 64, 56, 0, 64, len(section_headers), len(section_headers) - 1)
+    return bytes(data)
+
+
+def build_note(name, note_type, description):
+    name_data = name.encode("ascii") + b"\0"
+    return struct.pack("<III", len(name_data), len(description), note_type) + \
+        name_data + b"\0" * (-len(name_data) % 4) + description + b"\0" * (-len(description) % 4)
+
+
+# s_mov_b32 s0, literal; v_add_f32 v0, literal, v0; v_mad_f32 (VOP3); s_endpgm
+GCN_ISA = struct.pack("<7I", 0xBE8000FF, 0x3F800000, 0x020000FF, 0x40000000, 0xD1C10000, 0x04020100, 0xBF810000)
+
+
+class TestElf(unittest.TestCase):
+    def test_sections_and_symbols(self):
+        elf = ElfFile(build_elf([(".text", SHT_PROGBITS, b"0123456789")], [("code", ".text", 2, 4, STT_FUNC)]))
+        self.assertFalse(elf.is_64bit is False)
+        self.assertEqual(bytes(elf.get_section_data(elf.get_section(".text"))), b"0123456789")
+        self.assertIsNone(elf.get_section(".data"))
+        symbol, = [symbol for symbol in elf.get_symbols() if symbol.name == "code"]
+        self.assertEqual(symbol.type, STT_FUNC)
+        self.assertEqual(bytes(elf.get_symbol_data(symbol)), b"2345")
+
+    def test_notes(self):
+        elf = ElfFile(build_elf([(".note", SHT_NOTE, build_note("AMD", 3, b"abcde") + build_note("X", 1, b""))]))
+        self.assertEqual([(note.name, note.type, bytes(note.description)) for note in elf.get_notes()], [("AMD", 3, b"abcde"), ("X", 1, b"")])
+
+    def test_invalid_files(self):
+        self.assertRaises(ValueError, ElfFile, b"STUBBIN:Tahiti")
+        data = build_elf([(".text", SHT_PROGBITS, b"code")])
+        self.assertRaises(ValueError, ElfFile, data[:-10])
+        elf = ElfFile(build_elf([(".text", SHT_PROGBITS, b"code")], [("code", ".text", 2, 8, STT_FUNC)]))
+        symbol, = [symbol for symbol in elf.get_symbols() if symbol.name == "code"]
+        self.assertRaises(ValueError, elf.get_symbol_data, symbol)
+
+    def test_invalid_symbol_table_link(self):
+        data = bytearray(build_elf([(".text", SHT_PROGBITS, b"code")], [("code", ".text", 0, 4, STT_FUNC)]))
+        # Point the sh_link of .symtab (the section header after .text) past the last section
+        section_headers_offset, = struct.unpack_from("<Q", data, 40)
+        struct.pack_into("<I", data, section_headers_offset + 2 * 64 + 40, 100)
+        elf = ElfFile(bytes(data))
+        with self.assertRaises(ValueError):
+            elf.get_symbols()
+        with self.assertRaises(ValueError):
+            extract_kernels(bytes(data))
+
+
+class TestKernels(unittest.TestCase):
+    def test_amd_app_binary(self):
+        proginfo = struct.pack("<4I", 0x80001041, 37, 0x80001042, 20)
+        image = build_elf([(".text", SHT_PROGBITS, GCN_ISA), (".note", SHT_NOTE, build_note("ATI CAL", 1, proginfo))])
+        il = b"mdef(0)_out(1)\nend\n\0"
+        metadata = b";ARGSTART:__OpenCL_scale_kernel\n;memory:hwlocal:2048\n;cws:64:2:1\n"
+        rodata = image + il + metadata
+        binary = build_elf([(".rodata", SHT_PROGBITS, rodata)], [
+            ("__OpenCL_scale_kernel", ".rodata", 0, len(image), STT_OBJECT),
+            ("__OpenCL_scale_amdil", ".rodata", len(image), len(il), STT_OBJECT),
+            ("__OpenCL_scale_metadata", ".rodata", len(image) + len(il), len(metadata), STT_OBJECT)])
+        kernel, = extract_kernels(binary)
+        self.assertEqual(kernel, KernelCode("scale", "mdef(0)_out(1)\nend\n", GCN_ISA, 37, 20, 2048, 128))
+
+    def test_code_object_v3(self):
+        descriptor = struct.pack("<I44xI12x", 4096, (2 << 6) | 7)
+        binary = build_elf([(".text", SHT_PROGBITS, GCN_ISA), (".rodata", SHT_PROGBITS, descriptor)], [
+            ("scale", ".text", 0, len(GCN_ISA), STT_FUNC), ("scale.kd", ".rodata", 0, len(descriptor), STT_OBJECT)])
+        kernel, = extract_kernels(binary)
+        self.assertEqual(kernel, KernelCode("scale", None, GCN_ISA, 32, 24, 4096, None))
+
+    def test_not_elf(self):
+        self.assertRaises(ValueError, extract_kernels, b"STUBBIN:Tahiti")
+
+
+class TestGcn(unittest.TestCase):
+    def test_split_instructions(self):
+        instructions = split_gcn_instructions(GCN_ISA, 8)
+        self.assertEqual([(offset, len(words)) for offset, words in instructions], [(0, 2), (8, 2), (16, 2), (24, 1)])
+        self.assertEqual(instructions[-1][1], (0xBF810000,))
+
+    def test_smem_and_smrd(self):
+        # s_load_dword is SMEM with a second word on GFXIP 8, and SMRD of one word on GFXIP 6
+        self.assertEqual(len(split_gcn_instructions(struct.pack("<2I", 0xC0020000, 0x00000010), 8)), 1)
+        self.assertEqual(len(split_gcn_instructions(struct.pack("<2I", 0xC2000104, 0xBF810000), 6)), 2)
+
+    def test_truncated_instruction(self):
+        self.assertEqual(split_gcn_instructions(struct.pack("<I", 0xD1C10000) + b"\0\0", 8), [(0, (0xD1C10000,))])
+
+    def test_occupancy(self):
+        self.assertEqual(estimate_occupancy(8, 24, None, None), 10)
+        self.assertEqual(estimate_occupancy(8, 128, None, None), 2)
+        self.assertEqual(estimate_occupancy(8, 24, 100, None), 7)
+        self.assertEqual(estimate_occupancy(6, 24, 100, None), 4)
+        self.assertEqual(estimate_occupancy(8, 24, 16, 32768), 2)
+        self.assertEqual(estimate_occupancy(8, 24, 16, 32768, 64), 0)
+        self.assertIsNone(estimate_occupancy(None, 24, 16, 0))
+        self.assertIsNone(estimate_occupancy(8, None, 16, 0))
+
+    def test_listing(self):
+        listing = format_listing([KernelCode("scale", "il text\n", GCN_ISA, 37, 20, 2048, None)], "#1 Tonga [GFXIP 8.0]", 8)
+        self.assertIn("; Device: #1 Tonga [GFXIP 8.0]", listing)
+        self.assertIn(";   VGPRs: 37", listing)
+        self.assertIn(";   Instructions: 4", listing)
+        self.assertIn("  000008: 020000FF 40000000", listing)
+        self.assertIn("; AMDIL\nil text\n", listing)
+
+
+class TestAssembly(StubTestCase):
+    def test_binaries_which_are_not_elf(self):
+        self.write_file("a.cl", "kernel void k(global float* x) { x[0] = 1.0f; }\n")
+        status, output = self.run_clcc("--platform", "2", "-S", "a.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("could not parse the binary for device #1 (Tahiti): program binary is not an ELF file", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
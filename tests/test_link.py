@@ -0,0 +1,57 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import unittest
+
+from .stub import StubTestCase
+
+
+FUNCTION = "float scale(float x) { return x * 2.0f; }\n"
+KERNEL = "float scale(float x);\nkernel void k(global float* x) { x[0] = scale(x[0]); }\n"
+
+
+class TestLink(StubTestCase):
+    def test_link_program(self):
+        self.write_file("scale.cl", FUNCTION)
+        self.write_file("kernel.cl", KERNEL)
+        output = self.check_clcc("--platform", "1", "--link", "--object-dir", "objects", "-o", "program.bin", "scale.cl", "kernel.cl")
+        self.assertIn("LINK  program.bin", output)
+        self.assertTrue(os.path.exists(self.path("objects", "scale.o")))
+        program = self.read_file("program.bin", "rb")
+        self.assertIn(FUNCTION.encode("ascii"), program)
+        self.assertIn(KERNEL.encode("ascii"), program)
+
+    def test_objects_are_compiled_incrementally(self):
+        self.write_file("scale.cl", FUNCTION)
+        self.write_file("kernel.cl", KERNEL)
+        args = ["--platform", "1", "--link", "--object-dir", "objects", "-o", "program.bin", "scale.cl", "kernel.cl"]
+        self.check_clcc(*args)
+        output = self.check_clcc(*args)
+        self.assertIn("UP-TO-DATE  scale.cl", output)
+        self.assertIn("UP-TO-DATE  kernel.cl", output)
+        self.write_file("scale.cl", FUNCTION.replace("2.0f", "3.0f"))
+        output = self.check_clcc(*args)
+        self.assertIn("OK    scale.cl", output)
+        self.assertIn("UP-TO-DATE  kernel.cl", output)
+        self.assertIn(b"3.0f", self.read_file("program.bin", "rb"))
+
+    def test_link_with_library(self):
+        self.write_file("scale.cl", FUNCTION)
+        self.write_file("kernel.cl", KERNEL)
+        self.check_clcc("--platform", "1", "--link", "--library", "-o", "scale.lib", "scale.cl")
+        self.check_clcc("--platform", "1", "--link", "-o", "program.bin", "kernel.cl", "scale.lib")
+        self.assertIn(FUNCTION.encode("ascii"), self.read_file("program.bin", "rb"))
+
+    def test_compile_failure_skips_link(self):
+        self.write_file("kernel.cl", "#error broken\n")
+        status, output = self.run_clcc("--platform", "1", "--link", "-o", "program.bin", "kernel.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("FAIL  kernel.cl", output)
+        self.assertFalse(os.path.exists(self.path("program.bin")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+from clcc import Session, ProgramLoader, Error
+from clcc.archive import ArchiveOutput
+from clcc.clcc import build_file
+from .stub import get_stub_library_dirname
+
+
+KERNEL = "kernel void k(global float* x) { x[0] = 1.0f; }\n"
+
+
+class FakeTarget:
+    def __init__(self, device_names):
+        self.device_names = device_names
+        self.device_infos = None
+
+
+class TestProgramLoader(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+        old_cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.dirname, "cache")
+        if old_cache_home is None:
+            self.addCleanup(os.environ.pop, "XDG_CACHE_HOME", None)
+        else:
+            self.addCleanup(os.environ.__setitem__, "XDG_CACHE_HOME", old_cache_home)
+        self.session = Session(platform="1", library_path=os.path.join(get_stub_library_dirname(), "libOpenCL.so"))
+        self.addCleanup(self.session.close)
+        self.source_path = self.write_file("k.cl", KERNEL)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.dirname, name)
+        with open(path, "wb") as data_file:
+            data_file.write(data.encode("utf8") if not isinstance(data, bytes) else data)
+        return path
+
+    def load(self, loader, *args, **kwargs):
+        loaded_program = loader.load(*args, **kwargs)
+        self.session.cl.release_program(loaded_program.program)
+        return loaded_program
+
+    def create_loader(self, **kwargs):
+        target = self.session.target
+        loader = ProgramLoader(self.session.cl, target.context, target.devices[0], **kwargs)
+        self.addCleanup(loader.close)
+        return loader
+
+    def build_file(self, source_path, flags):
+        binary_path = os.path.splitext(source_path)[0] + ".bin"
+        status, build_log = build_file(self.session.target, "build", source_path, [binary_path], [], flags)
+        self.assertEqual(status, 0)
+        return binary_path
+
+    def test_file_binary(self):
+        binary_path = self.build_file(self.source_path, "-DN=1")
+        loader = self.create_loader()
+        self.assertEqual(self.load(loader, KERNEL, "-DN=1", filename=self.source_path, binary_path=binary_path).origin, "file")
+        # Binaries of other flags or sources are stale
+        self.assertEqual(self.load(loader, KERNEL, "-DN=2", filename=self.source_path, binary_path=binary_path).origin, "source")
+        self.assertEqual(self.load(loader, KERNEL + " ", "-DN=1", filename=self.source_path, binary_path=binary_path).origin, "source")
+
+    def test_file_binary_without_stamp(self):
+        binary_path = self.write_file("k.bin", bytes(self.session.compile(KERNEL).binary))
+        loader = self.create_loader()
+        self.assertEqual(self.load(loader, KERNEL, filename=self.source_path, binary_path=binary_path).origin, "source")
+
+    def test_header_change(self):
+        self.write_file("common.h", "#define SCALE 2.0f\n")
+        source_code = "#include \"common.h\"\n" + KERNEL
+        source_path = self.write_file("scaled.cl", source_code)
+        binary_path = self.build_file(source_path, "")
+        archive_path = os.path.join(self.dirname, "kernels.clar")
+        archive = ArchiveOutput(archive_path)
+        archive.add(FakeTarget(self.session.target.device_names), source_path, "", source_code, [os.path.join(self.dirname, "common.h")],
+            [bytes(self.session.compile(source_code, filename=source_path).binary)])
+        archive.finish()
+        loader = self.create_loader(archive_path=archive_path)
+        self.assertEqual(self.load(loader, source_code, filename=source_path, binary_path=binary_path).origin, "file")
+        self.assertEqual(self.load(loader, source_code, filename=source_path).origin, "archive")
+        self.write_file("common.h", "#define SCALE 3.0f\n")
+        self.assertEqual(self.load(loader, source_code, filename=source_path, binary_path=binary_path).origin, "source")
+        self.assertEqual(self.load(loader, source_code, filename=source_path).origin, "source")
+
+    def test_rejected_binary(self):
+        binary_path = self.write_file("k.bin", b"not a binary")
+        loader = self.create_loader()
+        self.assertEqual(self.load(loader, KERNEL, filename=self.source_path, binary_path=binary_path).origin, "source")
+
+    def test_archive_binary(self):
+        archive_path = os.path.join(self.dirname, "kernels.clar")
+        archive = ArchiveOutput(archive_path)
+        archive.add(FakeTarget(self.session.target.device_names), self.source_path, "-DN=1", KERNEL, [], [bytes(self.session.compile(KERNEL).binary)])
+        archive.finish()
+        loader = self.create_loader(archive_path=archive_path)
+        self.assertEqual(self.load(loader, KERNEL, "-DN=1", filename=self.source_path).origin, "archive")
+        self.assertEqual(self.load(loader, KERNEL, "-DN=2", filename=self.source_path).origin, "source")
+        self.assertEqual(self.load(loader, KERNEL + " ", "-DN=1", filename=self.source_path).origin, "source")
+
+    def test_invalid_archive_is_ignored(self):
+        archive_path = self.write_file("kernels.clar", b"garbage")
+        loader = self.create_loader(archive_path=archive_path)
+        self.assertIsNone(loader.archive)
+        self.assertEqual(self.load(loader, KERNEL, filename=self.source_path).origin, "source")
+
+    def test_cache_binary(self):
+        loader = self.create_loader(cache_dir=os.path.join(self.dirname, "compile-cache"))
+        self.assertEqual(self.load(loader, KERNEL, filename=self.source_path).origin, "source")
+        self.assertEqual(self.load(loader, KERNEL, filename=self.source_path).origin, "cache")
+
+    def test_source_build_failure(self):
+        loader = self.create_loader()
+        self.assertRaises(Error, loader.load, "#error broken\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
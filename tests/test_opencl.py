@@ -0,0 +1,50 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import sys
+import ctypes.util
+import unittest
+
+from clcc.opencl import OpenCL
+from clcc.report import Error
+from .stub import StubTestCase, get_stub_library_dirname
+
+
+class TestEntryPoints(unittest.TestCase):
+    def test_entry_points_are_resolved_on_first_use(self):
+        cl = OpenCL(os.path.join(get_stub_library_dirname(), "libOpenCL.so"))
+        self.assertNotIn("_build_program", vars(cl))
+        build_program = cl._build_program
+        self.assertIs(vars(cl)["_build_program"], build_program)
+        self.assertEqual(build_program.restype, ctypes.c_int32)
+        self.assertRaises(AttributeError, getattr, cl, "_no_such_function")
+
+    def test_missing_entry_points(self):
+        # The C library exports no OpenCL functions: optional ones are None, required ones raise
+        libc_path = ctypes.util.find_library("c")
+        if libc_path is None:
+            raise unittest.SkipTest("C library not found")
+        cl = OpenCL(libc_path)
+        self.assertIsNone(cl._compile_program)
+        self.assertIsNone(cl._create_program_with_il)
+        self.assertRaises(Error, getattr, cl, "_build_program")
+
+
+class TestStartup(StubTestCase):
+    def test_client_imports(self):
+        # The client of the compile server must start without the OpenCL bindings and the modules of other features
+        if sys.version_info < (3, 7):
+            raise unittest.SkipTest("the package imports its public names eagerly before Python 3.7")
+        status, output = self.run_python(["-c", "import sys, clcc.client; print(' '.join(sorted(sys.modules)))"])
+        self.assertEqual(status, 0, output)
+        modules = output.split()
+        self.assertIn("clcc.frontend", modules)
+        for module in ["clcc.clcc", "clcc.opencl", "clcc.target", "clcc.archive", "clcc.bench", "ctypes"]:
+            self.assertNotIn(module, modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
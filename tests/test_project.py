@@ -0,0 +1,180 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from clcc.project import load_manifest, ProjectState, ProjectKernel, DEFAULT_STATE_FILENAME
+from clcc.report import Error
+from .stub import StubTestCase
+
+
+KERNEL = "kernel void scale(global float* x) { x[get_global_id(0)] *= 2.0f; }\n"
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+
+    def write_manifest(self, manifest, name="clcc.json"):
+        path = os.path.join(self.dirname, name)
+        with open(path, "w") as manifest_file:
+            if isinstance(manifest, dict):
+                json.dump(manifest, manifest_file)
+            else:
+                manifest_file.write(manifest)
+        return path
+
+    def test_settings(self):
+        path = self.write_manifest({
+            "flags": "-DN=4",
+            "platform": 2,
+            "include": "include",
+            "kernels": ["a.cl", {"source": "src/b.cl", "output": "out/{name}.{device}.bin", "devices": "all", "std": 2.0, "flags": ""}],
+            "state": "build/state.json"
+        })
+        kernels, state_filename = load_manifest(path)
+        include_dirname = os.path.join(self.dirname, "include")
+        self.assertEqual(kernels, [
+            ProjectKernel(os.path.join(self.dirname, "a.cl"), None, "-DN=4", "2", "1", [include_dirname], None),
+            ProjectKernel(os.path.join(self.dirname, "src/b.cl"), os.path.join(self.dirname, "out/{name}.{device}.bin"), "", "2", "all",
+                          [include_dirname], "2.0")])
+        self.assertEqual(state_filename, os.path.join(self.dirname, "build/state.json"))
+
+    def test_default_state(self):
+        kernels, state_filename = load_manifest(self.write_manifest({"kernels": []}))
+        self.assertEqual(kernels, [])
+        self.assertEqual(state_filename, os.path.join(self.dirname, DEFAULT_STATE_FILENAME))
+
+    def test_invalid_manifests(self):
+        for manifest in ["{\"kernels\": [", "[]", {"kernels": "a.cl"}, {"kernels": [], "output": "x", "jobs": 2},
+                         {"kernels": [{"source": "a.cl", "define": "N"}]}, {"kernels": [{"output": "a.bin"}]},
+                         {"kernels": ["a.cl"], "std": "3.0"}]:
+            self.assertRaises(Error, load_manifest, self.write_manifest(manifest))
+
+    def test_toml(self):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli
+            except ImportError:
+                raise unittest.SkipTest("TOML manifests require Python 3.11 or tomli")
+        path = self.write_manifest("flags = \"-DN=4\"\n\n[[kernels]]\nsource = \"a.cl\"\ndevices = \"all\"\n", "clcc.toml")
+        kernels, _ = load_manifest(path)
+        self.assertEqual([(kernel.source, kernel.flags, kernel.devices) for kernel in kernels], [(os.path.join(self.dirname, "a.cl"), "-DN=4", "all")])
+        self.assertRaises(Error, load_manifest, self.write_manifest("kernels = [", "broken.toml"))
+
+
+class TestProjectState(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+        self.state_path = os.path.join(self.dirname, "state.json")
+        self.outputs = [os.path.join(self.dirname, name) for name in ["a.bin", "b.bin"]]
+        for output_filename in self.outputs:
+            with open(output_filename, "wb") as output_file:
+                output_file.write(b"binary")
+
+    def test_record_and_save(self):
+        state = ProjectState(self.state_path)
+        self.assertFalse(state.is_current(self.outputs[0], "key"))
+        state.record(self.outputs[0], "key")
+        state.record(self.outputs[1], "other")
+        self.assertTrue(state.is_current(self.outputs[0], "key"))
+        self.assertFalse(state.is_current(self.outputs[0], "other"))
+        state.save(self.outputs[:1])
+
+        state = ProjectState(self.state_path)
+        self.assertTrue(state.is_current(self.outputs[0], "key"))
+        self.assertFalse(state.is_current(self.outputs[1], "other"))
+        with open(self.state_path) as state_file:
+            self.assertEqual(list(json.load(state_file)["outputs"]), ["a.bin"])
+
+    def test_changed_or_missing_output(self):
+        state = ProjectState(self.state_path)
+        state.record(self.outputs[0], "key")
+        state.record(self.outputs[1], "key")
+        with open(self.outputs[0], "ab") as output_file:
+            output_file.write(b"truncated?")
+        os.remove(self.outputs[1])
+        self.assertFalse(state.is_current(self.outputs[0], "key"))
+        self.assertFalse(state.is_current(self.outputs[1], "key"))
+
+    def test_forget_output(self):
+        state = ProjectState(self.state_path)
+        state.record(self.outputs[0], "key")
+        state.record(self.outputs[0], None)
+        self.assertFalse(state.is_current(self.outputs[0], "key"))
+
+    def test_invalid_state(self):
+        for text in ["{", "[]", json.dumps({"version": 0, "outputs": {"a.bin": {"key": "key", "size": 6}}})]:
+            with open(self.state_path, "w") as state_file:
+                state_file.write(text)
+            self.assertFalse(ProjectState(self.state_path).is_current(self.outputs[0], "key"))
+
+
+class TestProjectBuilds(StubTestCase):
+    def setUp(self):
+        StubTestCase.setUp(self)
+        self.write_file("include/common.h", "#define SCALE 2.0f\n")
+        self.write_file("a.cl", KERNEL)
+        self.write_file("src/b.cl", "#include \"common.h\"\n" + KERNEL)
+        self.write_file("clcc.json", json.dumps({
+            "platform": 2,
+            "include": "include",
+            "kernels": [
+                {"source": "a.cl", "platform": 1},
+                {"source": "src/b.cl", "output": "out/{name}.{device}.bin", "devices": "1,2"}
+            ]
+        }))
+
+    def test_incremental_builds(self):
+        output = self.check_clcc("--project", "clcc.json")
+        self.assertIn("3 outputs built, 0 up to date, 0 failed", output)
+        self.assertTrue(self.read_file("a.bin", "rb").startswith(b"STUBBIN:pthread"))
+        self.assertTrue(self.read_file("out/b.2.bin", "rb").startswith(b"STUBBIN:Pitcairn"))
+        self.assertTrue(os.path.exists(self.path(DEFAULT_STATE_FILENAME)))
+
+        output = self.check_clcc("--project", "clcc.json")
+        self.assertIn("0 outputs built, 3 up to date, 0 failed", output)
+
+        self.write_file("include/common.h", "#define SCALE 3.0f\n")
+        output = self.check_clcc("--project", "clcc.json")
+        self.assertIn("2 outputs built, 1 up to date, 0 failed", output)
+        self.assertNotIn("a.cl", output)
+
+        output = self.check_clcc("--project", "clcc.json", "--rebuild")
+        self.assertIn("3 outputs built, 0 up to date, 0 failed", output)
+
+    def test_failure_is_rebuilt(self):
+        self.write_file("a.cl", "#error broken\n")
+        status, output = self.run_clcc("--project", "clcc.json")
+        self.assertEqual(status, 1)
+        self.assertIn("FAIL  a.cl (device #1", output)
+        self.assertIn("2 outputs built, 0 up to date, 1 failed", output)
+
+        self.write_file("a.cl", KERNEL)
+        output = self.check_clcc("--project", "clcc.json")
+        self.assertIn("1 outputs built, 2 up to date, 0 failed", output)
+
+    def test_conflicting_outputs(self):
+        self.write_file("clcc.json", json.dumps({"platform": 2, "output": "kernel.bin", "kernels": ["a.cl", "src/b.cl"]}))
+        status, output = self.run_clcc("--project", "clcc.json")
+        self.assertEqual(status, 1)
+        self.assertIn("several kernel builds write output kernel.bin", output)
+
+    def test_inputs_with_project(self):
+        status, output = self.run_clcc("--project", "clcc.json", "a.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("input files can not be combined with --project", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
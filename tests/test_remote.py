@@ -0,0 +1,110 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import unittest
+import subprocess
+
+from clcc.remote import create_bundle, extract_bundle, BuilderPool
+from clcc.report import Error
+from .stub import StubTestCase, root_dirname
+
+
+def get_free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+class TestBundle(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+        os.makedirs(os.path.join(self.dirname, "src", "include"))
+        with open(os.path.join(self.dirname, "src", "include", "common.h"), "w") as header_file:
+            header_file.write("#define SCALE 2.0f\n")
+
+    def test_round_trip(self):
+        input_filename = os.path.join(self.dirname, "src", "a.cl")
+        include_dirname = os.path.join(self.dirname, "src", "include")
+        source_code = "#include \"common.h\"\nkernel void k(global float* x) { x[0] = SCALE; }\n"
+        request, payload = create_bundle(input_filename, source_code, [include_dirname])
+        self.assertEqual(request["input"], input_filename)
+        self.assertEqual(request["files"], [(os.path.join(include_dirname, "common.h"), 19)])
+        self.assertEqual(request["source_size"], len(source_code))
+        self.assertEqual(b"".join(payload), source_code.encode("utf8") + b"#define SCALE 2.0f\n")
+
+        bundle_dirname = os.path.join(self.dirname, "bundle")
+        files = [(request["files"][0][0], payload[1])]
+        bundle_input_filename, bundle_include_paths = extract_bundle(bundle_dirname, request["input"], source_code,
+            request["include"], files, cwd=request["cwd"])
+        self.assertTrue(bundle_input_filename.startswith(os.path.join(bundle_dirname, "")))
+        self.assertTrue(bundle_input_filename.endswith(os.path.join("src", "a.cl")))
+        self.assertEqual(len(bundle_include_paths), 2)
+        with open(os.path.join(bundle_include_paths[0], "common.h")) as header_file:
+            self.assertEqual(header_file.read(), "#define SCALE 2.0f\n")
+
+    def test_path_outside_bundle(self):
+        bundle_dirname = os.path.join(self.dirname, "bundle")
+        self.assertRaises(Error, extract_bundle, bundle_dirname, "/src/a.cl", "", [], [("/src/../../escape.h", b"")])
+
+    def test_unavailable_builder(self):
+        self.assertRaises(Error, BuilderPool, ["127.0.0.1:%d" % get_free_port()], "1", "1", connect_timeout=1.0)
+        self.assertRaises(Error, BuilderPool, ["host:port"], "1", "1")
+
+
+class TestRemoteBuilds(StubTestCase):
+    def setUp(self):
+        StubTestCase.setUp(self)
+        self.address = "127.0.0.1:%d" % get_free_port()
+        with open(os.devnull, "w") as devnull:
+            builder = subprocess.Popen([sys.executable, os.path.join(root_dirname, "bin", "clcc"), "--server", "--listen", self.address],
+                                       env=self.environment, cwd=self.dirname, stdout=devnull, stderr=devnull)
+        self.addCleanup(builder.wait)
+        self.addCleanup(builder.terminate)
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", int(self.address.split(":")[1])), 1.0).close()
+                break
+            except socket.error:
+                time.sleep(0.05)
+        else:
+            self.fail("builder did not start")
+
+    def test_build_with_headers(self):
+        self.write_file("include/common.h", "#define SCALE 2.0f\n")
+        self.write_file("a.cl", "#include \"common.h\"\nkernel void k(global float* x) { x[0] = SCALE; }\n")
+        self.write_file("b.cl", "#warning remote\nkernel void k(global float* x) { x[0] = 1.0f; }\n")
+        output = self.check_clcc("--platform", "2", "-d", "2", "--remote", self.address, "-I", "include", "a.cl", "b.cl")
+        self.assertIn("warning: stub build warning", output)
+        self.assertIn("2 files compiled, 0 failed", output)
+        self.assertTrue(self.read_file("a.bin", "rb").startswith(b"STUBBIN:Pitcairn"))
+        # Stamps do not depend on the paths of the headers on the builder
+        remote_stamp = self.read_file("a.bin.stamp")
+        self.check_clcc("--platform", "2", "-d", "2", "--no-server", "-I", "include", "a.cl")
+        self.assertEqual(self.read_file("a.bin.stamp"), remote_stamp)
+
+    def test_missing_input_fails_without_fallback(self):
+        status, output = self.run_clcc("--platform", "1", "--remote", self.address, "missing.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("No such file or directory", output)
+
+    def test_builder_without_target(self):
+        self.write_file("a.cl", "kernel void k(global float* x) { x[0] = 1.0f; }\n")
+        status, output = self.run_clcc("--platform", "2", "-d", "9", "--remote", self.address, "a.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("no builder has platform 2 and device 9", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
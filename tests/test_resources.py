@@ -0,0 +1,63 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import json
+import unittest
+
+from clcc.resources import parse_nv_verbose_log
+from .stub import StubTestCase
+
+
+NV_VERBOSE_LOG = """ptxas info    : 0 bytes gmem
+ptxas info    : Compiling entry function 'scale' for 'sm_52'
+ptxas info    : Function properties for scale
+    0 bytes stack frame, 8 bytes spill stores, 12 bytes spill loads
+ptxas info    : Used 32 registers, 344 bytes cmem[0]
+ptxas info    : Compiling entry function 'copy' for 'sm_52'
+ptxas info    : Function properties for copy
+    0 bytes stack frame, 0 bytes spill stores, 0 bytes spill loads
+ptxas info    : Used 6 registers, 336 bytes cmem[0]
+"""
+
+KERNELS = "kernel void first(global float* x) { x[0] = 1.0f; }\nkernel void second(global float* x) { x[0] = 2.0f; }\n"
+
+
+class TestNvVerboseLog(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_nv_verbose_log(NV_VERBOSE_LOG), {
+            "scale": {"registers": 32, "spill_stores": 8, "spill_loads": 12},
+            "copy": {"registers": 6, "spill_stores": 0, "spill_loads": 0}})
+
+    def test_other_logs(self):
+        self.assertEqual(parse_nv_verbose_log("warning: unused variable\n"), {})
+
+
+class TestResourceReport(StubTestCase):
+    def test_json_report_of_all_devices(self):
+        self.write_file("a.cl", KERNELS)
+        self.check_clcc("--platform", "2", "-d", "1,3", "--resource-json", "resources.json", "a.cl")
+        kernels = json.loads(self.read_file("resources.json"))
+        self.assertEqual([(kernel["device_name"], kernel["kernel"]) for kernel in kernels],
+                         [("Tahiti", "first"), ("Tahiti", "second"), ("Hawaii", "first"), ("Hawaii", "second")])
+        self.assertEqual(kernels[0]["file"], "a.cl")
+        self.assertEqual(kernels[0]["compile_work_group_size"], [0, 0, 0])
+        self.assertIsNone(kernels[0]["spill_mem_size"])
+
+    def test_table_with_cache_hits(self):
+        self.write_file("a.cl", KERNELS)
+        args = ["--platform", "1", "--cache-dir", "compile-cache", "--resource-report", "a.cl"]
+        self.check_clcc(*args)
+        output = self.check_clcc(*args)
+        rows = [line.split() for line in output.splitlines() if line.startswith("a.cl")]
+        self.assertEqual([row[-7] for row in rows], ["first", "second"])
+
+    def test_ignored_without_program_build(self):
+        self.write_file("a.cl", KERNELS)
+        output = self.check_clcc("--platform", "1", "-c", "--resource-report", "a.cl")
+        self.assertIn("option --resource-report requires a program build and is ignored due to -c", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import sys
+import time
+import socket
+import threading
+import unittest
+import subprocess
+
+from clcc.server import send_message, receive_message, request_build, parse_builder_address, DEFAULT_BUILDER_PORT, \
+    PROTOCOL_VERSION
+from .stub import StubTestCase, root_dirname
+
+
+class TestMessages(unittest.TestCase):
+    def setUp(self):
+        if not hasattr(socket, "socketpair"):
+            raise unittest.SkipTest("socket.socketpair is not available")
+        self.client_socket, self.server_socket = socket.socketpair()
+        self.addCleanup(self.client_socket.close)
+        self.addCleanup(self.server_socket.close)
+
+    def test_header_only(self):
+        send_message(self.client_socket, {"type": "describe"})
+        header, payload = receive_message(self.server_socket)
+        self.assertEqual(header, {"type": "describe", "payload_size": None})
+        self.assertIsNone(payload)
+
+    def test_payload_chunks(self):
+        send_message(self.client_socket, {"binary_sizes": [3, 0, 4]}, [b"abc", b"", bytearray(b"defg")])
+        header, payload = receive_message(self.server_socket)
+        self.assertEqual(header["payload_size"], 7)
+        self.assertEqual(bytes(payload), b"abcdefg")
+
+    def test_large_payload(self):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        sender = threading.Thread(target=send_message, args=(self.client_socket, {}, data))
+        sender.start()
+        header, payload = receive_message(self.server_socket)
+        sender.join()
+        self.assertEqual(bytes(payload), data)
+
+    def test_closed_connection(self):
+        send_message(self.client_socket, {}, b"data")
+        self.client_socket.close()
+        receive_message(self.server_socket)
+        self.assertRaises(EOFError, receive_message, self.server_socket)
+
+    def test_request_build(self):
+        def serve():
+            request, payload = receive_message(self.server_socket)
+            self.assertEqual(request["version"], PROTOCOL_VERSION)
+            self.assertEqual(bytes(payload).decode("utf8"), "kernel void k() {}")
+            send_message(self.server_socket, {"status": 0, "log": "", "device_ids": [1, 2], "prebuilt_key": "key", "binary_sizes": [2, 3]}, b"d1d22")
+
+        server = threading.Thread(target=serve)
+        server.start()
+        status, build_log, binaries, device_ids, prebuilt_key = request_build(self.client_socket, {"command": "build"}, "kernel void k() {}")
+        server.join()
+        self.assertEqual((status, build_log, device_ids, prebuilt_key), (0, "", [1, 2], "key"))
+        self.assertEqual([bytes(binary) for binary in binaries], [b"d1", b"d22"])
+
+    def test_request_build_error(self):
+        def serve():
+            receive_message(self.server_socket)
+            send_message(self.server_socket, {"error": "no such platform"})
+
+        server = threading.Thread(target=serve)
+        server.start()
+        self.assertIsNone(request_build(self.client_socket, {"command": "build"}, ""))
+        server.join()
+
+
+class TestBuilderAddress(unittest.TestCase):
+    def test_parse_builder_address(self):
+        self.assertEqual(parse_builder_address("host"), ("host", DEFAULT_BUILDER_PORT))
+        self.assertEqual(parse_builder_address("host:1234"), ("host", 1234))
+        self.assertEqual(parse_builder_address("[::1]:1234"), ("::1", 1234))
+        self.assertEqual(parse_builder_address("[::1]"), ("::1", DEFAULT_BUILDER_PORT))
+        self.assertRaises(ValueError, parse_builder_address, "host:port")
+
+
+class TestCompileServer(StubTestCase):
+    def setUp(self):
+        StubTestCase.setUp(self)
+        self.environment["CLCC_SERVER_SOCKET"] = self.path("server.sock")
+        with open(os.devnull, "w") as devnull:
+            server = subprocess.Popen([sys.executable, os.path.join(root_dirname, "bin", "clcc"), "--server"],
+                                      env=self.environment, cwd=self.dirname, stdout=devnull, stderr=devnull)
+        self.addCleanup(server.wait)
+        self.addCleanup(server.terminate)
+        for _ in range(100):
+            if os.path.exists(self.path("server.sock")):
+                break
+            time.sleep(0.05)
+        else:
+            self.fail("compile server did not start")
+
+    def test_build_through_server(self):
+        self.write_file("a.cl", "kernel void k(global float* x) { x[0] = 1.0f; }\n")
+        self.write_file("b.cl", "#warning careful\nkernel void k(global float* x) { x[0] = 2.0f; }\n")
+        output = self.check_clcc("--platform", "1", "--time-report", "a.cl", "b.cl")
+        self.assertIn("server request", output)
+        self.assertNotIn("build program", output)
+        self.assertIn("b.cl:\n", output)
+        self.assertIn("2 files compiled, 0 failed", output)
+        self.assertTrue(self.read_file("a.bin", "rb").startswith(b"STUBBIN:"))
+        # Outputs of the server have the same stamps as outputs of in-process builds
+        server_stamp = self.read_file("a.bin.stamp")
+        self.check_clcc("--platform", "1", "--no-server", "a.cl")
+        self.assertEqual(self.read_file("a.bin.stamp"), server_stamp)
+
+    def test_inputs_without_result_are_built_in_process(self):
+        self.write_file("a.cl", "kernel void k(global float* x) { x[0] = 1.0f; }\n")
+        status, output = self.run_clcc("--platform", "1", "a.cl", "missing.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("No such file or directory", output)
+        self.assertIn("OK    a.cl -> a.bin", output)
+        self.assertIn("FAIL  missing.cl", output)
+        self.assertIn("1 files compiled, 1 failed", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+from clcc import Session, Error
+from .stub import get_stub_library_dirname
+
+
+KERNEL = "kernel void k(global float* x) { x[0] = 1.0f; }\n"
+
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.library_path = os.path.join(get_stub_library_dirname(), "libOpenCL.so")
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+        # The device inventory snapshot goes to a temporary cache directory
+        old_cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.dirname, "cache")
+        if old_cache_home is None:
+            self.addCleanup(os.environ.pop, "XDG_CACHE_HOME", None)
+        else:
+            self.addCleanup(os.environ.__setitem__, "XDG_CACHE_HOME", old_cache_home)
+
+    def test_compile(self):
+        with Session(platform="1", library_path=self.library_path) as session:
+            self.assertEqual(list(session.device_ids), [1])
+            result = session.compile(KERNEL)
+            self.assertEqual(result.status, 0)
+            self.assertTrue(bytes(result.binary).startswith(b"STUBBIN:"))
+            result = session.compile("#error broken\n")
+            self.assertNotEqual(result.status, 0)
+            self.assertIn("stub build failure", result.log)
+            self.assertIsNone(result.binaries)
+
+    def test_several_devices(self):
+        with Session(platform="2", device="all", library_path=self.library_path, refresh_devices=True) as session:
+            result = session.compile(KERNEL, flags="-DN=4")
+            self.assertEqual(len(result.binaries), len(session.device_ids))
+            self.assertTrue(bytes(result.binaries[1]).startswith(b"STUBBIN:Pitcairn"))
+
+    def test_compile_file_with_includes(self):
+        with open(os.path.join(self.dirname, "common.h"), "w") as header_file:
+            header_file.write("#define N 4\n")
+        source_path = os.path.join(self.dirname, "kernel.cl")
+        with open(source_path, "w") as source_file:
+            source_file.write("#include \"common.h\"\n" + KERNEL)
+        with Session(platform="1", library_path=self.library_path) as session:
+            self.assertEqual(session.compile_file(source_path, command="compile").status, 0)
+
+    def test_cache(self):
+        cache_dirname = os.path.join(self.dirname, "compile-cache")
+        with Session(platform="1", library_path=self.library_path, cache_dir=cache_dirname) as session:
+            first_result = session.compile(KERNEL)
+            second_result = session.compile(KERNEL)
+            self.assertEqual((session.cache.hits, session.cache.misses), (1, 1))
+        self.assertEqual(bytes(first_result.binary), bytes(second_result.binary))
+
+    def test_compile_async(self):
+        try:
+            import concurrent.futures
+        except ImportError:
+            raise unittest.SkipTest("concurrent.futures is not available")
+        with Session(platform="1", library_path=self.library_path) as session:
+            futures = [session.compile_async(KERNEL.replace("1.0f", "%d.0f" % index)) for index in range(4)]
+            results = [future.result() for future in futures]
+        self.assertEqual([result.status for result in results], [0] * 4)
+        self.assertIn(b"3.0f", bytes(results[3].binary))
+
+    def test_invalid_platform(self):
+        self.assertRaises(Error, Session, platform="7", library_path=self.library_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import struct
+import shutil
+import tempfile
+import unittest
+
+from clcc import Session, SpirvModule, Error
+from clcc.spirv import is_spirv
+from clcc.frontend import read_source
+from clcc.includes import scan_includes
+from .stub import StubTestCase, get_stub_library_dirname
+
+
+KERNEL = "kernel void k(global float* x) { x[0] = 1.0f; }\n"
+
+# Header of a SPIR-V 1.0 module: magic, version, generator, bound, schema
+MODULE = SpirvModule(struct.pack("<5I", 0x07230203, 0x00010000, 0, 8, 0))
+
+
+class TestSpirv(unittest.TestCase):
+    def test_is_spirv(self):
+        self.assertTrue(is_spirv(MODULE))
+        self.assertTrue(is_spirv(struct.pack(">I", 0x07230203)))
+        self.assertFalse(is_spirv(b"\x03\x02"))
+        self.assertFalse(is_spirv(KERNEL.encode("utf8")))
+
+    def test_module_encodes_to_itself(self):
+        self.assertEqual(MODULE.encode("utf8"), bytes(MODULE))
+        self.assertIs(type(MODULE.encode()), bytes)
+
+    def test_read_source(self):
+        dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, dirname, True)
+        module_path = os.path.join(dirname, "kernel.spv")
+        with open(module_path, "wb") as module_file:
+            module_file.write(MODULE)
+        source_path = os.path.join(dirname, "kernel.cl")
+        with open(source_path, "w") as source_file:
+            source_file.write(KERNEL)
+        module = read_source(module_path)
+        self.assertIsInstance(module, SpirvModule)
+        self.assertEqual(module, MODULE)
+        self.assertEqual(read_source(source_path), KERNEL)
+
+    def test_modules_have_no_includes(self):
+        self.assertEqual(scan_includes("kernel.spv", SpirvModule(b"\x03\x02\x23\x07#include \"missing.h\"\n"), []), [])
+
+
+class TestSpirvBuilds(unittest.TestCase):
+    def setUp(self):
+        library_path = os.path.join(get_stub_library_dirname(), "libOpenCL.so")
+        dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, dirname, True)
+        old_cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(dirname, "cache")
+        if old_cache_home is None:
+            self.addCleanup(os.environ.pop, "XDG_CACHE_HOME", None)
+        else:
+            self.addCleanup(os.environ.__setitem__, "XDG_CACHE_HOME", old_cache_home)
+        self.session = Session(platform="1", library_path=library_path)
+        self.addCleanup(self.session.close)
+
+    def test_module_is_created_from_il(self):
+        result = self.session.compile(MODULE, filename="kernel.spv")
+        self.assertEqual(result.status, 0)
+        self.assertIn(b"// SPIR-V module, 20 bytes", bytes(result.binary))
+
+    def test_library_without_il_support(self):
+        self.session.cl._create_program_with_il = None
+        with self.assertRaises(Error) as context:
+            self.session.compile(MODULE, filename="kernel.spv")
+        self.assertIn("does not support IL programs", str(context.exception))
+
+
+class TestSpirvInputs(StubTestCase):
+    def test_build_module(self):
+        with open(self.path("module.spv"), "wb") as module_file:
+            module_file.write(MODULE)
+        self.write_file("kernel.cl", KERNEL)
+        output = self.check_clcc("--platform", "1", "module.spv", "kernel.cl")
+        self.assertIn("2 files compiled, 0 failed", output)
+        self.assertIn(b"// SPIR-V module, 20 bytes", self.read_file("module.bin", "rb"))
+
+    def test_invalid_module(self):
+        # The stub accepts only modules in its own byte order
+        with open(self.path("kernel.spv"), "wb") as module_file:
+            module_file.write(struct.pack(">5I", 0x07230203, 0x00010000, 0, 8, 0))
+        status, output = self.run_clcc("--platform", "1", "kernel.spv")
+        self.assertEqual(status, 1)
+        self.assertIn("could not create program from IL", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from clcc.sweep import parse_sweep_option, load_sweep_file, expand_grid, get_variant_flags, deduplicate_variants
+from clcc.report import Error
+from .stub import StubTestCase
+
+
+class TestSweep(unittest.TestCase):
+    def write_sweep_file(self, name, grid):
+        dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, dirname, True)
+        path = os.path.join(dirname, name)
+        with open(path, "w") as sweep_file:
+            sweep_file.write(grid if isinstance(grid, str) else json.dumps(grid))
+        return path
+
+    def test_parse_sweep_option(self):
+        self.assertEqual(parse_sweep_option("TILE = 8, 16,32"), ("TILE", ["8", "16", "32"]))
+        self.assertRaises(Error, parse_sweep_option, "TILE")
+        self.assertRaises(Error, parse_sweep_option, "=8")
+
+    def test_expand_grid(self):
+        self.assertEqual(expand_grid([("A", [1, 2]), ("B", ["x", "y"])]),
+                         [[("A", 1), ("B", "x")], [("A", 1), ("B", "y")], [("A", 2), ("B", "x")], [("A", 2), ("B", "y")]])
+        self.assertEqual(expand_grid([]), [[]])
+
+    def test_variant_flags(self):
+        self.assertEqual(get_variant_flags([("B", 2), ("A", "x")]), "-DA=x -DB=2")
+        self.assertEqual(get_variant_flags([("ON", True), ("OFF", False), ("FLAG", None)]), "-DFLAG -DON")
+
+    def test_deduplicate_variants(self):
+        variants = [[("A", 1), ("B", 2)], [("B", 2), ("A", 1)], [("A", 2), ("B", 2)], [("A", 1), ("B", 2), ("C", False)]]
+        variant_flags, first_variants = deduplicate_variants(variants)
+        self.assertEqual(variant_flags, ["-DA=1 -DB=2", "-DA=1 -DB=2", "-DA=2 -DB=2", "-DA=1 -DB=2"])
+        self.assertEqual(first_variants, [0, 0, 2, 0])
+
+    def test_load_grid_file(self):
+        variants = load_sweep_file(self.write_sweep_file("grid.json", {"B": [1, 2], "A": 8}))
+        self.assertEqual(variants, [[("A", 8), ("B", 1)], [("A", 8), ("B", 2)]])
+
+    def test_load_variant_list_file(self):
+        variants = load_sweep_file(self.write_sweep_file("variants.json", [{"B": 1, "A": 2}, {"C": True}]))
+        self.assertEqual(variants, [[("A", 2), ("B", 1)], [("C", True)]])
+
+    def test_invalid_sweep_files(self):
+        self.assertRaises(Error, load_sweep_file, self.write_sweep_file("invalid.json", "{"))
+        self.assertRaises(Error, load_sweep_file, self.write_sweep_file("scalar.json", [1, 2]))
+
+
+class TestSweepBuilds(StubTestCase):
+    def test_sweep_skips_duplicates(self):
+        self.write_file("a.cl", "kernel void k(global float* x) { x[0] = N; }\n")
+        output = self.check_clcc("--platform", "1", "--sweep", "N=1,2", "--sweep", "M=x,x", "--sweep-index", "index.json", "a.cl")
+        self.assertIn("2 variants compiled, 0 failed, 2 duplicates skipped", output)
+        self.assertEqual(sorted(name for name in os.listdir(self.dirname) if name.endswith(".bin")), ["a.v0.bin", "a.v2.bin"])
+        index = json.loads(self.read_file("index.json"))
+        self.assertEqual([variant["status"] for variant in index["variants"]], ["ok", "duplicate", "ok", "duplicate"])
+        self.assertEqual(index["variants"][3]["duplicate_of"], 2)
+        self.assertEqual(index["variants"][3]["outputs"], ["a.v2.bin"])
+
+    def test_sweep_requires_single_input(self):
+        self.write_file("a.cl", "")
+        self.write_file("b.cl", "")
+        status, output = self.run_clcc("--platform", "1", "--sweep", "N=1,2", "a.cl", "b.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("sweep requires a single input file", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
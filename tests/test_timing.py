@@ -0,0 +1,70 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import io
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+from clcc.timing import Profiler
+from .stub import StubTestCase
+
+
+class TestProfiler(unittest.TestCase):
+    def test_report(self):
+        profiler = Profiler()
+        for _ in range(3):
+            with profiler.phase("build program"):
+                pass
+        with profiler.phase("write output"):
+            pass
+        report_file = io.StringIO() if str is not bytes else io.BytesIO()
+        profiler.print_report(report_file)
+        lines = report_file.getvalue().splitlines()
+        self.assertEqual(lines[1].split()[:3], ["build", "program", "3"])
+        self.assertEqual(lines[2].split()[:3], ["write", "output", "1"])
+        self.assertTrue(lines[-1].startswith("Total wall time"))
+
+    def test_trace(self):
+        profiler = Profiler()
+        with profiler.phase("read source", file="a.cl"):
+            pass
+
+        def build():
+            with profiler.phase("build program"):
+                pass
+
+        thread = threading.Thread(target=build, name="worker")
+        thread.start()
+        thread.join()
+        dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, dirname, True)
+        trace_path = os.path.join(dirname, "trace.json")
+        profiler.write_trace(trace_path)
+        with open(trace_path) as trace_file:
+            trace_events = json.load(trace_file)["traceEvents"]
+        phases = [event for event in trace_events if event["ph"] == "X"]
+        self.assertEqual([event["name"] for event in phases], ["read source", "build program"])
+        self.assertEqual(phases[0]["args"], {"file": "a.cl"})
+        self.assertEqual([event["tid"] for event in phases], [1, 2])
+        thread_names = dict((event["tid"], event["args"]["name"]) for event in trace_events if event["ph"] == "M")
+        self.assertEqual(thread_names[2], "worker")
+
+
+class TestTimeReport(StubTestCase):
+    def test_time_report_and_trace(self):
+        self.write_file("a.cl", "kernel void k(global float* x) { x[0] = 1.0f; }\n")
+        output = self.check_clcc("--platform", "1", "--time-report", "--trace", "trace.json", "a.cl")
+        self.assertIn("build program", output)
+        self.assertIn("Total wall time", output)
+        trace_events = json.loads(self.read_file("trace.json"))["traceEvents"]
+        self.assertIn("build program", [event["name"] for event in trace_events])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import sys
+import time
+import shutil
+import signal
+import tempfile
+import threading
+import unittest
+import subprocess
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from clcc.watch import FileWatcher
+from .stub import StubTestCase, root_dirname
+
+
+KERNEL = "kernel void scale(global float* x) { x[get_global_id(0)] *= 2.0f; }\n"
+
+
+def write_later(path, text, delay=0.2):
+    def write():
+        time.sleep(delay)
+        with open(path, "w") as text_file:
+            text_file.write(text)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+
+class FileWatcherTests(object):
+    def create_watcher(self):
+        return FileWatcher(poll_interval=0.02)
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="clcc-test-")
+        self.addCleanup(shutil.rmtree, self.dirname, True)
+        self.watcher = self.create_watcher()
+        self.addCleanup(self.watcher.close)
+        self.paths = [os.path.join(self.dirname, name) for name in ["a.cl", "b.h"]]
+        # Polling tells changes apart by sizes where modification times have a coarse resolution
+        for path in self.paths:
+            with open(path, "w") as text_file:
+                text_file.write("initial text\n")
+
+    def test_write(self):
+        self.watcher.set_paths(self.paths)
+        write_later(self.paths[1], "changed\n").join()
+        self.assertEqual(self.watcher.wait(), set([self.paths[1]]))
+
+    def test_replace(self):
+        # Editors write a new file and rename it over the old one
+        self.watcher.set_paths(self.paths)
+        temporary_path = os.path.join(self.dirname, "a.cl.swp")
+        with open(temporary_path, "w") as text_file:
+            text_file.write("replaced\n")
+        os.rename(temporary_path, self.paths[0])
+        self.assertEqual(self.watcher.wait(), set([self.paths[0]]))
+
+    def test_delete_and_create(self):
+        self.watcher.set_paths(self.paths)
+        os.remove(self.paths[0])
+        self.assertEqual(self.watcher.wait(), set([self.paths[0]]))
+        write_later(self.paths[0], "back\n")
+        self.assertEqual(self.watcher.wait(), set([self.paths[0]]))
+
+    def test_burst_of_changes(self):
+        self.watcher.set_paths(self.paths)
+        with open(self.paths[0], "w") as text_file:
+            text_file.write("first\n")
+        with open(self.paths[1], "w") as text_file:
+            text_file.write("second\n")
+        self.assertEqual(self.watcher.wait(), set(self.paths))
+
+    def test_unwatched_files(self):
+        self.watcher.set_paths(self.paths[:1])
+        with open(self.paths[1], "w") as text_file:
+            text_file.write("ignored\n")
+        with open(os.path.join(self.dirname, "other.h"), "w") as text_file:
+            text_file.write("ignored\n")
+        thread = write_later(self.paths[0], "changed\n", 0.3)
+        self.assertEqual(self.watcher.wait(), set(self.paths[:1]))
+        thread.join()
+
+    def test_change_between_waits(self):
+        # Changes of files which stay watched are reported by the next wait
+        self.watcher.set_paths(self.paths[:1])
+        with open(self.paths[0], "w") as text_file:
+            text_file.write("changed\n")
+        self.watcher.set_paths(self.paths)
+        self.assertEqual(self.watcher.wait(), set(self.paths[:1]))
+
+
+class TestInotifyWatcher(FileWatcherTests, unittest.TestCase):
+    def setUp(self):
+        FileWatcherTests.setUp(self)
+        if self.watcher.method != "inotify":
+            raise unittest.SkipTest("inotify is not available")
+
+
+class TestPollingWatcher(FileWatcherTests, unittest.TestCase):
+    def create_watcher(self):
+        watcher = FileWatcher(poll_interval=0.02)
+        if watcher._inotify is not None:
+            watcher._inotify.close()
+            watcher._inotify = None
+        return watcher
+
+    def setUp(self):
+        FileWatcherTests.setUp(self)
+        self.assertEqual(self.watcher.method, "polling")
+
+
+class TestWatchMode(StubTestCase):
+    def read_until(self, lines, text, timeout=10.0):
+        # Returns the output lines up to the line which contains text
+        output = []
+        deadline = time.time() + timeout
+        while True:
+            try:
+                line = lines.get(timeout=max(deadline - time.time(), 0.0))
+            except queue.Empty:
+                self.fail("no line with %r in the output:\n%s" % (text, "".join(output)))
+            if line is None:
+                self.fail("clcc exited without %r in the output:\n%s" % (text, "".join(output)))
+            output.append(line)
+            if text in line:
+                return "".join(output)
+
+    def test_rebuild_on_header_change(self):
+        self.write_file("common.h", "#define SCALE 2.0f\n")
+        self.write_file("a.cl", "#include \"common.h\"\n" + KERNEL)
+        self.write_file("b.cl", KERNEL)
+        environment = dict(self.environment)
+        environment["PYTHONUNBUFFERED"] = "1"
+        process = subprocess.Popen([sys.executable, os.path.join(root_dirname, "bin", "clcc"), "--platform", "1", "--watch", "a.cl", "b.cl"],
+                                   env=environment, cwd=self.dirname, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.addCleanup(process.wait)
+        self.addCleanup(process.stdout.close)
+        lines = queue.Queue()
+
+        def read_lines():
+            for line in iter(process.stdout.readline, b""):
+                lines.put(line.decode("utf8"))
+            lines.put(None)
+
+        reader = threading.Thread(target=read_lines)
+        reader.daemon = True
+        reader.start()
+        try:
+            output = self.read_until(lines, "Watching 3 files for changes")
+            self.assertIn("2 files compiled, 0 failed", output)
+
+            with open(self.path("common.h"), "w") as header_file:
+                header_file.write("#define SCALE 3.0f\n")
+            output = self.read_until(lines, "Watching 3 files for changes")
+            self.assertIn("OK    a.cl -> a.bin", output)
+            self.assertNotIn("b.cl", output)
+            self.assertIn("1 files compiled, 0 failed", output)
+        finally:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        self.assertEqual(process.wait(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
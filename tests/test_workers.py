@@ -0,0 +1,69 @@
+# This file is part of clcc package and is licensed under the Simplified BSD license.
+#    See LICENSE.rst for the full text of the license.
+
+
+from __future__ import absolute_import
+import os
+import unittest
+
+from clcc.workers import _describe_exit
+from .stub import StubTestCase
+
+
+KERNEL = "kernel void scale(global float* x) { x[get_global_id(0)] *= 2.0f; }\n"
+
+
+class TestDescribeExit(unittest.TestCase):
+    def test_exit_status(self):
+        self.assertEqual(_describe_exit(3), "exited with status 3")
+
+    def test_signal(self):
+        self.assertIn(_describe_exit(-6), ["was killed by signal 6 (SIGABRT)", "was killed by signal 6"])
+
+
+class TestIsolatedBuilds(StubTestCase):
+    def test_same_binaries_as_in_process(self):
+        self.write_file("a.cl", KERNEL)
+        self.write_file("b.cl", "#warning check\n" + KERNEL)
+        os.mkdir(self.path("local"))
+        os.mkdir(self.path("isolated"))
+        self.check_clcc("--platform", "2", "-d", "all", "-o", "local", "a.cl", "b.cl")
+        output = self.check_clcc("--platform", "2", "-d", "all", "--isolate", "-j", "2", "-o", "isolated", "a.cl", "b.cl")
+        self.assertIn("warning: stub build warning", output)
+        self.assertIn("2 files compiled, 0 failed", output)
+        self.assertEqual(sorted(os.listdir(self.path("isolated"))), sorted(os.listdir(self.path("local"))))
+        for name in os.listdir(self.path("local")):
+            self.assertEqual(self.read_file(os.path.join("isolated", name), "rb"), self.read_file(os.path.join("local", name), "rb"))
+
+    def test_crash_fails_only_its_input(self):
+        self.write_file("good.cl", KERNEL)
+        self.write_file("crash.cl", "#pragma stub crash\n" + KERNEL)
+        status, output = self.run_clcc("--platform", "1", "--isolate", "-j", "2", "--build-retries", "1", "crash.cl", "good.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("retrying the build in a new worker process", output)
+        self.assertIn("worker process was killed by signal 6", output)
+        self.assertIn("(2 attempts)", output)
+        self.assertIn("OK    good.cl -> good.bin", output)
+        self.assertIn("1 files compiled, 1 failed", output)
+
+    def test_flaky_build_is_retried(self):
+        self.write_file("flaky.cl", "#pragma stub flaky\n" + KERNEL)
+        output = self.check_clcc("--platform", "1", "--isolate", "flaky.cl", environment={"STUB_CL_FLAKY_FILE": self.path("flaky.marker")})
+        self.assertIn("retrying the build in a new worker process", output)
+        self.assertTrue(self.read_file("flaky.bin", "rb").startswith(b"STUBBIN:"))
+
+    def test_hang_times_out(self):
+        self.write_file("hang.cl", "#pragma stub hang\n" + KERNEL)
+        status, output = self.run_clcc("--platform", "1", "--isolate", "--build-timeout", "0.5", "--build-retries", "0", "hang.cl")
+        self.assertEqual(status, 1)
+        self.assertIn("worker process did not respond within 0.5 s (1 attempt)", output)
+        self.assertNotIn("retrying", output)
+
+    def test_worker_options_without_isolate(self):
+        self.write_file("a.cl", KERNEL)
+        output = self.check_clcc("--platform", "1", "--build-timeout", "5", "a.cl")
+        self.assertIn("options --build-timeout, --worker-memory and --worker-builds are ignored without --isolate", output)
+
+
+if __name__ == "__main__":
+    unittest.main()